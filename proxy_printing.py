@@ -1,8 +1,34 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 
+# Merging the per-worker PDFs needs pypdf; without it everything is drawn in one process.
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+# Card dimensions in points (1 inch = 72 points)
+CARD_WIDTH = 2.4 * 72   # ≈ 172.8 points
+CARD_HEIGHT = 3.3 * 72  # ≈ 237.6 points
+
+# Grid configuration: 3 columns, 3 rows per page (9 cards per page)
+COLS = 3
+ROWS = 3
+CARDS_PER_PAGE = COLS * ROWS
+
+COLOR_LETTERS = {"red": "r", "blue": "b", "green": "g", "yellow": "y"}
+
+DEFAULT_DECK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python-prototype", "data", "deck.json")
+
 def draw_card(c, x, y, card_width, card_height, card):
     """
     Draws a single card at (x, y) with given dimensions.
@@ -61,65 +87,121 @@ def draw_card(c, x, y, card_width, card_height, card):
     c.setFillColor(text_color)
     c.drawString(text_x, text_y, text)
 
-def main():
-    # Card dimensions in points (1 inch = 72 points)
-    card_width = 2.4 * 72   # ≈ 172.8 points
-    card_height = 3.3 * 72  # ≈ 237.6 points
-    
-    # A4 page dimensions (width x height in points)
-    page_width, page_height = A4  # (595, 842)
-    
-    # Grid configuration: 3 columns, 3 rows per page (9 cards per page)
-    cols = 3
-    rows = 3
-    cards_per_page = cols * rows
+# ----------------------------
+# Deck data
+# ----------------------------
+# Cards come from a deck JSON file (a list of {"color", "number", ...}
+# entries, as in python-prototype/data/deck.json) or from standard_deck(),
+# the playtest deck this script used to hardcode. Only color and number show
+# on the proxy, so each card is reduced to its face: {"text", "color"}.
+
+def card_face(card):
+    """The printed face of a deck entry: "5r" for a red 5, "5" for a blank 5, "r" for a red color card."""
+    color = card.get("color")
+    number = card.get("number")
+    text = (str(number) if number is not None else "") + (COLOR_LETTERS.get(color, "") if color else "")
+    return {"text": text, "color": color}
+
+def load_deck_faces(path):
+    with open(path) as f:
+        return [card_face(card) for card in json.load(f)]
 
-    # Build the list of card definitions.
+def standard_deck():
+    """The playtest deck: 4 copies of each number 1-5, plain and in each color, plus 4 of each color card."""
     cards = []
-    color_letters = {"red": "r", "blue": "b", "green": "g", "yellow": "y"}
-    
-    # For each number 1-5:
     for number in range(1, 6):
-        # Card with number only (no color)
-        for _ in range(4):
-            cards.append({"text": str(number), "color": None})
-        # Cards with a number and a color (number+color)
-        for col in ["red", "blue", "green", "yellow"]:
-            for _ in range(4):
-                cards.append({"text": f"{number}{color_letters[col]}", "color": col})
-    
-    # Color-only cards (just the color letter)
-    for col in ["red", "blue", "green", "yellow"]:
-        for _ in range(4):
-            cards.append({"text": color_letters[col], "color": col})
-    
-    total_cards = len(cards)
-    
-    # Create the PDF canvas.
-    c = canvas.Canvas("cards.pdf", pagesize=A4)
-    
+        cards += [{"color": None, "number": number}] * 4
+        for col in COLOR_LETTERS:
+            cards += [{"color": col, "number": number}] * 4
+    for col in COLOR_LETTERS:
+        cards += [{"color": col, "number": None}] * 4
+    return [card_face(card) for card in cards]
+
+# ----------------------------
+# Rendering
+# ----------------------------
+# Each distinct face is drawn once into a PDF form XObject; every copy is then
+# a reference to that form, placed with a translation. Drawing cost and file
+# size therefore grow with the number of distinct faces, not with the number
+# of copies, and the triangle path and font setup live in one place per face.
+#
+# Pages are split into batches rendered by worker processes, each into its
+# own temporary PDF, and the batches are concatenated in page order. A batch
+# only defines the forms its own pages use.
+
+def face_key(face):
+    return (face["text"], face.get("color"))
+
+def render_pages(cards, path):
+    """Writes `cards` to `path`, CARDS_PER_PAGE per page, drawing each face once as a form."""
+    page_width, page_height = A4  # (595, 842)
+    c = canvas.Canvas(path, pagesize=A4, pageCompression=1)
+    forms = {}
     for i, card in enumerate(cards):
+        key = face_key(card)
+        name = forms.get(key)
+        if name is None:
+            name = forms[key] = f"face{len(forms)}"
+            c.beginForm(name, lowerx=0, lowery=0, upperx=CARD_WIDTH, uppery=CARD_HEIGHT)
+            draw_card(c, 0, 0, CARD_WIDTH, CARD_HEIGHT, card)
+            c.endForm()
+
         # Determine the card's position on the current page.
-        pos_in_page = i % cards_per_page
-        col = pos_in_page % cols
-        row = pos_in_page // cols  # row 0 will be the top row
-        
-        # x coordinate: left aligned in the grid.
-        x = col * card_width
-        # y coordinate: top row starts at the top of the page.
-        y = page_height - (row + 1) * card_height
-        
-        # Uncomment the following line to draw a border around each card (for debugging)
-        # c.rect(x, y, card_width, card_height)
-        
-        draw_card(c, x, y, card_width, card_height, card)
-        
+        pos_in_page = i % CARDS_PER_PAGE
+        col = pos_in_page % COLS
+        row = pos_in_page // COLS  # row 0 will be the top row
+
+        c.saveState()
+        c.translate(col * CARD_WIDTH, page_height - (row + 1) * CARD_HEIGHT)
+        c.doForm(name)
+        c.restoreState()
+
         # Start a new page after filling the current page, unless it's the last card.
-        if (i + 1) % cards_per_page == 0 and (i + 1) < total_cards:
+        if (i + 1) % CARDS_PER_PAGE == 0 and i + 1 < len(cards):
             c.showPage()
-    
     c.save()
-    print("PDF generated as 'cards.pdf'.")
+    return path
+
+def render_pdf(cards, output, workers=None, pages_per_batch=20):
+    """Renders the cards into `output`, splitting the pages over `workers` processes when there are enough of them."""
+    workers = workers or os.cpu_count() or 1
+    pages = -(-len(cards) // CARDS_PER_PAGE)
+    batches = min(workers, -(-pages // pages_per_batch))
+    if batches <= 1 or PdfWriter is None:
+        render_pages(cards, output)
+        return
+
+    # Whole pages per batch, so every batch starts at the top left of a page.
+    batch_cards = -(-pages // batches) * CARDS_PER_PAGE
+    with tempfile.TemporaryDirectory() as tmp:
+        with ProcessPoolExecutor(batches) as pool:
+            futures = [pool.submit(render_pages, cards[start:start + batch_cards],
+                                   os.path.join(tmp, f"batch{start // batch_cards}.pdf"))
+                       for start in range(0, len(cards), batch_cards)]
+            parts = [future.result() for future in futures]
+        writer = PdfWriter()
+        for part in parts:
+            writer.append(part)
+        with open(output, "wb") as f:
+            writer.write(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Print proxy cards to a PDF, 9 per A4 page.")
+    parser.add_argument("deck", nargs="?", default=DEFAULT_DECK, help="deck JSON file (default: %(default)s)")
+    parser.add_argument("--standard", action="store_true", help="print the standard playtest deck instead of a file")
+    parser.add_argument("--copies", type=int, default=1, help="print every card this many times")
+    parser.add_argument("--workers", type=int, default=None, help="processes rendering page batches (default: CPUs)")
+    parser.add_argument("-o", "--output", default="cards.pdf")
+    args = parser.parse_args()
+
+    cards = standard_deck() if args.standard else load_deck_faces(args.deck)
+    cards = [card for card in cards for _ in range(args.copies)]
+    if not cards:
+        sys.exit("no cards to print")
+
+    render_pdf(cards, args.output, args.workers)
+    faces = len({face_key(card) for card in cards})
+    print(f"PDF generated as '{args.output}': {len(cards)} cards, {faces} distinct faces.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,431 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # the render benchmark runs offscreen
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import gc
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pygame
+
+from core.card import DefaultCard
+from core.gamezone import DeckZone, DiscardZone, HandZone, MemoryZone, ProblemZone, StackZone, ZoneCards
+from core.loader import compile_deck, load_deck, load_problem_tree
+from core.logic import Deck, attack_with_card, resolve_stack
+from core.profiler import PROFILER
+from core.treegen import FlatTree, TreeSpec, generate_flat_tree
+
+# ----------------------------
+# Benchmark suite
+# ----------------------------
+# Each case has a setup, run outside the clock and repeated before every
+# timed run (runs may consume what they are given, e.g. beat tree nodes), and
+# a run doing `ops` operations.
+#
+# A few-millisecond run is easily thrown off by the machine, so each of the
+# `repeats` samples is as many setup+run rounds as it takes to measure at
+# least MIN_SAMPLE_S of work (as far as SETUP_BUDGET_S of setups per sample
+# allows); a warm-up run picks the round count. The suite takes one sample
+# of every case per pass, spreading each case's samples over the whole run.
+# Every run is timed on its own, and a case reports the median and best over
+# all of them plus the median per operation. A short calibration workload is
+# timed next to every sample, so a busy machine can be told from slow code.
+#
+# Results are written as JSON and compared against a stored baseline
+# (bench_baseline.json next to this file) on each case's best run, which
+# noise can only make slower, adjusted for a slower calibration; cases slower
+# than the baseline by more than the threshold are reported as regressions
+# and fail the run.
+#
+#   python bench.py                      run everything, compare to the baseline
+#   python bench.py --quick -k resolve   skip the 100k cases, only resolve_stack ones
+#   python bench.py --save-baseline      run and store the result as the new baseline
+
+MIN_SAMPLE_S = 0.05
+SETUP_BUDGET_S = 0.5
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# Full ten-way trees: 111, 11 111 and 111 111 nodes.
+TREE_SIZES = {"small": 3, "10k": 5, "100k": 6}
+LARGE = ("100k",)
+COLORS = ("red", "blue", "green", "yellow")
+
+
+class Case:
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]], ops: int, large: bool = False):
+        # run() may return a float: its own elapsed seconds, when only part of it is the measured work.
+        self.name = name
+        self.setup = setup
+        self.ops = ops
+        self.large = large
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, ops: int, large: bool = False):
+    def register(setup):
+        CASES.append(Case(name, setup, ops, large))
+        return setup
+    return register
+
+
+# Shared inputs are built once, on first use.
+_flat_trees: Dict[str, FlatTree] = {}
+_files: Dict[str, str] = {}
+_workdir = tempfile.TemporaryDirectory(prefix="conway-bench-")
+
+
+def flat_tree(size: str) -> FlatTree:
+    if size not in _flat_trees:
+        spec = TreeSpec(depth=TREE_SIZES[size], min_children=10, max_children=10, min_depth=TREE_SIZES[size],
+                        numbers=(1, 10), loot=1)
+        _flat_trees[size] = generate_flat_tree(spec, seed=0)
+    return _flat_trees[size]
+
+
+def random_cards(count: int, seed: int = 0) -> List[DefaultCard]:
+    rng = random.Random(seed)
+    return [DefaultCard(rng.choice(COLORS), rng.randint(1, 10), "first", "stamp1") for _ in range(count)]
+
+
+def exposed_cards(tree: ProblemZone, count: int) -> List[DefaultCard]:
+    """One card matching each of up to `count` exposed nodes."""
+    return [DefaultCard(node.color, node.number) for node in tree.get_exposed_nodes()[:count]]
+
+
+def node_dict(tree: FlatTree) -> dict:
+    """The JSON problem format for a flat tree, built bottom-up."""
+    codes, loot, offsets = tree.codes.tolist(), tree.loot.tolist(), tree.offsets.tolist()
+    nodes = [None] * len(codes)
+    for index in range(len(codes) - 1, -1, -1):
+        card = DefaultCard.from_code(codes[index])
+        nodes[index] = {"card": {"color": card.color, "number": card.number, "zone": "problem"},
+                        "loot": loot[index], "children": nodes[offsets[index]:offsets[index + 1]]}
+    return nodes[0]
+
+
+def data_file(name: str) -> str:
+    """Large generated inputs for the loader cases."""
+    if name not in _files:
+        path = os.path.join(_workdir.name, name)
+        if name == "deck.json":
+            with open(path, "w") as f:
+                json.dump([{"color": card.color, "number": card.number, "edition": card.edition,
+                            "stamp": card.stamp, "zone": "deck"} for card in random_cards(100000)], f)
+        elif name == "deck.cpack":
+            compile_deck(random_cards(100000), path)
+        elif name == "problems.json":
+            with open(path, "w") as f:
+                json.dump(node_dict(flat_tree("100k")), f)
+        elif name == "problems.cpack":
+            flat_tree("100k").save(path)
+        _files[name] = path
+    return _files[name]
+
+
+# Zone operations
+
+@case("zones.move_cards", ops=1000)
+def _():
+    cards = random_cards(1000)
+    deck = DeckZone(max_size=1000, cards=ZoneCards(cards))
+    hand = HandZone(max_size=1000)
+    return lambda: deck.move_cards(cards, hand)
+
+
+@case("zones.move_zones", ops=1000)
+def _():
+    cards = random_cards(1000)
+    deck = DeckZone(max_size=1000, cards=ZoneCards(cards))
+    discard = DiscardZone(max_size=1000)
+
+    def run():
+        for card in cards:
+            deck.move_zones(card, deck, discard)
+    return run
+
+
+@case("zones.index_tree.10k", ops=11111)
+def _():
+    root = flat_tree("10k").to_tree()
+    zone = ProblemZone()
+
+    def run():
+        zone.root = root
+    return run
+
+
+@case("zones.find_exposed.10k", ops=1000)
+def _():
+    tree = flat_tree("10k").to_zone()
+    cards = exposed_cards(tree, 1000)
+
+    def run():
+        for card in cards:
+            tree.find_exposed(card.color, card.number)
+    return run
+
+
+@case("zones.beat_node.10k", ops=1000)
+def _():
+    tree = flat_tree("10k").to_zone()
+    ids = [node.id for node in tree.get_exposed_nodes()[:1000]]
+
+    def run():
+        for node_id in ids:
+            tree.beat_node(node_id)
+    return run
+
+
+# Deck
+
+@case("deck.shuffle", ops=1000)
+def _():
+    deck = Deck(random_cards(60))
+
+    def run():
+        for _ in range(1000):
+            deck.shuffle()
+    return run
+
+
+@case("deck.draw_cards", ops=1000)
+def _():
+    deck = Deck(random_cards(1000))
+
+    def run():
+        for _ in range(200):
+            deck.draw_cards(5)
+    return run
+
+
+@case("deck.draw.100k", ops=50000)
+def _():
+    # A large deckbuilding pile: draws only pay for the cards they take. Setting
+    # it up costs far more than a few draws, so one run draws half of it.
+    deck = Deck(random_cards(100000), seed=0)
+
+    def run():
+        for _ in range(10000):
+            deck.draw(5)
+    return run
+
+
+# Stack resolution and attacks, on trees from 111 to 111 111 nodes
+
+def _resolve_case(size: str):
+    stacks = min(500, 10 ** (TREE_SIZES[size] - 1))  # one per exposed leaf, at most 500
+
+    @case(f"logic.resolve_stack.{size}", ops=stacks, large=size in LARGE)
+    def _():
+        tree = flat_tree(size).to_zone()
+        stacks = [[card] for card in exposed_cards(tree, 500)]
+        memory, loot = MemoryZone(), [0]
+
+        def run():
+            for stack in stacks:
+                resolve_stack(stack, memory, tree, loot)
+        return run
+
+    @case(f"logic.attack_with_card.{size}", ops=500, large=size in LARGE)
+    def _():
+        tree = flat_tree(size).to_zone()
+        # Hits on exposed nodes, then misses (no tree card has number 0).
+        cards = exposed_cards(tree, 250)
+        cards += [DefaultCard(random.choice(COLORS), 0) for _ in range(500 - len(cards))]
+        memory, loot = MemoryZone(), [0]
+
+        def run():
+            for card in cards:
+                attack_with_card(card, tree, memory, loot)
+        return run
+
+
+for _size in TREE_SIZES:
+    _resolve_case(_size)
+
+
+# Loaders, on 100 000 card decks and 111 111 node trees
+
+def _loader_case(name: str, load: Callable, filename: str, ops: int):
+    @case(name, ops=ops, large=True)
+    def _():
+        path = data_file(filename)
+        return lambda: load(path)
+
+
+_loader_case("loader.load_deck.json", load_deck, "deck.json", 100000)
+_loader_case("loader.load_deck.cpack", load_deck, "deck.cpack", 100000)
+_loader_case("loader.load_problem_tree.json", load_problem_tree, "problems.json", 111111)
+_loader_case("loader.load_problem_tree.cpack", load_problem_tree, "problems.cpack", 111111)
+
+
+# Rendering
+
+@case("render.frame", ops=1)
+def _():
+    from window import render_game
+    deck_cards = random_cards(40)
+    zones = (DeckZone(max_size=len(deck_cards), cards=ZoneCards(deck_cards)), HandZone(), StackZone(),
+             DiscardZone(), flat_tree("10k").to_zone(), MemoryZone())
+    zones[0].move_cards(deck_cards[:5], zones[1])
+
+    def run() -> float:
+        # render_game paints everything on its first frame, then sees the queued QUIT.
+        # Only that frame's painting and display update are timed, via its profiler spans.
+        pygame.init()
+        pygame.event.post(pygame.event.Event(pygame.QUIT))
+        PROFILER.reset()
+        PROFILER.enable()
+        try:
+            render_game(*zones)
+        finally:
+            PROFILER.disable()
+        frame = [row["total_ms"] for row in PROFILER.summary()
+                 if row["name"].startswith(("frame:draw:", "frame:flip"))]
+        if not frame:
+            raise RuntimeError("render_game did not draw a frame")
+        return sum(frame) / 1000
+    return run
+
+
+# ----------------------------
+# Running and comparing
+# ----------------------------
+
+def _timed_run(bench: Case) -> tuple:
+    """
+    (setup seconds, run seconds) for one fresh setup and run. Like timeit,
+    the run goes without the cyclic garbage collector, whose passes depend on
+    everything else alive in the process.
+    """
+    started = time.perf_counter()
+    run = bench.setup()
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        measured = run()
+        elapsed = measured if isinstance(measured, float) else time.perf_counter() - start
+    finally:
+        gc.enable()
+    return start - started, elapsed
+
+
+def _rounds(bench: Case) -> int:
+    """Warms a case up (the run is not counted) and picks how many rounds make one sample."""
+    setup, elapsed = _timed_run(bench)
+    if elapsed >= MIN_SAMPLE_S:
+        return 1
+    return max(1, min(math.ceil(MIN_SAMPLE_S / max(elapsed, 1e-6)), int(SETUP_BUDGET_S / max(setup, 1e-6))))
+
+
+def _result(bench: Case, times: List[float], repeats: int, rounds: int) -> dict:
+    median = statistics.median(times)
+    return {"median_ms": median * 1000, "min_ms": min(times) * 1000, "per_op_us": median / bench.ops * 1e6,
+            "ops": bench.ops, "repeats": repeats, "rounds": rounds}
+
+
+def _calibration_run() -> float:
+    """Seconds for a fixed plain-Python workload, to tell a slow machine from slow code."""
+    start = time.perf_counter()
+    counts: Dict[int, int] = {}
+    for value in range(20000):
+        counts[value & 1023] = counts.get(value & 1023, 0) + value
+    return time.perf_counter() - start
+
+
+def run_suite(cases: List[Case], repeats: int = 5, log=print) -> dict:
+    # One sample of every case per pass, so a slow spell on the machine hits
+    # one sample of many cases rather than every sample of one. Right before
+    # each sample the calibration workload runs a few times; compare()
+    # divides out how much slower it got, for spells that outlast the run.
+    rounds = {bench.name: _rounds(bench) for bench in cases}
+    times: Dict[str, List[float]] = {bench.name: [] for bench in cases}
+    calibration: Dict[str, List[float]] = {bench.name: [] for bench in cases}
+    for _ in range(repeats):
+        for bench in cases:
+            calibration[bench.name] += [_calibration_run() for _ in range(3)]
+            times[bench.name] += [_timed_run(bench)[1] for _ in range(rounds[bench.name])]
+    results = {}
+    for bench in cases:
+        results[bench.name] = result = _result(bench, times[bench.name], repeats, rounds[bench.name])
+        result["calibration_ms"] = min(calibration[bench.name]) * 1000
+        log(f"{bench.name:<36} {result['median_ms']:10.3f} ms  {result['per_op_us']:10.3f} us/op"
+            f"  ({result['rounds']} per sample)")
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                     "pygame": pygame.version.ver, "machine": platform.platform(),
+                     "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = 1.3) -> List[str]:
+    """
+    Prints each case against the baseline, by best run; returns the cases
+    slower by more than `threshold`x. When both runs timed the calibration
+    workload next to a case and it got slower, the ratio is divided by how
+    much, so a machine busy for the whole run does not read as slow code. A
+    faster calibration is not held against the case.
+    """
+    regressions = []
+    print(f"\n{'case':<36} {'best ms':>10} {'baseline':>10} {'machine':>8} {'ratio':>7}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<36} {result['min_ms']:10.3f} {'-':>10} {'':>8} {'new':>7}")
+            continue
+        machine = 1.0
+        if "calibration_ms" in result and "calibration_ms" in base:
+            machine = max(1.0, result["calibration_ms"] / base["calibration_ms"])
+        ratio = result["min_ms"] / base["min_ms"] / machine if base["min_ms"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            regressions.append(name)
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(f"{name:<36} {result['min_ms']:10.3f} {base['min_ms']:10.3f} {machine:8.2f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark core logic, loaders and rendering.")
+    parser.add_argument("-k", dest="pattern", default=None, help="only run cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="skip the 100k-node and loader cases")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=1.3, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    selected = [bench for bench in CASES
+                if (args.pattern is None or args.pattern in bench.name) and not (args.quick and bench.large)]
+    report = run_suite(selected, args.repeats)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote baseline {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        print(f"\nno baseline at {args.baseline}; run with --save-baseline to create one")
@@ -0,0 +1,242 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+from .card import AbstractCard, DefaultCard, COLOR_MASK, NUMBER_SHIFT, NUMBER_MASK
+from .gamezone import ProblemNode, ProblemZone
+from .solver import Play, Solution, Solver
+
+# ----------------------------
+# Background compass and hints
+# ----------------------------
+# Solving the position is far too slow for the render loop. The UI thread
+# only takes a Snapshot (flat lists of card codes, cheap to build and to
+# send) and submits it. A dispatcher thread, which only ever waits, hands
+# the newest snapshot to a worker process and gives each finished Analysis
+# to the `post` callback, which the game wires to pygame's event queue.
+# The solve runs in its own, lower priority process so it never holds the
+# UI's GIL; the worker is spawned rather than forked, and since core imports
+# no pygame it starts without SDL.
+#
+# Every submit bumps a generation number, shared with the worker. A solve
+# polls it and stops as soon as a newer snapshot arrives, and a result that
+# finishes stale is dropped, so the compass never shows a position the
+# player has already left.
+#
+# The compass is the number of turns the solver needs from here, compared
+# with the previous analysis: fewer turns means the last move headed
+# towards a solution.
+
+_KEY_MASK = COLOR_MASK | (NUMBER_MASK << NUMBER_SHIFT)
+
+
+class Snapshot:
+    """
+    What the analysis needs from one position, copied on the UI thread. The
+    tree is flattened in pre-order; cards keep only their color and number
+    (all the solver looks at), so codes mean the same in every process.
+    """
+    def __init__(self, tree: ProblemZone, hand: Iterable[AbstractCard], deck: Iterable[AbstractCard] = (),
+                 memory: Iterable[AbstractCard] = ()):
+        self.codes: List[int] = []
+        self.loot: List[int] = []
+        self.beaten: List[bool] = []
+        self.child_counts: List[int] = []
+        stack = [tree.root] if tree.root is not None else []
+        while stack:
+            node = stack.pop()
+            self.codes.append(node.card.code & _KEY_MASK)
+            self.loot.append(node.loot)
+            self.beaten.append(node.beaten)
+            self.child_counts.append(len(node.children))
+            stack.extend(reversed(node.children))
+        self.hand = [card.code & _KEY_MASK for card in hand]
+        self.deck = [card.code & _KEY_MASK for card in deck]
+        self.memory = [card.code & _KEY_MASK for card in memory]
+        self.generation = 0
+
+    def tree(self) -> ProblemZone:
+        """Rebuilds the tree bottom-up: walking pre-order backwards, each node's children are on top of the stack."""
+        zone = ProblemZone()
+        built: List[ProblemNode] = []
+        for index in range(len(self.codes) - 1, -1, -1):
+            count = self.child_counts[index]
+            children = [built.pop() for _ in range(count)]
+            built.append(ProblemNode(DefaultCard.from_code(self.codes[index]), children, loot=self.loot[index],
+                                     beaten=self.beaten[index]))
+        if built:
+            zone.root = built[0]
+        return zone
+
+
+# Worker process state, set up by _start_worker.
+_worker_solver: Optional[Solver] = None
+_worker_generation = None
+
+
+def _start_worker(generation) -> None:
+    global _worker_solver, _worker_generation
+    if hasattr(os, "nice"):
+        os.nice(10)  # on a single core the UI should still win every time slice
+    _worker_solver = Solver()
+    _worker_generation = generation
+
+
+def _solve(solver: Solver, snapshot: Snapshot, max_nodes: Optional[int], time_limit: Optional[float],
+           should_stop: Callable[[], bool]) -> Solution:
+    cards = lambda codes: [DefaultCard.from_code(code) for code in codes]
+    return solver.solve(snapshot.tree(), cards(snapshot.hand), cards(snapshot.deck), cards(snapshot.memory),
+                        max_nodes=max_nodes, time_limit=time_limit, should_stop=should_stop)
+
+
+def _solve_in_worker(snapshot: Snapshot, max_nodes: Optional[int], time_limit: Optional[float]) -> tuple:
+    solution = _solve(_worker_solver, snapshot, max_nodes, time_limit,
+                      lambda: _worker_generation.value != snapshot.generation)
+    # Cards go back as codes; the solver only produces color+number cards.
+    hint = [(from_memory, [card.code for card in cards]) for from_memory, cards in solution.hint or ()]
+    return solution.turn_bound, solution.solvable, hint if solution.hint is not None else None, solution.complete
+
+
+def _card_text(card: AbstractCard) -> str:
+    return " ".join(str(part) for part in (card.color, card.number) if part is not None)
+
+
+class Analysis:
+    """
+    One finished analysis. `turns` is the solver's perfect-information turn
+    bound (Solution.turn_bound), None when it ran out of budget or the tree
+    cannot be solved; `compass` is the previous analysis' turns minus these
+    (positive: closer to a solution), or None when unknown.
+    """
+    def __init__(self, generation: int, turns: Optional[int], solvable: Optional[bool], hint: Optional[List[Play]],
+                 compass: Optional[int], elapsed: float, complete: bool):
+        self.generation = generation
+        self.turns = turns
+        self.solvable = solvable
+        self.hint = hint
+        self.compass = compass
+        self.elapsed = elapsed
+        self.complete = complete
+
+    def describe(self) -> str:
+        """One line for the UI, e.g. "Compass: 3 turns to solve (closer) | Hint: red 2, memory blue 4"."""
+        if self.solvable is False:
+            return "Compass: no solution from here"
+        if self.turns is None:
+            return "Compass: out of budget"
+        trend = ""
+        if self.compass is not None:
+            trend = " (closer)" if self.compass > 0 else " (further)" if self.compass < 0 else " (no closer)"
+        text = f"Compass: {self.turns} turn{'' if self.turns == 1 else 's'} to solve{trend}"
+        if self.hint:
+            text += " | Hint: " + ", ".join(("memory " if from_memory else "") + " + ".join(map(_card_text, cards))
+                                            for from_memory, cards in self.hint)
+        return text
+
+    def __repr__(self):
+        return (f"Analysis(generation={self.generation}, turns={self.turns}, compass={self.compass}, "
+                f"elapsed={self.elapsed * 1000:.1f}ms)")
+
+
+class AnalysisService:
+    """
+    Solves submitted positions in the background. `post` is called from the
+    dispatcher thread with each Analysis that is still current when it
+    finishes. With processes=False the solve runs on that thread instead,
+    which is simpler but competes with the UI for the GIL.
+    """
+    def __init__(self, post: Callable[[Analysis], None], processes: bool = True,
+                 time_limit: Optional[float] = 5.0, max_nodes: Optional[int] = 500000):
+        self.post = post
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self._generation = 0
+        self._pending: Optional[Snapshot] = None
+        self._previous_turns: Optional[int] = None
+        self._wake = threading.Condition()
+        self._closed = False
+        self._pool = None
+        self._solver = None
+        if processes:
+            context = multiprocessing.get_context("spawn")
+            self._shared_generation = context.Value("q", 0, lock=False)
+            self._pool = ProcessPoolExecutor(1, mp_context=context, initializer=_start_worker,
+                                             initargs=(self._shared_generation,))
+        else:
+            self._solver = Solver()
+        self._thread = threading.Thread(target=self._run, name="analysis", daemon=True)
+        self._thread.start()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _bump(self) -> int:
+        # Called with the lock held; the worker process sees the new value on its next poll.
+        self._generation += 1
+        if self._pool is not None:
+            self._shared_generation.value = self._generation
+        return self._generation
+
+    def submit(self, snapshot: Snapshot) -> int:
+        """Queues a position, replacing any not yet started and stopping the one being solved."""
+        with self._wake:
+            snapshot.generation = self._bump()
+            self._pending = snapshot
+            self._wake.notify()
+        return snapshot.generation
+
+    def cancel(self) -> None:
+        """Drops queued and running work without submitting anything new."""
+        with self._wake:
+            self._bump()
+            self._pending = None
+
+    def close(self, timeout: Optional[float] = 1.0) -> None:
+        with self._wake:
+            self._closed = True
+            self._bump()
+            self._wake.notify()
+        self._thread.join(timeout)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _stale(self, generation: int) -> bool:
+        return self._closed or self._generation != generation
+
+    def _run(self) -> None:
+        while True:
+            with self._wake:
+                while self._pending is None and not self._closed:
+                    self._wake.wait()
+                if self._closed:
+                    return
+                snapshot, self._pending = self._pending, None
+            started = time.perf_counter()
+            if self._pool is not None:
+                try:
+                    turns, solvable, hint, complete = self._pool.submit(
+                        _solve_in_worker, snapshot, self.max_nodes, self.time_limit).result()
+                except RuntimeError:  # the pool was shut down under us
+                    return
+            else:
+                solution = _solve(self._solver, snapshot, self.max_nodes, self.time_limit,
+                                  lambda: self._stale(snapshot.generation))
+                turns, solvable, complete = solution.turn_bound, solution.solvable, solution.complete
+                hint = [(from_memory, [card.code for card in cards]) for from_memory, cards in solution.hint or ()] \
+                    if solution.hint is not None else None
+            with self._wake:
+                if self._stale(snapshot.generation):
+                    continue
+                previous = self._previous_turns
+                if turns is not None:
+                    self._previous_turns = turns
+            compass = previous - turns if previous is not None and turns is not None else None
+            hint = [(from_memory, tuple(DefaultCard.from_code(code) for code in codes))
+                    for from_memory, codes in hint] if hint is not None else None
+            self.post(Analysis(snapshot.generation, turns, solvable, hint, compass,
+                               time.perf_counter() - started, complete))
+
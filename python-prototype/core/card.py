@@ -1,4 +1,3 @@
-import pygame
 from abc import ABC, abstractmethod
 
 def rgb_escape(r, g, b):
@@ -18,15 +17,120 @@ colors = {
     "none": {"rgb": (255, 255, 255), "shortname": "n"},
 }
 
+# ----------------------------
+# Packed card encoding
+# ----------------------------
+# A card is one 31-bit integer so zones, memory and the solver can hold
+# millions of them cheaply (and in NumPy arrays, see core/cardarray.py):
+#
+#   bits  0-2   color    index into COLOR_NAMES, 0 = no color
+#   bits  3-10  number   number + 1, 0 = no number (numbers 0..254)
+#   bits 11-18  edition  index into the edition table, 0 = none
+#   bits 19-26  stamp    index into the stamp table, 0 = none
+#   bits 27-30  zone     index into ZONE_NAMES, 0 = none
+
+COLOR_NAMES = [None] + list(colors)
+ZONE_NAMES = [None, "deck", "hand", "stack", "discard", "memory", "problem"]
+
+COLOR_SHIFT, COLOR_MASK = 0, 0x7
+NUMBER_SHIFT, NUMBER_MASK = 3, 0xFF
+EDITION_SHIFT, EDITION_MASK = 11, 0xFF
+STAMP_SHIFT, STAMP_MASK = 19, 0xFF
+ZONE_SHIFT, ZONE_MASK = 27, 0xF
+
+_COLOR_CODES = {name: index for index, name in enumerate(COLOR_NAMES)}
+_ZONE_CODES = {name: index for index, name in enumerate(ZONE_NAMES)}
+
+class StringTable:
+    """Interns free-form strings (editions, stamps) to small indexes; index 0 is None.
+
+    Tables are per process, so codes carrying an edition or stamp should be
+    decoded in the process that made them.
+    """
+    def __init__(self, limit: int):
+        self.names = [None]
+        self.codes = {None: 0}
+        self.limit = limit
+
+    def encode(self, name) -> int:
+        code = self.codes.get(name)
+        if code is None:
+            if len(self.names) > self.limit:
+                raise ValueError(f"too many distinct values, cannot encode {name!r}")
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        return code
+
+EDITIONS = StringTable(EDITION_MASK)
+STAMPS = StringTable(STAMP_MASK)
+
+def pack_card(color: str=None, number: int=None, edition: str=None, stamp: str=None, zone: str=None) -> int:
+    try:
+        color_code = _COLOR_CODES[color]
+        zone_code = _ZONE_CODES[zone]
+    except KeyError as exc:
+        raise ValueError(f"cannot encode card field {exc.args[0]!r}") from None
+    if number is None:
+        number_code = 0
+    elif 0 <= number < NUMBER_MASK:
+        number_code = number + 1
+    else:
+        raise ValueError(f"card number {number!r} out of range")
+    return (color_code
+            | number_code << NUMBER_SHIFT
+            | EDITIONS.encode(edition) << EDITION_SHIFT
+            | STAMPS.encode(stamp) << STAMP_SHIFT
+            | zone_code << ZONE_SHIFT)
+
+def unpack_card(code: int) -> tuple:
+    """Returns (color, number, edition, stamp, zone) for a packed card."""
+    number = (code >> NUMBER_SHIFT) & NUMBER_MASK
+    return (COLOR_NAMES[code & COLOR_MASK],
+            number - 1 if number else None,
+            EDITIONS.names[(code >> EDITION_SHIFT) & EDITION_MASK],
+            STAMPS.names[(code >> STAMP_SHIFT) & STAMP_MASK],
+            ZONE_NAMES[(code >> ZONE_SHIFT) & ZONE_MASK])
+
+def _field(name: str, shift: int, mask: int, names: list):
+    """A card attribute read from and written back into the packed code."""
+    def getter(self):
+        return names[(self.code >> shift) & mask]
+    def setter(self, value):
+        self.code = (self.code & ~(mask << shift)) | pack_card(**{name: value})
+    return property(getter, setter)
+
 class AbstractCard(ABC):
-    def __init__(self, color: str=None, number: int=None, edition: str=None, stamp: str=None, zone: str=None):        
-        self.color = color
-        self.number = number
-        self.edition = edition
-        self.stamp = stamp        
-        self.zone = zone
+    # Cards are thin views over a packed code; no per-instance __dict__.
+    __slots__ = ("code",)
+
+    def __init__(self, color: str=None, number: int=None, edition: str=None, stamp: str=None, zone: str=None):
+        self.code = pack_card(color, number, edition, stamp, zone)
+
+    @classmethod
+    def from_code(cls, code: int) -> 'AbstractCard':
+        card = cls.__new__(cls)
+        card.code = code
+        return card
+
+    color = _field("color", COLOR_SHIFT, COLOR_MASK, COLOR_NAMES)
+
+    @property
+    def number(self):
+        number = (self.code >> NUMBER_SHIFT) & NUMBER_MASK
+        return number - 1 if number else None
+
+    @number.setter
+    def number(self, value):
+        self.code = (self.code & ~(NUMBER_MASK << NUMBER_SHIFT)) | pack_card(number=value)
+
+    edition = _field("edition", EDITION_SHIFT, EDITION_MASK, EDITIONS.names)
+    stamp = _field("stamp", STAMP_SHIFT, STAMP_MASK, STAMPS.names)
+    zone = _field("zone", ZONE_SHIFT, ZONE_MASK, ZONE_NAMES)
 
 class DefaultCard(AbstractCard):
+    __slots__ = ()
+
     def __str__(self):
         return f"{print_colored(f'{self.number}', colors[self.color]['rgb'])}"
     
@@ -0,0 +1,170 @@
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+from .card import (AbstractCard, DefaultCard, pack_card, COLOR_NAMES, COLOR_MASK,
+                   NUMBER_SHIFT, NUMBER_MASK, ZONE_NAMES, ZONE_SHIFT, ZONE_MASK)
+
+# ----------------------------
+# Array-backed card collection
+# ----------------------------
+
+CARD_DTYPE = np.uint32
+
+CardLike = Union[AbstractCard, int]
+
+
+def _code(card: CardLike) -> int:
+    return card.code if isinstance(card, AbstractCard) else int(card)
+
+
+class CardArray:
+    """
+    A growable NumPy array of packed card codes with the operations the zones
+    use (append, extend, extendleft, discard, pop, in, len, iteration), so it can be given
+    to a zone in place of its ZoneCards.
+
+    Cards are stored by value: iterating yields fresh DefaultCard views, and
+    `in` / remove() match on the packed code rather than object identity.
+    """
+    def __init__(self, cards: Iterable[CardLike] = (), capacity: int = 16):
+        codes = [_code(card) for card in cards]
+        self._codes = np.zeros(max(capacity, len(codes)), dtype=CARD_DTYPE)
+        self._codes[:len(codes)] = codes
+        self._size = len(codes)
+        self.version = 0
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray) -> 'CardArray':
+        array = cls(capacity=len(codes))
+        array._codes[:len(codes)] = codes
+        array._size = len(codes)
+        return array
+
+    @property
+    def codes(self) -> np.ndarray:
+        """The packed codes currently held, as a view (no copy)."""
+        return self._codes[:self._size]
+
+    @property
+    def nbytes(self) -> int:
+        return self._codes.nbytes
+
+    def _grow(self, needed: int) -> None:
+        if needed > len(self._codes):
+            grown = np.zeros(max(needed, 2 * len(self._codes)), dtype=CARD_DTYPE)
+            grown[:self._size] = self.codes
+            self._codes = grown
+
+    # List protocol
+
+    def append(self, card: CardLike) -> None:
+        self._grow(self._size + 1)
+        self._codes[self._size] = _code(card)
+        self._size += 1
+        self.version += 1
+
+    def extend(self, cards: Iterable[CardLike]) -> None:
+        codes = np.fromiter((_code(card) for card in cards), dtype=CARD_DTYPE)
+        self._grow(self._size + len(codes))
+        self._codes[self._size:self._size + len(codes)] = codes
+        self._size += len(codes)
+        self.version += 1
+
+    def extendleft(self, cards: Iterable[CardLike]) -> None:
+        codes = np.fromiter((_code(card) for card in cards), dtype=CARD_DTYPE)
+        self._grow(self._size + len(codes))
+        self._codes[len(codes):self._size + len(codes)] = self.codes.copy()
+        self._codes[:len(codes)] = codes
+        self._size += len(codes)
+        self.version += 1
+
+    def index(self, card: CardLike) -> int:
+        hits = np.flatnonzero(self.codes == _code(card))
+        if not len(hits):
+            raise ValueError("card not in CardArray")
+        return int(hits[0])
+
+    def remove(self, card: CardLike) -> None:
+        self.pop(self.index(card))
+
+    def discard(self, card: CardLike) -> bool:
+        hits = np.flatnonzero(self.codes == _code(card))
+        if not len(hits):
+            return False
+        self.pop(int(hits[0]))
+        return True
+
+    def pop(self, index: int = -1) -> DefaultCard:
+        if not self._size:
+            raise IndexError("pop from empty CardArray")
+        if index < 0:
+            index += self._size
+        code = int(self._codes[index])
+        self._codes[index:self._size - 1] = self._codes[index + 1:self._size]
+        self._size -= 1
+        self.version += 1
+        return DefaultCard.from_code(code)
+
+    def clear(self) -> None:
+        self._size = 0
+        self.version += 1
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, card: CardLike) -> bool:
+        return bool((self.codes == _code(card)).any())
+
+    def __reversed__(self):
+        for code in self.codes[::-1].tolist():
+            yield DefaultCard.from_code(code)
+
+    def __iter__(self):
+        for code in self.codes.tolist():
+            yield DefaultCard.from_code(code)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CardArray.from_codes(self.codes[index])
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("CardArray index out of range")
+        return DefaultCard.from_code(int(self._codes[index]))
+
+    def __repr__(self):
+        return f"CardArray({len(self)} cards)"
+
+    # Vectorised queries
+
+    def numbers(self) -> np.ndarray:
+        """Card numbers as an int array, -1 where a card has no number."""
+        return ((self.codes >> NUMBER_SHIFT) & NUMBER_MASK).astype(np.int16) - 1
+
+    def color_codes(self) -> np.ndarray:
+        """Index into COLOR_NAMES for each card, 0 where a card has no color."""
+        return (self.codes & COLOR_MASK).astype(np.uint8)
+
+    def zone_codes(self) -> np.ndarray:
+        """Index into ZONE_NAMES for each card, 0 where a card has no zone."""
+        return ((self.codes >> ZONE_SHIFT) & ZONE_MASK).astype(np.uint8)
+
+    def mask(self, color: Optional[str] = None, number: Optional[int] = None, zone: Optional[str] = None) -> np.ndarray:
+        """Boolean mask of the cards matching every field that is given."""
+        selected = np.ones(self._size, dtype=bool)
+        if color is not None:
+            selected &= self.color_codes() == COLOR_NAMES.index(color)
+        if number is not None:
+            selected &= self.numbers() == number
+        if zone is not None:
+            selected &= self.zone_codes() == ZONE_NAMES.index(zone)
+        return selected
+
+    def count_matching(self, color: Optional[str] = None, number: Optional[int] = None, zone: Optional[str] = None) -> int:
+        return int(self.mask(color, number, zone).sum())
+
+
+def pack_cards(specs: Iterable[tuple]) -> CardArray:
+    """Builds a CardArray from (color, number, edition, stamp, zone) tuples; trailing fields may be left off."""
+    return CardArray(pack_card(*spec) for spec in specs)
@@ -1,38 +1,332 @@
 from abc import ABC, abstractmethod
+import heapq
+import itertools
 import random
-from typing import List, Optional, Callable
-from core.card import DefaultCard
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from core.card import DefaultCard, COLOR_MASK, NUMBER_MASK, NUMBER_SHIFT, pack_card
+from core.profiler import instrumented
+
+class ZoneCards:
+    """
+    Ordered collection of the cards in a zone. Backed by an insertion-ordered
+    dict keyed on the card objects themselves (cards hash by identity), so
+    membership and removal are O(1) while iteration keeps play order.
+
+    `version` is bumped on every change so the renderer can tell when the
+    zone needs repainting without comparing its contents.
+    """
+    __slots__ = ("_cards", "version")
+
+    def __init__(self, cards: Iterable[DefaultCard] = ()):
+        self._cards: Dict[DefaultCard, None] = dict.fromkeys(cards)
+        self.version = 0
+
+    def append(self, card: DefaultCard) -> None:
+        self._cards[card] = None
+        self.version += 1
+
+    def extend(self, cards: Iterable[DefaultCard]) -> None:
+        self._cards.update(dict.fromkeys(cards))
+        self.version += 1
+
+    def discard(self, card: DefaultCard) -> bool:
+        """Removes the card if present; returns whether it was."""
+        if self._cards.pop(card, _MISSING) is _MISSING:
+            return False
+        self.version += 1
+        return True
+
+    def remove(self, card: DefaultCard) -> None:
+        if not self.discard(card):
+            raise ValueError("card not in zone")
+
+    def remove_all(self, cards: Iterable[DefaultCard]) -> None:
+        """Removes cards that are all in the zone, as one change."""
+        members = self._cards
+        for card in cards:
+            del members[card]
+        self.version += 1
+
+    def extendleft(self, cards: Iterable[DefaultCard]) -> None:
+        """Puts cards in front of the zone's, in the given order. Rebuilds the dict, so O(len(zone))."""
+        self._cards = dict.fromkeys(itertools.chain(cards, self._cards))
+        self.version += 1
+
+    def pop(self, index: int = -1) -> DefaultCard:
+        card = self._cards.popitem()[0] if index == -1 else self[index]
+        self._cards.pop(card, None)
+        self.version += 1
+        return card
+
+    def clear(self) -> None:
+        self._cards.clear()
+        self.version += 1
+
+    def __contains__(self, card) -> bool:
+        return card in self._cards
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def __iter__(self):
+        return iter(self._cards)
+
+    def __reversed__(self):
+        return reversed(self._cards)
+
+    def __getitem__(self, index):
+        # Positional access walks the dict; zones are read this way only for
+        # small UI selections (e.g. the highlighted hand card).
+        if isinstance(index, slice):
+            return list(self._cards)[index]
+        if index < 0:
+            index += len(self._cards)
+        if not 0 <= index < len(self._cards):
+            raise IndexError("zone index out of range")
+        return next(itertools.islice(self._cards, index, None))
+
+    def __repr__(self):
+        return f"ZoneCards({list(self._cards)!r})"
+
+_MISSING = object()
+
+class MemoryCards:
+    """
+    Fixed-capacity ring buffer of remembered cards, newest first. Appending is
+    O(1) and evicts the oldest card once full. Cards are also indexed by color
+    and by number so "which remembered cards are red" needs no scan.
+    """
+    __slots__ = ("capacity", "_slots", "_next_seq", "_count", "_by_color", "_by_number", "_seq_of", "version")
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("memory capacity must be at least 1")
+        self.capacity = capacity
+        self._slots: List[Optional[DefaultCard]] = [None] * capacity
+        self._next_seq = 0  # sequence number of the next write; slot is seq % capacity
+        self._count = 0
+        self._by_color: Dict[Optional[str], Dict[int, DefaultCard]] = {}
+        self._by_number: Dict[Optional[int], Dict[int, DefaultCard]] = {}
+        self._seq_of: Dict[DefaultCard, int] = {}
+        self.version = 0
+
+    def append(self, card: DefaultCard) -> None:
+        seq = self._next_seq
+        slot = seq % self.capacity
+        evicted = self._slots[slot]
+        if evicted is not None:
+            self._unindex(seq - self.capacity, evicted)
+        self._slots[slot] = card
+        self._by_color.setdefault(card.color, {})[seq] = card
+        self._by_number.setdefault(card.number, {})[seq] = card
+        self._seq_of[card] = seq
+        self._count += 1
+        self._next_seq = seq + 1
+        self.version += 1
+
+    def extend(self, cards: Iterable[DefaultCard]) -> None:
+        for card in cards:
+            self.append(card)
+
+    def _unindex(self, seq: int, card: DefaultCard) -> None:
+        self._slots[seq % self.capacity] = None
+        self._count -= 1
+        for index, key in ((self._by_color, card.color), (self._by_number, card.number)):
+            bucket = index[key]
+            del bucket[seq]
+            if not bucket:
+                del index[key]
+        if self._seq_of.get(card) == seq:
+            del self._seq_of[card]
+
+    def discard(self, card: DefaultCard) -> bool:
+        seq = self._seq_of.get(card)
+        if seq is None:
+            return False
+        self._unindex(seq, card)
+        self.version += 1
+        return True
+
+    def remove(self, card: DefaultCard) -> None:
+        if not self.discard(card):
+            raise ValueError("card not in memory")
+
+    # Sequence-level access, for writing a core.state.GameState's memory
+    # (which numbers its cards the same way) back a few cards at a time.
+
+    @property
+    def next_seq(self) -> int:
+        """The sequence number the next append gets; the window is the `capacity` numbers below it."""
+        return self._next_seq
+
+    def entries(self) -> Iterator[Tuple[int, DefaultCard]]:
+        """(sequence number, card) pairs, newest first."""
+        oldest = max(self._next_seq - self.capacity, 0)
+        for seq in range(self._next_seq - 1, oldest - 1, -1):
+            card = self._slots[seq % self.capacity]
+            if card is not None:
+                yield seq, card
+
+    def seek(self, next_seq: int) -> None:
+        """
+        Moves the window as if cards had been appended (or, moving back, the
+        latest appends undone) without adding any: cards that fall outside it
+        are dropped.
+        """
+        old = self._next_seq
+        if next_seq > old:
+            dropped = range(max(old - self.capacity, 0), min(old, next_seq - self.capacity))
+        else:
+            dropped = range(max(next_seq, old - self.capacity, 0), old)
+        for seq in dropped:
+            card = self._slots[seq % self.capacity]
+            if card is not None:
+                self._unindex(seq, card)
+        self._next_seq = next_seq
+        self.version += 1
+
+    def put(self, seq: int, card: DefaultCard) -> None:
+        """Remembers `card` under sequence number `seq`, which must be in the window and free."""
+        if not max(self._next_seq - self.capacity, 0) <= seq < self._next_seq:
+            raise IndexError("sequence number outside the memory window")
+        slot = seq % self.capacity
+        if self._slots[slot] is not None:
+            raise ValueError("sequence number already in memory")
+        self._slots[slot] = card
+        for index, key in ((self._by_color, card.color), (self._by_number, card.number)):
+            bucket = index.setdefault(key, {})
+            newest = next(reversed(bucket), -1)
+            bucket[seq] = card
+            if newest > seq:
+                # Buckets are kept oldest first; a card put back below newer ones is sorted into place.
+                index[key] = dict(sorted(bucket.items()))
+        self._seq_of[card] = seq
+        self._count += 1
+        self.version += 1
+
+    def take(self, seq: int) -> DefaultCard:
+        """Removes and returns the card with sequence number `seq`."""
+        card = self._slots[seq % self.capacity] if 0 <= seq < self._next_seq else None
+        if card is None or seq < self._next_seq - self.capacity:
+            raise KeyError(seq)
+        self._unindex(seq, card)
+        self.version += 1
+        return card
+
+    def clear(self) -> None:
+        self._slots = [None] * self.capacity
+        self._count = 0
+        self._by_color.clear()
+        self._by_number.clear()
+        self._seq_of.clear()
+        self.version += 1
+
+    # Queries, newest first
+
+    def with_color(self, color: Optional[str]) -> List[DefaultCard]:
+        return list(reversed(self._by_color.get(color, {}).values()))
+
+    def with_number(self, number: Optional[int]) -> List[DefaultCard]:
+        return list(reversed(self._by_number.get(number, {}).values()))
+
+    def count_color(self, color: Optional[str]) -> int:
+        return len(self._by_color.get(color, ()))
+
+    def count_number(self, number: Optional[int]) -> int:
+        return len(self._by_number.get(number, ()))
+
+    def __contains__(self, card) -> bool:
+        return card in self._seq_of
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        oldest = max(self._next_seq - self.capacity, 0)
+        for seq in range(self._next_seq - 1, oldest - 1, -1):
+            card = self._slots[seq % self.capacity]
+            if card is not None:
+                yield card
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("memory index out of range")
+        return next(itertools.islice(iter(self), index, None))
+
+    def __repr__(self):
+        return f"MemoryCards({list(self)!r})"
 
 class AbstractGameZone:
-    def __init__(self, max_size: int = 5):
-        self.cards: List[DefaultCard] = []
+    # `cards` may be any collection with ZoneCards' interface, e.g.
+    # core.cardarray.CardArray for zones holding very many cards.
+    def __init__(self, max_size: int = 5, cards=None):
+        self.cards: ZoneCards = cards if cards is not None else ZoneCards()
         self.max_size = max_size
 
+    @property
+    def version(self) -> int:
+        """Changes whenever the zone's cards do."""
+        return self.cards.version
+
     def add_card(self, card: DefaultCard) -> None:
         self.cards.append(card)
 
-    def remove_card(self, card: DefaultCard) -> None:
-        if card in self.cards:
-            self.cards.remove(card)
+    def remove_card(self, card: DefaultCard) -> bool:
+        return self.cards.discard(card)
 
+    @instrumented()
     def move_zones(self, card: DefaultCard, from_zone: 'AbstractGameZone', to_zone: 'AbstractGameZone') -> None:
-        if card in from_zone.cards and len(to_zone.cards) < to_zone.max_size:
-            from_zone.remove_card(card)
+        if len(to_zone.cards) < to_zone.max_size and from_zone.remove_card(card):
             to_zone.add_card(card)
 
+    @instrumented()
+    def move_cards(self, cards: Iterable[DefaultCard], to_zone: 'AbstractGameZone') -> List[DefaultCard]:
+        """Moves the given cards, in order, into to_zone until it is full. Returns the cards moved."""
+        room = to_zone.max_size - len(to_zone.cards)
+        moved = []
+        for card in cards:
+            if len(moved) >= room:
+                break
+            if self.remove_card(card):
+                moved.append(card)
+        to_zone.cards.extend(moved)
+        return moved
+
+    def move_all(self, to_zone: 'AbstractGameZone') -> List[DefaultCard]:
+        """Moves this whole zone (or as much of it as fits) into to_zone."""
+        if to_zone.max_size - len(to_zone.cards) >= len(self.cards):
+            moved = list(self.cards)
+            to_zone.cards.extend(moved)
+            self.cards.clear()
+            return moved
+        return self.move_cards(list(self.cards), to_zone)
+
 class HandZone(AbstractGameZone):
     def play_to_stack(self, card: DefaultCard, stack_zone: 'StackZone') -> None:
-        if card in self.cards and len(stack_zone.cards) < stack_zone.max_size:
-            self.move_zones(card, self, stack_zone)
-    
+        self.move_zones(card, self, stack_zone)
+
     def drag_to_discard(self, card: DefaultCard, discard_zone: 'DiscardZone') -> None:
-        if card in self.cards:
-            self.move_zones(card, self, discard_zone)
+        self.move_zones(card, self, discard_zone)
 
 class MemoryZone(AbstractGameZone):
+    def __init__(self, capacity: int = 100):
+        super().__init__(max_size=capacity, cards=MemoryCards(capacity))
+
+    def remember(self, card: DefaultCard) -> None:
+        self.cards.append(card)
+
+    def with_color(self, color: Optional[str]) -> List[DefaultCard]:
+        return self.cards.with_color(color)
+
+    def with_number(self, number: Optional[int]) -> List[DefaultCard]:
+        return self.cards.with_number(number)
+
     def play_to_stack(self, card: DefaultCard, stack_zone: 'StackZone') -> None:
-        if card in self.cards and len(stack_zone.cards) < stack_zone.max_size:
-            self.move_zones(card, self, stack_zone)
+        self.move_zones(card, self, stack_zone)
 
 class DeckZone(AbstractGameZone):
     pass
@@ -40,38 +334,399 @@ class DeckZone(AbstractGameZone):
 class StackZone(AbstractGameZone):
     pass
 
+class DiscardZone(AbstractGameZone):
+    pass
+
+_node_ids = itertools.count()
+
+FrontierKey = Tuple[Optional[str], Optional[int]]
+
+_KEY_MASK = COLOR_MASK | (NUMBER_MASK << NUMBER_SHIFT)
+
+# ProblemZone's pre-order positions: the spacing set when the root is set,
+# and the largest spacing a subtree added between two nodes gets, so later
+# additions in the same gap still find room.
+_GAP = 1 << 40
+_STEP = 1 << 20
+
 # A helper class to represent nodes in the ProblemZone tree.
+#
+# Each node also keeps aggregates over its subtree, so "how many red 5s are
+# still needed under here" or "how far is the root from being exposed" never
+# walk the tree:
+#   remaining          unbeaten nodes by color+number card code (see needed())
+#   unbeaten_leaves    exposed nodes, i.e. the leaves of what is left
+#   depth_to_frontier  levels from this node down to its deepest exposed node
+#                      (0 when it is exposed itself, None when nothing is left)
+# A node computes them from its children when created; add_child and
+# ProblemZone.beat_node/unbeat_node then update them along the path to the root.
 class ProblemNode:
-    def __init__(self, card: DefaultCard, children: Optional[List['ProblemNode']] = None):
+    def __init__(self, card: DefaultCard, children: Optional[List['ProblemNode']] = None, loot: int = 0,
+                 beaten: bool = False):
+        self.id = next(_node_ids)
         self.card = card
         self.children = children if children is not None else []
-    
+        self.loot = loot
+        self.beaten = beaten
+        self.parent: Optional['ProblemNode'] = None
+        self.zone: Optional['ProblemZone'] = None
+        for child in self.children:
+            child.parent = self
+        # Kept up to date by add_child and ProblemZone.beat_node.
+        self.unbeaten_children = sum(1 for child in self.children if not child.beaten)
+        self._aggregate()
+
+    @property
+    def color(self) -> Optional[str]:
+        return self.card.color
+
+    @property
+    def number(self) -> Optional[int]:
+        return self.card.number
+
     def add_child(self, child: 'ProblemNode') -> None:
+        was_exposed = self.is_exposed()
+        child.parent = self
         self.children.append(child)
-    
+        if not child.beaten:
+            self.unbeaten_children += 1
+        self._adjust(child.remaining, child.unbeaten_leaves - (was_exposed and not self.is_exposed()),
+                     None, child.depth_to_frontier)
+        if self.zone is not None:
+            self.zone._on_child_added(self, child)
+
+    def is_exposed(self) -> bool:
+        # A node can be attacked once every child below it is beaten.
+        return not self.beaten and self.unbeaten_children == 0
+
+    def needed(self, color: Optional[str], number: Optional[int]) -> int:
+        """How many unbeaten (color, number) nodes are left in this subtree."""
+        return self.remaining.get(pack_card(color, number), 0)
+
+    # Subtree aggregates
+
+    def _aggregate(self) -> None:
+        """Computes this node's aggregates from its children's."""
+        if not self.children:
+            self.remaining = {} if self.beaten else {self.card.code & _KEY_MASK: 1}
+            self.unbeaten_leaves = 0 if self.beaten else 1
+            self.depth_to_frontier = None if self.beaten else 0
+            return
+        remaining: Dict[int, int] = {}
+        leaves = 0
+        depth = -1
+        for child in self.children:
+            for key, count in child.remaining.items():
+                remaining[key] = remaining.get(key, 0) + count
+            leaves += child.unbeaten_leaves
+            if child.depth_to_frontier is not None and child.depth_to_frontier > depth:
+                depth = child.depth_to_frontier
+        if not self.beaten:
+            key = self.card.code & _KEY_MASK
+            remaining[key] = remaining.get(key, 0) + 1
+        self.remaining = remaining
+        self.unbeaten_leaves = leaves + self.is_exposed()
+        self.depth_to_frontier = depth + 1 if depth >= 0 else None if self.beaten else 0
+
+    def _adjust(self, remaining: Dict[int, int], leaves: int, old_depth: Optional[int],
+                depth: Optional[int]) -> None:
+        """
+        Adds `remaining` counts and `leaves` exposed nodes to this node and each
+        ancestor, after one of this node's children went from depth_to_frontier
+        `old_depth` to `depth`. Depths are re-derived on the way up until one
+        stays the same, rescanning a node's children only when its deepest
+        child got shallower.
+        """
+        node = self
+        while node is not None:
+            for key, delta in remaining.items():
+                count = node.remaining.get(key, 0) + delta
+                if count:
+                    node.remaining[key] = count
+                else:
+                    del node.remaining[key]
+            node.unbeaten_leaves += leaves
+            if old_depth != depth:
+                before = node.depth_to_frontier
+                if depth is not None and (before is None or depth + 1 > before):
+                    node.depth_to_frontier = depth + 1
+                elif old_depth is not None and old_depth + 1 == before:
+                    depths = [child.depth_to_frontier for child in node.children
+                              if child.depth_to_frontier is not None]
+                    node.depth_to_frontier = max(depths) + 1 if depths else None if node.beaten else 0
+                old_depth, depth = before, node.depth_to_frontier
+            elif not remaining and not leaves:
+                break
+            node = node.parent
+
+    def recount(self) -> None:
+        """Rebuilds every count in this subtree, for beaten flags set directly rather than through beat_node."""
+        order = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children)
+        for node in reversed(order):
+            node.unbeaten_children = sum(1 for child in node.children if not child.beaten)
+            node._aggregate()
+
     def __repr__(self):
         return f"ProblemNode(card={self.card}, children={self.children})"
 
 class ProblemZone:
+    """
+    Holds the problem tree plus an index of its exposed nodes (the frontier),
+    bucketed by (color, number) so attacks can find a match without walking the tree.
+
+    When several exposed nodes match, find_exposed returns the first in tree
+    (pre-)order, as core.state.GameState does. Each bucket keeps a heap of
+    its nodes' pre-order positions next to the node dict; entries for nodes
+    that have left the bucket are dropped lazily when they reach the top.
+
+    Positions are numbered _GAP apart when the root is set. A subtree added
+    to the live tree is numbered inside the gap between the last node of
+    its parent's subtree and the node after it, which add_child finds in
+    O(depth) from `_successor` (each node's first node after its subtree),
+    so nothing else is renumbered. Only a used-up gap renumbers the tree.
+
+    Derived structures (e.g. core.treelayout.TreeLayout) can register in
+    `observers` to hear about changes: each observer gets tree_reset(zone)
+    when the root is replaced, child_added(parent, child) after add_child,
+    node_beaten(node) after beat_node and node_unbeaten(node) after unbeat_node.
+    """
     def __init__(self):
-        self.root: Optional[ProblemNode] = None
+        self._root: Optional[ProblemNode] = None
+        self._nodes: Dict[int, ProblemNode] = {}
+        self._frontier: Dict[FrontierKey, Dict[int, ProblemNode]] = {}
+        self._frontier_order: Dict[FrontierKey, List[Tuple[int, int]]] = {}
+        self._order: Dict[int, int] = {}  # node id -> pre-order position
+        self._successor: Dict[int, Optional[ProblemNode]] = {}
+        self.version = 0
+        self.observers: list = []
+
+    @property
+    def root(self) -> Optional[ProblemNode]:
+        return self._root
+
+    @root.setter
+    def root(self, node: Optional[ProblemNode]) -> None:
+        self._root = node
+        self.version += 1
+        self._nodes = {}
+        self._frontier = {}
+        self._frontier_order = {}
+        self._order = {}
+        self._successor = {}
+        if node is not None:
+            self._index_subtree(node, 0, _GAP, None)
+        for observer in self.observers:
+            observer.tree_reset(self)
+
+    @property
+    def solved(self) -> bool:
+        return self.root is not None and self.root.beaten
+
+    @instrumented()
+    def iter_nodes(self):
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(node.children)
+
+    @instrumented()
+    def get_exposed_nodes(self) -> List[ProblemNode]:
+        return [node for bucket in self._frontier.values() for node in bucket.values()]
+
+    @instrumented()
+    def find_exposed(self, color: Optional[str], number: Optional[int],
+                     edition: Optional[str] = None, stamp: Optional[str] = None) -> Optional[ProblemNode]:
+        """
+        Returns the first exposed node in tree order matching the card, or
+        None. Edition and stamp only filter when given.
+        """
+        key = (color, number)
+        bucket = self._frontier.get(key)
+        if not bucket:
+            return None
+        if edition is None and stamp is None:
+            heap = self._frontier_order[key]
+            node = bucket.get(heap[0][1])
+            while node is None:
+                heapq.heappop(heap)
+                node = bucket.get(heap[0][1])
+            return node
+        matches = [node for node in bucket.values()
+                   if (edition is None or node.card.edition == edition) and (stamp is None or node.card.stamp == stamp)]
+        return min(matches, key=lambda node: self._order[node.id]) if matches else None
+
+    @instrumented()
+    def beat_node(self, node_id: int) -> None:
+        node = self._nodes.get(node_id)
+        if node is None or node.beaten:
+            return
+        was_exposed = node.is_exposed()
+        node.beaten = True
+        self.version += 1
+        self._remove_from_frontier(node)
+        key = node.card.code & _KEY_MASK
+        count = node.remaining[key] - 1
+        if count:
+            node.remaining[key] = count
+        else:
+            del node.remaining[key]
+        node.unbeaten_leaves -= was_exposed
+        old_depth = node.depth_to_frontier
+        if old_depth == 0:
+            node.depth_to_frontier = None
+        parent = node.parent
+        if parent is not None:
+            parent.unbeaten_children -= 1
+            exposed = parent.is_exposed()
+            if exposed:
+                self._add_to_frontier(parent)
+            parent._adjust({key: -1}, exposed - was_exposed, old_depth, node.depth_to_frontier)
+        for observer in self.observers:
+            observer.node_beaten(node)
+
+    @instrumented()
+    def unbeat_node(self, node_id: int) -> None:
+        """Undoes beat_node, e.g. when an undo writes an earlier position back."""
+        node = self._nodes.get(node_id)
+        if node is None or not node.beaten:
+            return
+        parent = node.parent
+        parent_was_exposed = parent is not None and parent.is_exposed()
+        node.beaten = False
+        self.version += 1
+        key = node.card.code & _KEY_MASK
+        node.remaining[key] = node.remaining.get(key, 0) + 1
+        exposed = node.is_exposed()
+        node.unbeaten_leaves += exposed
+        old_depth = node.depth_to_frontier
+        if exposed:
+            node.depth_to_frontier = 0
+            self._add_to_frontier(node)
+        if parent is not None:
+            parent.unbeaten_children += 1
+            if parent_was_exposed:
+                self._remove_from_frontier(parent)
+            parent._adjust({key: 1}, exposed - parent_was_exposed, old_depth, node.depth_to_frontier)
+        for observer in self.observers:
+            observer.node_unbeaten(node)
+
+    # Frontier bookkeeping
+
+    def _add_to_frontier(self, node: ProblemNode) -> None:
+        key = (node.color, node.number)
+        self._frontier.setdefault(key, {})[node.id] = node
+        heapq.heappush(self._frontier_order.setdefault(key, []), (self._order[node.id], node.id))
+
+    def _remove_from_frontier(self, node: ProblemNode) -> None:
+        key = (node.color, node.number)
+        bucket = self._frontier.get(key)
+        if bucket is not None and bucket.pop(node.id, None) is not None and not bucket:
+            del self._frontier[key]
+            del self._frontier_order[key]
+
+    @instrumented()
+    def _index_subtree(self, top: ProblemNode, position: int, step: int, successor: Optional[ProblemNode]) -> None:
+        # Pre-order from `position`, `step` apart, so the heaps stay in tree
+        # order; `successor` is the node after the whole subtree.
+        nodes, order, successors = self._nodes, self._order, self._successor
+        frontier, heaps = self._frontier, self._frontier_order
+        stack = [(top, successor)]
+        while stack:
+            node, after = stack.pop()
+            node.zone = self
+            node_id = node.id
+            nodes[node_id] = node
+            order[node_id] = position
+            successors[node_id] = after
+            if node.is_exposed():
+                key = (node.card.color, node.card.number)
+                bucket = frontier.get(key)
+                if bucket is None:
+                    frontier[key] = {node_id: node}
+                    heaps[key] = [(position, node_id)]
+                else:
+                    bucket[node_id] = node
+                    heapq.heappush(heaps[key], (position, node_id))
+            position += step
+            children = node.children
+            for index in range(len(children) - 1, -1, -1):
+                stack.append((children[index], after))
+                after = children[index]
+
+    def _renumber(self) -> None:
+        """Renumbers every node _GAP apart in tree order and rebuilds the frontier heaps to match."""
+        order = self._order
+        stack = [self._root]
+        position = 0
+        while stack:
+            node = stack.pop()
+            order[node.id] = position
+            position += _GAP
+            stack.extend(reversed(node.children))
+        self._frontier_order = {key: sorted((order[node_id], node_id) for node_id in bucket)
+                                for key, bucket in self._frontier.items()}
+
+    def _on_child_added(self, parent: ProblemNode, child: ProblemNode) -> None:
+        self.version += 1
+        if not child.beaten:
+            self._remove_from_frontier(parent)
+        order, successors = self._order, self._successor
+        # The nodes that ended the parent's subtree (the last child and its
+        # last descendants) are now followed by the new child.
+        last = parent
+        if len(parent.children) > 1:
+            last = parent.children[-2]
+            while True:
+                successors[last.id] = child
+                if not last.children:
+                    break
+                last = last.children[-1]
+        successor = successors[parent.id]
+        start = order[last.id]
+        if successor is None:
+            step = _GAP
+        else:
+            size, pending = 0, [child]
+            while pending:
+                size += 1
+                pending.extend(pending.pop().children)
+            step = min(_STEP, (order[successor.id] - start) // (size + 1))
+        self._index_subtree(child, start + step, step, successor)
+        if step < 1:
+            self._renumber()
+        for observer in self.observers:
+            observer.child_added(parent, child)
 
     @staticmethod
-    def generate_random_tree(depth: int, max_children: int, card_generator: Callable[[], DefaultCard]) -> 'ProblemZone':
-        def generate_node(current_depth: int) -> Optional[ProblemNode]:
-            if current_depth > depth:
-                return None
-            card = card_generator()
-            num_children = random.randint(0, max_children)
-            children = []
-            for _ in range(num_children):
-                child = generate_node(current_depth + 1)
-                if child is not None:
-                    children.append(child)
-            return ProblemNode(card, children)
-        
+    def generate_random_tree(depth: int, max_children: int, card_generator: Callable[[], DefaultCard],
+                             rng: Optional[random.Random] = None) -> 'ProblemZone':
+        """
+        Grows a tree of up to `depth` levels. Nodes are generated depth-first
+        from an explicit stack, in the same order the recursive version used.
+        Pass `rng` to draw child counts from a seeded Random instead of the
+        global one; core.treegen has the seeded, batched generator.
+        """
         instance = ProblemZone()
-        instance.root = generate_node(1)
+        if depth < 1:
+            return instance
+        randint = (rng or random).randint
+        root = ProblemNode(card_generator())
+        pending = [(root, 1, randint(0, max_children))]
+        while pending:
+            node, level, remaining = pending.pop()
+            if remaining == 0 or level >= depth:
+                continue
+            pending.append((node, level, remaining - 1))
+            child = ProblemNode(card_generator())
+            node.add_child(child)
+            pending.append((child, level + 1, randint(0, max_children)))
+        instance.root = root
         return instance
 
     def __repr__(self):
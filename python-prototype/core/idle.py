@@ -0,0 +1,229 @@
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+from .gamezone import ProblemNode, ProblemZone
+
+# ----------------------------
+# Idle progress
+# ----------------------------
+# Neurons solve the problem tree on their own, one tick at a time. Every tick:
+#
+#   1. each solved node pays `income` Knowledge, and `income` points in its
+#      color's category (rates as they stood at the start of the tick);
+#   2. every neuron does `work_per_tick` work on its node; a node is beaten
+#      once it has had `work_per_number` work per point of its card number
+#      (at least one point's worth), paying its loot. Nodes finishing on the
+#      same tick are beaten in id order, and beating a node's last child
+#      exposes the node itself;
+#   3. with auto_hire, neurons are hired while the Knowledge covers the next
+#      one, each `hire_growth` percent dearer than the last;
+#   4. idle neurons take the exposed nodes nobody works on, lowest id first.
+#      A neuron stays on its node until it is beaten.
+#
+# Between two events (a node beaten, a neuron hired) nothing changes but the
+# counters, which grow by constant rates, so advance() does not loop over
+# ticks: it computes when the next event fires (the earliest finishing node,
+# or the tick the Knowledge reaches the next hire), adds the quiet ticks
+# before it in closed form and steps the event tick exactly. Being away for
+# days costs one step per event, and once the tree is solved nothing but
+# the rates is left. All counters are integers, so the result is exactly
+# that of stepping tick by tick.
+#
+# The engine observes its ProblemZone, so nodes the player beats by hand
+# free their neuron and count towards the rates like any other.
+
+TICKS_PER_SECOND = 10
+
+
+class IdleRules:
+    """How fast neurons work and what solving pays."""
+    def __init__(self,
+                 work_per_tick: int = 1,
+                 work_per_number: int = 10,
+                 income: int = 1,
+                 auto_hire: bool = True,
+                 hire_cost: int = 100,
+                 hire_growth: int = 15,
+                 ticks_per_second: int = TICKS_PER_SECOND):
+        if work_per_tick < 1 or work_per_number < 1:
+            raise ValueError("work_per_tick and work_per_number must be at least 1")
+        if income < 0 or hire_cost < 1 or hire_growth < 0:
+            raise ValueError("need income >= 0, hire_cost >= 1 and hire_growth >= 0")
+        self.work_per_tick = work_per_tick
+        self.work_per_number = work_per_number
+        self.income = income
+        self.auto_hire = auto_hire
+        self.hire_cost = hire_cost
+        self.hire_growth = hire_growth
+        self.ticks_per_second = ticks_per_second
+
+    def work(self, node: ProblemNode) -> int:
+        return max(1, node.number or 0) * self.work_per_number
+
+    def ticks_to_solve(self, node: ProblemNode) -> int:
+        return -(-self.work(node) // self.work_per_tick)
+
+    def hire_price(self, hired: int) -> int:
+        """The price of the next neuron after `hired` hires, in whole Knowledge."""
+        return self.hire_cost * (100 + self.hire_growth) ** hired // 100 ** hired
+
+
+class IdleEngine:
+    """
+    Runs neurons over a ProblemZone. `knowledge`, `points` (per color) and
+    `tick` are the running totals; `neurons` counts every neuron, working or
+    idle, and `hired` those bought with Knowledge.
+    """
+    def __init__(self, zone: ProblemZone, rules: Optional[IdleRules] = None, neurons: int = 1,
+                 knowledge: int = 0, tick: int = 0):
+        self.zone = zone
+        self.rules = rules or IdleRules()
+        self.neurons = neurons
+        self.hired = 0
+        self.knowledge = knowledge
+        self.points: Dict[Optional[str], int] = {}
+        self.tick = tick
+        self.solved = 0
+        self._solved_by_color: Dict[Optional[str], int] = {}
+        self._assigned: Dict[int, Tuple[int, ProblemNode]] = {}  # node id -> (finishing tick, node)
+        self._finishing: List[Tuple[int, int]] = []  # (finishing tick, node id); stale entries are skipped
+        self._waiting: List[Tuple[int, ProblemNode]] = []  # exposed nodes, checked again when taken
+        zone.observers.append(self)
+        self.tree_reset(zone)
+
+    # ProblemZone observer hooks
+
+    def tree_reset(self, zone: ProblemZone) -> None:
+        self.solved = 0
+        self._solved_by_color = {}
+        self._assigned = {}
+        self._finishing = []
+        self._waiting = []
+        if zone.root is not None:
+            self._index(zone.root)
+
+    def child_added(self, parent: ProblemNode, child: ProblemNode) -> None:
+        self._index(child)
+        if not parent.is_exposed():
+            self._assigned.pop(parent.id, None)  # its neuron starts over elsewhere
+
+    def node_beaten(self, node: ProblemNode) -> None:
+        self.solved += 1
+        self._solved_by_color[node.color] = self._solved_by_color.get(node.color, 0) + 1
+        self._assigned.pop(node.id, None)
+        parent = node.parent
+        if parent is not None and parent.is_exposed():
+            heapq.heappush(self._waiting, (parent.id, parent))
+
+    def node_unbeaten(self, node: ProblemNode) -> None:
+        self.solved -= 1
+        self._solved_by_color[node.color] -= 1
+        if node.parent is not None:
+            self._assigned.pop(node.parent.id, None)  # no longer exposed
+        if node.is_exposed():
+            heapq.heappush(self._waiting, (node.id, node))
+
+    def _index(self, top: ProblemNode) -> None:
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if node.beaten:
+                self.solved += 1
+                self._solved_by_color[node.color] = self._solved_by_color.get(node.color, 0) + 1
+            elif node.is_exposed():
+                self._waiting.append((node.id, node))
+            stack.extend(node.children)
+        heapq.heapify(self._waiting)
+
+    # Progress
+
+    @property
+    def knowledge_rate(self) -> int:
+        """Knowledge per tick."""
+        return self.rules.income * self.solved
+
+    @property
+    def working(self) -> int:
+        return len(self._assigned)
+
+    def _produce(self, ticks: int) -> None:
+        income = self.rules.income * ticks
+        self.knowledge += income * self.solved
+        for color, count in self._solved_by_color.items():
+            self.points[color] = self.points.get(color, 0) + income * count
+
+    def _hire(self) -> None:
+        rules = self.rules
+        while rules.auto_hire and self.knowledge >= rules.hire_price(self.hired):
+            self.knowledge -= rules.hire_price(self.hired)
+            self.hired += 1
+            self.neurons += 1
+
+    def _assign(self) -> None:
+        while len(self._assigned) < self.neurons and self._waiting:
+            node_id, node = heapq.heappop(self._waiting)
+            if node_id in self._assigned or node.zone is not self.zone or not node.is_exposed():
+                continue
+            finish = self.tick + self.rules.ticks_to_solve(node)
+            self._assigned[node_id] = (finish, node)
+            heapq.heappush(self._finishing, (finish, node_id))
+
+    def _next_finish(self) -> Optional[int]:
+        finishing = self._finishing
+        while finishing:
+            finish, node_id = finishing[0]
+            entry = self._assigned.get(node_id)
+            if entry is not None and entry[0] == finish:
+                return finish
+            heapq.heappop(finishing)
+        return None
+
+    def _next_hire(self) -> Optional[int]:
+        rate = self.knowledge_rate
+        if not self.rules.auto_hire or not rate:
+            return None
+        missing = self.rules.hire_price(self.hired) - self.knowledge
+        return self.tick + max(1, -(-missing // rate))
+
+    def _step(self) -> int:
+        """Plays one tick exactly; returns the number of nodes beaten."""
+        self._produce(1)
+        self.tick += 1
+        beaten = 0
+        while self._next_finish() == self.tick:
+            _, node_id = heapq.heappop(self._finishing)
+            node = self._assigned[node_id][1]
+            self.zone.beat_node(node_id)  # node_beaten frees the neuron and updates the rates
+            self.knowledge += node.loot
+            beaten += 1
+        self._hire()
+        self._assign()
+        return beaten
+
+    def advance(self, ticks: int) -> int:
+        """Plays `ticks` ticks, jumping from event to event; returns the number of nodes beaten."""
+        self._assign()  # anything exposed or hired since the last call
+        end = self.tick + ticks
+        beaten = 0
+        while self.tick < end:
+            events = [end]
+            for event in (self._next_finish(), self._next_hire()):
+                if event is not None:
+                    events.append(event)
+            quiet = min(events) - self.tick - 1
+            self._produce(quiet)
+            self.tick += quiet
+            beaten += self._step()
+        return beaten
+
+    def catch_up(self, seconds: float) -> int:
+        """Plays the ticks that fit in `seconds` away from the game, e.g. since the last save."""
+        return self.advance(int(seconds * self.rules.ticks_per_second))
+
+    def close(self) -> None:
+        self.zone.observers.remove(self)
+
+    def __repr__(self):
+        return (f"IdleEngine(tick={self.tick}, knowledge={self.knowledge}, neurons={self.neurons}, "
+                f"working={self.working}, solved={self.solved})")
+
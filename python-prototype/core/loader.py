@@ -0,0 +1,475 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from json.decoder import JSONDecodeError, scanstring
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .card import (AbstractCard, DefaultCard, EDITIONS, STAMPS,
+                   EDITION_SHIFT, EDITION_MASK, STAMP_SHIFT, STAMP_MASK)
+from .gamezone import ProblemNode
+
+# ----------------------------
+# JSON loaders
+# ----------------------------
+# load_deck and load_problem_tree decode with the json module and build nodes
+# from the result with an explicit stack, which is the fastest way through
+# CPython. The json module recurses, though, so a tree nested deeper than it
+# can go is read instead as a stream of parse events (iter_json_events),
+# which never recurses and never holds the file as one big dict alongside
+# the built nodes. iter_deck streams the same way.
+
+CHUNK_SIZE = 1 << 16
+# Keep at least this many characters buffered ahead of the parse position, so
+# a number, literal or key/colon pair is never cut in half at a chunk boundary.
+_LOOKAHEAD = 64
+
+# One regex match per token. A comma before the token is captured rather
+# than skipped, so iter_json_events can check it stands where JSON allows
+# one; a string followed by a colon is a key.
+_TOKEN = re.compile(r"""[ \t\n\r]*(?P<comma>,[ \t\n\r]*)?(?:
+      (?P<open>[{\[])
+    | (?P<close>[}\]])
+    | "(?P<str>[^"\\\x00-\x1f]*)"(?P<colon>[ \t\n\r]*:)?
+    | (?P<num>-?(?:0|[1-9]\d*)(?P<frac>\.\d+)?(?P<exp>[eE][-+]?\d+)?)
+    | (?P<lit>true|false|null)
+    | (?P<other>\S)
+    )?""", re.VERBOSE)
+_COLON = re.compile(r'[ \t\n\r]*:')
+_LITERALS = {"true": True, "false": False, "null": None}
+_DECODER = json.JSONDecoder()
+
+# What may come next: a value (the top level, after a key or after a comma
+# in an array), a key (after a comma in a map), either of those or the
+# closer of a container just opened, a comma or closer after a member, or
+# nothing at all once the top-level value is done.
+_VALUE, _KEY, _FIRST_VALUE, _FIRST_KEY, _AFTER, _END = range(6)
+_EXPECTED = {_VALUE: "a value", _KEY: "a key", _FIRST_VALUE: "a value or ']'", _FIRST_KEY: "a key or '}'",
+             _AFTER: "',' or a closing bracket", _END: "the end of the document"}
+
+
+def _unexpected(what: str, state: int, buf: str, pos: int) -> JSONDecodeError:
+    return JSONDecodeError(f"expected {_EXPECTED[state]}, found {what}", buf, pos)
+
+
+def iter_json_events(fp, chunk_size: int = CHUNK_SIZE, leaf=None) -> Iterator[Tuple[str, object]]:
+    """
+    Yields (event, value) pairs for a JSON text read from `fp` in chunks.
+    Events are start_map, end_map, start_array, end_array (value None),
+    key (the key string) and value (a string, number, bool, None, or a whole
+    container when `leaf` says so). Text that is not JSON (missing or extra
+    commas, a key without a colon, mismatched brackets, anything after the
+    top-level value) raises json.JSONDecodeError where it goes wrong.
+
+    `leaf(containers, key)` is asked before each container opens, with the
+    open container kinds ('map'/'array') and the key it sits under; when it
+    returns True the container is decoded in one go by the json module
+    instead of event by event. Small records such as cards are read this way.
+    """
+    buf = fp.read(chunk_size)
+    pos = 0
+    eof = not buf
+    containers = []
+    key = None
+    state = _VALUE
+    comma = False  # a comma read with only whitespace after it so far
+
+    while True:
+        while not eof and len(buf) - pos < _LOOKAHEAD:
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+        match = _TOKEN.match(buf, pos)
+        kind = match.lastgroup
+        if kind == 'colon':
+            kind = 'str'
+        elif kind == 'comma':
+            kind = None
+        if match.group('comma') is not None:
+            if comma:
+                raise JSONDecodeError("expected a value after ','", buf, match.start('comma'))
+            comma = True
+        if kind is None:
+            # Only whitespace (and maybe a comma) left in the buffer.
+            if eof:
+                break
+            pos = match.end()
+            continue
+        start = match.start(kind)
+        if comma:
+            if state != _AFTER:
+                raise _unexpected("','", state, buf, start)
+            # From here the state remembers the comma, so a retried token does not see it twice.
+            state, comma = (_KEY if containers[-1] == 'map' else _VALUE), False
+        if kind == 'close':
+            closer = match.group('close')
+            wanted = _FIRST_KEY if closer == '}' else _FIRST_VALUE
+            if state != _AFTER and state != wanted or containers[-1:] != ['map' if closer == '}' else 'array']:
+                raise _unexpected(repr(closer), state, buf, start)
+            pos, key = match.end(), None
+            containers.pop()
+            state = _AFTER if containers else _END
+            yield ('end_map' if closer == '}' else 'end_array'), None
+            continue
+        if kind == 'str' or (kind == 'other' and match.group('other') == '"'):
+            quote = match.start('str') - 1 if kind == 'str' else match.start('other')
+            if not eof and len(buf) - match.end() < _LOOKAHEAD:
+                # Make sure a colon after the string is buffered before deciding it is not a key.
+                chunk = fp.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[quote:] + chunk, 0
+                continue
+            if kind == 'str':
+                text, end = match.group('str'), match.end()
+                is_key = match.group('colon') is not None
+            else:
+                # Strings with escapes go through the json module's scanner.
+                try:
+                    text, end = scanstring(buf, match.end())
+                except JSONDecodeError:
+                    if eof:
+                        raise
+                    chunk = fp.read(chunk_size)
+                    eof = not chunk
+                    buf, pos = buf[quote:] + chunk, 0
+                    continue
+                colon = _COLON.match(buf, end)
+                is_key = colon is not None
+                if is_key:
+                    end = colon.end()
+            if is_key:
+                if state != _KEY and state != _FIRST_KEY:
+                    raise _unexpected("a key", state, buf, quote)
+                pos, key, state = end, text, _VALUE
+                yield 'key', text
+                continue
+            if state != _VALUE and state != _FIRST_VALUE:
+                raise _unexpected("a string", state, buf, quote)
+            pos, key = end, None
+            state = _AFTER if containers else _END
+            yield 'value', text
+            continue
+        if state != _VALUE and state != _FIRST_VALUE:
+            raise _unexpected(repr(match.group(kind)), state, buf, start)
+        if kind == 'open':
+            if leaf is not None and leaf(containers, key):
+                try:
+                    value, end = _DECODER.raw_decode(buf, start)
+                except JSONDecodeError:
+                    if eof:
+                        raise
+                    # The record runs past the buffer; read on and retry.
+                    chunk = fp.read(chunk_size)
+                    eof = not chunk
+                    buf, pos = buf[start:] + chunk, 0
+                    continue
+                pos, key = end, None
+                state = _AFTER if containers else _END
+                yield 'value', value
+                continue
+            pos, key = match.end(), None
+            if match.group('open') == '{':
+                containers.append('map')
+                state = _FIRST_KEY
+                yield 'start_map', None
+            else:
+                containers.append('array')
+                state = _FIRST_VALUE
+                yield 'start_array', None
+            continue
+        if kind == 'other':
+            raise JSONDecodeError(f"unexpected {match.group('other')!r}", buf, start)
+        pos, key = match.end(), None
+        state = _AFTER if containers else _END
+        if kind == 'num':
+            number = match.group('num')
+            yield 'value', float(number) if match.group('frac') or match.group('exp') else int(number)
+        else:
+            yield 'value', _LITERALS[match.group('lit')]
+    if comma:
+        raise JSONDecodeError("expected a value after ','", buf, len(buf))
+    if state != _END:
+        raise _unexpected("the end of the document", state, buf, len(buf))
+
+
+def card_from_dict(card_info: dict) -> DefaultCard:
+    # Create a DefaultCard using provided attributes.
+    return DefaultCard(
+        color=card_info.get("color"),
+        number=card_info.get("number"),
+        edition=card_info.get("edition"),
+        stamp=card_info.get("stamp"),
+        zone=card_info.get("zone")
+    )
+
+
+def node_from_dict(node_info: dict) -> ProblemNode:
+    # Children arrive already built, since the builder finishes inner values first.
+    card = node_info.get("card")
+    return ProblemNode(card if card is not None else DefaultCard(), node_info.get("children", []),
+                       loot=node_info.get("loot", 0))
+
+
+# What a container becomes, by (role of its parent, key it sits under).
+_TREE_ROLES = {(None, None): "node", ("node", "children"): "children",
+               ("children", None): "node", ("node", "card"): "card"}
+_DECK_ROLES = {(None, None): "deck", ("deck", None): "card"}
+_FINISHERS = {"node": node_from_dict, "card": card_from_dict}
+
+
+def _tree_leaf(containers: list, key: Optional[str]) -> bool:
+    return key == "card"
+
+
+def _deck_leaf(containers: list, key: Optional[str]) -> bool:
+    return len(containers) == 1
+
+
+def _assemble(events: Iterable[Tuple[str, object]], roles: dict, stream_role: Optional[str] = None):
+    """
+    Builds values from parse events without recursion. Containers whose role
+    has a finisher are converted as soon as they close. Values finished inside
+    a container of `stream_role` are yielded instead of kept; otherwise the
+    single top-level value is yielded at the end.
+    """
+    stack = []  # [container, role, pending key]
+    top = []
+    for event, value in events:
+        if event == 'key':
+            stack[-1][2] = value
+            continue
+        if event in ('start_map', 'start_array'):
+            parent_role = stack[-1][1] if stack else None
+            key = stack[-1][2] if stack and isinstance(stack[-1][0], dict) else None
+            stack.append([{} if event == 'start_map' else [], roles.get((parent_role, key)), None])
+            continue
+        if event in ('end_map', 'end_array'):
+            container, role, _ = stack.pop()
+            finish = _FINISHERS.get(role)
+            value = finish(container) if finish else container
+        elif isinstance(value, dict) and stack:
+            # A container the tokenizer decoded whole (see `leaf`).
+            parent = stack[-1]
+            finish = _FINISHERS.get(roles.get((parent[1], parent[2] if isinstance(parent[0], dict) else None)))
+            if finish:
+                value = finish(value)
+        if not stack:
+            top = [value]
+            continue
+        parent = stack[-1]
+        if stream_role is not None and parent[1] == stream_role:
+            yield value
+        elif isinstance(parent[0], dict):
+            parent[0][parent[2]] = value
+        else:
+            parent[0].append(value)
+    # Only once the events run out, so text after the value is still checked.
+    if stream_role is None:
+        yield from top
+
+
+def tree_from_dict(tree_info: dict) -> ProblemNode:
+    """Builds the ProblemNodes for a decoded problems.json without recursion."""
+    # Breadth-first order lists every parent before its children, so building
+    # it backwards finishes each node's children before the node.
+    order = [tree_info]
+    for node_info in order:
+        order.extend(node_info.get("children", ()))
+    built = {}
+    for node_info in reversed(order):
+        card = node_info.get("card")
+        built[id(node_info)] = ProblemNode(card_from_dict(card) if card is not None else DefaultCard(),
+                                           [built.pop(id(child)) for child in node_info.get("children", ())],
+                                           loot=node_info.get("loot", 0))
+    return built[id(tree_info)]
+
+
+def iter_deck(filepath: str) -> Iterator[DefaultCard]:
+    """Yields the cards of a deck.json one at a time."""
+    with open(filepath, "r") as f:
+        yield from _assemble(iter_json_events(f, leaf=_deck_leaf), _DECK_ROLES, stream_role="deck")
+
+
+def load_deck(filepath: str) -> List[AbstractCard]:
+    """Assumes deck.json is a list of card attribute dicts, or is a compiled pack."""
+    if not os.path.exists(filepath):
+        return []
+    if filepath.endswith(COMPILED_SUFFIX):
+        with CompiledPack(filepath) as pack:
+            return pack.cards()
+    with open(filepath, "r") as f:
+        deck_info = json.load(f)
+    if not isinstance(deck_info, list):
+        raise ValueError(f"{filepath}: a deck is a JSON list of cards")
+    return [card_from_dict(card_info) for card_info in deck_info]
+
+
+def load_problem_tree(filepath: str) -> Optional[ProblemNode]:
+    """
+    Assumes problems.json has a structure like:
+    {
+        "card": { "color": "red", "number": 5, ... },
+        "loot": 1,
+        "children": [ { "card": { ... }, "children": [ ... ] }, ... ]
+    }
+    or is a compiled pack.
+    """
+    if not os.path.exists(filepath):
+        return None
+    if filepath.endswith(COMPILED_SUFFIX):
+        with CompiledPack(filepath) as pack:
+            return pack.to_tree()
+    with open(filepath, "r") as f:
+        try:
+            return tree_from_dict(json.load(f))
+        except RecursionError:
+            # Too deep for the json module; stream it instead.
+            f.seek(0)
+            return next(_assemble(iter_json_events(f, leaf=_tree_leaf), _TREE_ROLES), None)
+
+
+# ----------------------------
+# Compiled binary packs
+# ----------------------------
+# A compiled pack is a flat, memory-mappable file:
+#
+#   header   magic, kind, count, table length       (<8sIII)
+#   tables   UTF-8 JSON {"editions": [...], "stamps": [...]}, padded to 4 bytes
+#   codes    uint32[count]   packed cards (see core/card.py)
+#   loot     int32[count]    tree packs only
+#   offsets  uint32[count+1] tree packs only; node i's children are nodes
+#                            offsets[i]..offsets[i+1]-1 (nodes are in BFS order)
+#
+# Arrays are little-endian and are exposed as zero-copy memoryviews.
+
+COMPILED_SUFFIX = ".cpack"
+MAGIC = b"CONWAYP1"
+HEADER = struct.Struct("<8sIII")
+KIND_DECK, KIND_TREE = 0, 1
+
+
+def _tables_blob() -> bytes:
+    blob = json.dumps({"editions": EDITIONS.names, "stamps": STAMPS.names}).encode("utf-8")
+    return blob + b" " * (-len(blob) % 4)
+
+
+def _write_pack(path: str, kind: int, codes: List[int], loot: List[int] = None, offsets: List[int] = None) -> None:
+    tables = _tables_blob()
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, kind, len(codes), len(tables)))
+        f.write(tables)
+        f.write(struct.pack(f"<{len(codes)}I", *codes))
+        if kind == KIND_TREE:
+            f.write(struct.pack(f"<{len(loot)}i", *loot))
+            f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+
+
+def compile_deck(cards: Iterable[AbstractCard], path: str) -> None:
+    _write_pack(path, KIND_DECK, [card.code for card in cards])
+
+
+def compile_problem_tree(root: ProblemNode, path: str) -> None:
+    order = [root]
+    offsets = [1]
+    for node in order:  # BFS: `order` grows while we walk it
+        order.extend(node.children)
+        offsets.append(offsets[-1] + len(node.children))
+    _write_pack(path, KIND_TREE, [node.card.code for node in order],
+                [node.loot for node in order], offsets[:-1] + [len(order)])
+
+
+def compile_pack(source: str, target: Optional[str] = None) -> str:
+    """Compiles a deck or problem JSON file (told apart by its top-level type) into a pack."""
+    target = target or os.path.splitext(source)[0] + COMPILED_SUFFIX
+    with open(source, "r") as f:
+        first = next(iter_json_events(f), (None, None))[0]
+    if first == 'start_array':
+        compile_deck(iter_deck(source), target)
+    else:
+        compile_problem_tree(load_problem_tree(source), target)
+    return target
+
+
+class CompiledPack:
+    """A memory-mapped compiled pack. The arrays are views onto the file, not copies."""
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.kind, self.count, tables_len = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled pack")
+        start = HEADER.size
+        tables = json.loads(bytes(self._map[start:start + tables_len]))
+        self.editions = tables["editions"]
+        self.stamps = tables["stamps"]
+        start += tables_len
+        self.codes = self._array(start, self.count, "I")
+        self.loot = self.offsets = None
+        if self.kind == KIND_TREE:
+            self.loot = self._array(start + 4 * self.count, self.count, "i")
+            self.offsets = self._array(start + 8 * self.count, self.count + 1, "I")
+        # Editions and stamps are interned per process; map the file's indexes onto ours.
+        self._edition_map = [EDITIONS.encode(name) for name in self.editions]
+        self._stamp_map = [STAMPS.encode(name) for name in self.stamps]
+        # Usually they line up already and the codes can be used as they are.
+        self._same_tables = (self._edition_map == list(range(len(self.editions)))
+                             and self._stamp_map == list(range(len(self.stamps))))
+
+    def _array(self, offset: int, length: int, fmt: str):
+        view = memoryview(self._map)[offset:offset + 4 * length]
+        if sys.byteorder == "little":
+            return view.cast(fmt)
+        return list(struct.unpack(f"<{length}{fmt}", view))
+
+    def card(self, index: int) -> DefaultCard:
+        code = self.codes[index]
+        edition = self._edition_map[(code >> EDITION_SHIFT) & EDITION_MASK]
+        stamp = self._stamp_map[(code >> STAMP_SHIFT) & STAMP_MASK]
+        code &= ~((EDITION_MASK << EDITION_SHIFT) | (STAMP_MASK << STAMP_SHIFT))
+        return DefaultCard.from_code(code | edition << EDITION_SHIFT | stamp << STAMP_SHIFT)
+
+    def cards(self) -> List[DefaultCard]:
+        if self._same_tables:
+            return list(map(DefaultCard.from_code, self.codes))
+        return [self.card(index) for index in range(self.count)]
+
+    def to_tree(self) -> Optional[ProblemNode]:
+        """
+        Builds ProblemNodes bottom-up (children always follow parents in BFS
+        order). Unlike the arrays this is a copy: the game needs live nodes,
+        and building them is most of the time a tree pack takes to load.
+        """
+        if self.kind != KIND_TREE or not self.count:
+            return None
+        nodes = [None] * self.count
+        cards, loot, offsets = self.cards(), self.loot, self.offsets
+        for index in range(self.count - 1, -1, -1):
+            nodes[index] = ProblemNode(cards[index], nodes[offsets[index]:offsets[index + 1]], loot=loot[index])
+        return nodes[0]
+
+    def close(self) -> None:
+        for name in ("codes", "loot", "offsets"):
+            view = getattr(self, name)
+            if isinstance(view, memoryview):
+                view.release()
+            setattr(self, name, None)
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile deck/problem JSON into memory-mappable packs.")
+    parser.add_argument("sources", nargs="+", help="JSON files to compile")
+    args = parser.parse_args()
+    for source in args.sources:
+        print(f"{source} -> {compile_pack(source)}")
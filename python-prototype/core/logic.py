@@ -1,28 +1,147 @@
 import random
-from .card import DefaultCard
-from .gamezone import AbstractGameZone
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from .card import DefaultCard, COLOR_NAMES, COLOR_MASK, NUMBER_SHIFT, NUMBER_MASK
+from .gamezone import AbstractGameZone, ZoneCards
+from .profiler import instrumented
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .jokers import JokerChain
+
+# Deck, single-card attacks and single-stack resolves are plain Python;
+# NumPy is imported by the batched stack functions on first use, so
+# importing the game logic stays cheap for workers and tools that never
+# resolve many stacks at once.
+
+_RED = COLOR_NAMES.index('red')
 
 # Deck Logic
+def pick_order(cards, rng: random.Random) -> list:
+    """
+    The order a Deck holding `cards` and drawing with `rng` deals them in,
+    first draw first: the same picks as Deck._take makes, one rng.random()
+    call per card, however the draws are batched. Advances `rng`.
+    """
+    cards = list(cards)
+    rand = rng.random
+    order = []
+    for last in range(len(cards) - 1, -1, -1):
+        pick = int(rand() * (last + 1))
+        cards[last], cards[pick] = cards[pick], cards[last]
+        order.append(cards[last])
+    return order
+
+
 class Deck(AbstractGameZone):
-    def __init__(self, x, y, cards):
-        super().__init__(x, y)
+    """
+    The draw pile. Each deck has its own RNG (seeded with `seed`, or from the
+    global random state so a seeded run still replays) and is shuffled
+    lazily: every draw picks uniformly among the cards left, doing one
+    Fisher-Yates step per card drawn instead of shuffling the whole pile.
+
+    With a `discard_zone`, a draw that runs the pile out reshuffles that
+    zone's cards back in and carries on; without one the deck just runs dry.
+    """
+    def __init__(self, cards, seed: Optional[int] = None, discard_zone: Optional[AbstractGameZone] = None):
+        super().__init__(max_size=len(cards), cards=ZoneCards(cards))
         self.original = list(cards)
-        self.cards = list(cards)
-        self.shuffle()
+        # ZoneCards has no positions to swap, so the draws keep their own
+        # index: the pile in pick order, and each card's slot in it. Most
+        # decks are only ever drawn from, so the slots are built by the
+        # first remove_card and kept up from then on.
+        self._pile = list(self.cards)
+        self._slot: Optional[dict] = None
+        self.discard_zone = discard_zone
+        self.rng = random.Random(random.getrandbits(64) if seed is None else seed)
+        self.reshuffles = 0
         self.drop_into = False  # Cards shouldn't be dropped into the deck
 
+    @property
+    def pile(self) -> list:
+        """The cards left in the order the draws pick from (see pick_order). Read-only."""
+        return self._pile
+
+    @instrumented()
     def shuffle(self):
-        random.shuffle(self.cards)
-
-    def draw_cards(self, n):
-        drawn = []
-        for _ in range(n):
-            if not self.cards:
-                self.shuffle()
-            if self.cards:
-                drawn.append(self.cards.pop())
+        """Puts the whole pile in a random order now. Draws do not need it, only code reading the order does."""
+        self.rng.shuffle(self._pile)
+        self._slot = None
+        self.cards.version += 1
+
+    def add_card(self, card):
+        if card not in self.cards:
+            if self._slot is not None:
+                self._slot[card] = len(self._pile)
+            self._pile.append(card)
+        self.cards.append(card)
+
+    def remove_card(self, card):
+        if not self.cards.discard(card):
+            return False
+        # Fill the card's slot with the last one, so removal stays O(1).
+        if self._slot is None:
+            self._slot = {card: index for index, card in enumerate(self._pile)}
+        index = self._slot.pop(card)
+        last = self._pile.pop()
+        if last is not card:
+            self._pile[index] = last
+            self._slot[last] = index
+        return True
+
+    def _take(self, n: int) -> list:
+        # Partial Fisher-Yates: fill the last n slots with random picks from
+        # what is left, then cut them off in one slice.
+        cards, slot = self._pile, self._slot
+        size = len(cards)
+        n = min(n, size)
+        if not n:
+            return []
+        rand = self.rng.random
+        for last in range(size - 1, size - n - 1, -1):
+            pick = int(rand() * (last + 1))
+            cards[last], cards[pick] = cards[pick], cards[last]
+            if slot is not None:
+                slot[cards[pick]] = pick
+        drawn = cards[size - n:]
+        del cards[size - n:]
+        drawn.reverse()  # first pick first
+        if slot is not None:
+            for card in drawn:
+                del slot[card]
+        self.cards.remove_all(drawn)
+        return drawn
+
+    def draw_order(self) -> list:
+        """
+        The cards left in the pile in the order coming draws will deal them,
+        first draw first, as long as no reshuffle happens. Runs _take's
+        picks on copies of the pile and RNG, so the deck is left as it is.
+        """
+        rng = random.Random()
+        rng.setstate(self.rng.getstate())
+        return pick_order(self._pile, rng)
+
+    def reshuffle(self) -> bool:
+        """Moves the discard zone's cards back into the pile; returns whether any came back."""
+        if self.discard_zone is None or not len(self.discard_zone.cards):
+            return False
+        for card in self.discard_zone.cards:
+            self.add_card(card)
+        self.discard_zone.cards.clear()
+        self.reshuffles += 1
+        return True
+
+    @instrumented()
+    def draw(self, n: int) -> list:
+        """Draws up to n cards, reshuffling the discard back in if the pile runs out."""
+        drawn = self._take(n)
+        if len(drawn) < n and self.reshuffle():
+            drawn += self._take(n - len(drawn))
         return drawn
 
+    draw_cards = draw
+
     def handle_drop(self, card, from_zone):
         pass  # No-op, drop_into is already False
 
@@ -30,53 +149,143 @@ class Deck(AbstractGameZone):
 
 # Attack Logic
 def attack_with_card(card, tree, memory, loot_counter):
-    exposed = tree.get_exposed_nodes()
     color = card.color or 'red'
     number = card.number
-    for node in exposed:
-        if node.color == color and node.number == number:
-            tree.beat_node(node.id)
-            memory.insert(0, {'color': color, 'number': number})
-            if node.loot:
-                loot_counter[0] += node.loot
-            return True
-    memory.insert(0, {'color': color, 'number': number})
+    remembered = card if card.color == color else DefaultCard(color, number)
+    return _attack(remembered, tree, memory, loot_counter)
+
+
+@instrumented("attack_with_card")
+def _attack(attacker, tree, memory, loot_counter):
+    # `attacker` already carries the color it attacks as.
+    memory.remember(attacker)
+    node = tree.find_exposed(attacker.color, attacker.number)
+    if node is not None:
+        tree.beat_node(node.id)
+        if node.loot:
+            loot_counter[0] += node.loot
+        return True
     return False
 
 
 # Fusion Logic
-def resolve_stack(stack, memory, tree, loot_counter):
-    new_stack = list(reversed(stack))
-    fused = []
-
-    while new_stack:
-        base = new_stack.pop()
-
-        if not isinstance(base['number'], int):
-            memory.insert(0, base)
-            attack_with_card(base, tree, memory, loot_counter)
-            continue
-
-        fused_card = {
-            'number': base['number'],
-            'color': None,
-            'hasColor': False,
-            'hasNumber': True
-        }
-
-        if new_stack:
-            next_card = new_stack[-1]
-            if not fused_card['hasColor'] and next_card.get('color') and not next_card.get('number'):
-                fused_card['color'] = next_card['color']
-                fused_card['hasColor'] = True
-                new_stack.pop()
-            elif not fused_card['hasNumber'] and next_card.get('number'):
-                fused_card['number'] += next_card['number']
-                fused_card['hasNumber'] = True
-                new_stack.pop()
-
-        fused_obj = DefaultCard(fused_card['color'], fused_card['number'])
-        memory.insert(0, {'color': fused_card['color'], 'number': fused_card['number']})
-        attack_with_card(fused_obj, tree, memory, loot_counter)
+_NUMBER_BITS = NUMBER_MASK << NUMBER_SHIFT
+_ZERO = 1 << NUMBER_SHIFT  # the number field of number 0
+
+
+def _select(condition, if_true, if_false):
+    return if_true if condition else if_false
+
+
+def fusion(code, following, select=_select):
+    """
+    The fusion rules, for a packed card and the card played right after it
+    (0 when it is the last). A number card with no color (a blank) takes
+    the color of a following color card with no number, or number 0 (a
+    paint), and the paint is used up. Every other card attacks on its own,
+    colorless ones as red.
+
+    Returns (fuses, attacker): whether `following` is used up, and the card
+    `code` attacks as. That is `code` itself when it attacks as its own
+    color, otherwise just the color and number. Only bit operators and
+    comparisons are used, so with select=numpy.where this works elementwise
+    on whole arrays; fuse_codes and fuse_stacks are both built on it.
+    """
+    number = code & _NUMBER_BITS
+    fuses = (code & COLOR_MASK == 0) & (number != 0) \
+        & (following & COLOR_MASK != 0) & (following & _NUMBER_BITS <= _ZERO)
+    return fuses, select(code & COLOR_MASK != 0, code, select(fuses, following & COLOR_MASK, _RED) | number)
+
+
+def fuse_codes(codes) -> List[Tuple[int, int]]:
+    """The attacks one stack of packed cards makes, in order, as (position, attacker) pairs (see fusion)."""
+    attacks = []
+    index, count = 0, len(codes)
+    while index < count:
+        fuses, attacker = fusion(codes[index], codes[index + 1] if index + 1 < count else 0)
+        attacks.append((index, attacker))
+        index += 2 if fuses else 1
+    return attacks
+
+
+@instrumented()
+def fuse_stacks(codes, lengths=None) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Applies the fusion rules (see fusion) to many stacks at once. `codes`
+    is a (games, depth) array of packed cards, one stack per row in play
+    order, with row g padded past lengths[g].
+
+    Returns (attackers, attacks): attacks[g, i] is True where the card at
+    position i attacks, and attackers[g, i] is then the packed card that
+    attacks and is remembered.
+    """
+    import numpy as np
+    codes = np.asarray(codes, dtype=np.uint32)
+    if codes.ndim != 2:
+        raise ValueError("fuse_stacks expects a (games, depth) array")
+    depth = codes.shape[1]
+    if lengths is None:
+        valid = np.ones(codes.shape, dtype=bool)
+    else:
+        valid = np.arange(depth) < np.asarray(lengths)[:, None]
+
+    # The card after each one, or 0 (nothing to fuse with) past the end of its stack.
+    following = np.zeros_like(codes)
+    following[:, :-1] = np.where(valid[:, 1:], codes[:, 1:], np.uint32(0))
+    fuses, attackers = fusion(codes, following, np.where)
+    # A blank fuses only with the card right after it, and a paint is never
+    # a blank, so no card is both fused into and fusing.
+    attacks = valid.copy()
+    attacks[:, 1:] &= ~fuses[:, :-1]
+    return attackers, attacks
+
+
+@instrumented()
+def resolve_stacks(codes, lengths, memories, trees, loot_counters, stacks=None,
+                   jokers: Optional['JokerChain'] = None) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """
+    Resolves many games' stacks in one call: runs every card through the
+    jokers, fuses the stacks with fuse_stacks, then makes every game's
+    attacks in stack order against its own tree and memory. Pass the games'
+    card lists as `stacks` to have cards that attack as themselves
+    remembered as the same objects, as resolve_stack does.
+
+    Returns (attackers, attacks, hits), shaped like the stacks after the
+    jokers. The callers clear their own stacks.
+    """
+    import numpy as np
+    sources = None
+    if jokers:
+        codes, lengths, sources = jokers.table.apply_codes(codes, lengths)
+    attackers, attacks = fuse_stacks(codes, lengths)
+    hits = np.zeros(attacks.shape, dtype=bool)
+    rows, columns = np.nonzero(attacks)
+    for game, position, code in zip(rows.tolist(), columns.tolist(), attackers[rows, columns].tolist()):
+        card = None
+        if stacks is not None:
+            card = stacks[game][sources[game, position] if sources is not None else position]
+        if card is None or card.code != code:
+            card = DefaultCard.from_code(code)
+        hits[game, position] = _attack(card, trees[game], memories[game], loot_counters[game])
+    return attackers, attacks, hits
+
+
+@instrumented()
+def resolve_stack(stack, memory, tree, loot_counter, jokers: Optional['JokerChain'] = None):
+    """
+    Resolves one stack (see fuse_stacks for the fusion rules) and clears it.
+    attack_with_card semantics apply: each attacker is remembered exactly once.
+    With `jokers`, every card is first run through the player's joker chain.
 
+    One stack is a handful of cards, so it is fused here in plain Python;
+    fuse_stacks and resolve_stacks are for many stacks at once.
+    """
+    if jokers:
+        table = jokers.table
+        played = [(card, code) for card in stack for code in table.apply_code(card.code)]
+    else:
+        played = [(card, card.code) for card in stack]
+    for position, attacker in fuse_codes([code for _, code in played]):
+        card = played[position][0]
+        _attack(card if card.code == attacker else DefaultCard.from_code(attacker), tree, memory, loot_counter)
     stack.clear()
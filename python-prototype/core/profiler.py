@@ -0,0 +1,190 @@
+import functools
+import os
+import time
+from _thread import get_ident
+from typing import Callable, Dict, List, Optional
+
+# ----------------------------
+# Opt-in instrumentation
+# ----------------------------
+# Hot paths are marked with @instrumented and frame phases with PROFILER.span().
+# Instrumentation is compiled in only when CONWAY_PROFILE is set in the
+# environment at import time; otherwise @instrumented hands back the function
+# untouched, so a production run pays nothing for it. When compiled in, the
+# profiler still only records while enabled (F3 in the game toggles it), and
+# a disabled span is a shared no-op context manager.
+#
+# Timings are kept as per-name aggregates (calls, total, max). Individual
+# events are only kept while `trace` is on, for export as a Chrome trace
+# (chrome://tracing or https://ui.perfetto.dev).
+
+INSTRUMENTED = os.environ.get("CONWAY_PROFILE", "") not in ("", "0")
+
+_clock = time.perf_counter_ns
+
+
+class _Stat:
+    __slots__ = ("calls", "total", "max")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0
+        self.max = 0
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, _clock())
+        return False
+
+
+class Profiler:
+    def __init__(self, max_events: int = 200000):
+        self.enabled = False
+        self.trace = False
+        self.max_events = max_events
+        self.stats: Dict[str, _Stat] = {}
+        self.counters: Dict[str, int] = {}
+        self.events: List[tuple] = []
+        self.dropped_events = 0
+        self._origin = _clock()
+
+    def enable(self, trace: bool = False) -> None:
+        self.enabled = True
+        self.trace = trace
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.stats.clear()
+        self.counters.clear()
+        self.events.clear()
+        self.dropped_events = 0
+        self._origin = _clock()
+
+    # Recording
+
+    def span(self, name: str):
+        """Times a `with` block under `name`."""
+        return _Span(self, name) if self.enabled else _NULL_SPAN
+
+    def record(self, name: str, start: int, end: int) -> None:
+        """Adds one timing (perf_counter_ns values)."""
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = _Stat()
+        elapsed = end - start
+        stat.calls += 1
+        stat.total += elapsed
+        if elapsed > stat.max:
+            stat.max = elapsed
+        if self.trace:
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, elapsed, get_ident()))
+            else:
+                self.dropped_events += 1
+
+    def count(self, name: str, amount: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    # Reporting
+
+    def summary(self) -> List[dict]:
+        """Per-name aggregates in milliseconds, slowest total first."""
+        rows = [{"name": name, "calls": stat.calls, "total_ms": stat.total / 1e6,
+                 "mean_ms": stat.total / stat.calls / 1e6, "max_ms": stat.max / 1e6}
+                for name, stat in self.stats.items() if stat.calls]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def export_json(self, path: str) -> None:
+        import json
+        with open(path, "w") as f:
+            json.dump({"timers": self.summary(), "counters": dict(self.counters)}, f, indent=2)
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Writes the recorded events (enable(trace=True)) in the Chrome trace event format."""
+        import json
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self._origin) / 1000, "dur": elapsed / 1000,
+                   "pid": pid, "tid": tid} for name, start, elapsed, tid in self.events]
+        now = (_clock() - self._origin) / 1000
+        events += [{"name": name, "ph": "C", "ts": now, "pid": pid, "args": {"value": value}}
+                   for name, value in self.counters.items()]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                       "otherData": {"dropped_events": self.dropped_events}}, f)
+
+
+PROFILER = Profiler()
+
+
+def instrumented(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """
+    Times every call of the decorated function under `name` (default: its
+    qualified name). A no-op unless CONWAY_PROFILE was set at import time.
+    For generator functions only the time spent inside the generator counts.
+    """
+    def decorate(function: Callable) -> Callable:
+        if not INSTRUMENTED:
+            return function
+        import inspect
+        label = name or function.__qualname__
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                if not PROFILER.enabled:
+                    yield from function(*args, **kwargs)
+                    return
+                start = _clock()
+                spent = 0
+                items = function(*args, **kwargs)
+                try:
+                    while True:
+                        resumed = _clock()
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            break
+                        finally:
+                            spent += _clock() - resumed
+                        yield item
+                finally:
+                    items.close()
+                    PROFILER.record(label, start, start + spent)
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            start = _clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(label, start, _clock())
+        return wrapper
+    return decorate
@@ -0,0 +1,159 @@
+import pygame
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+# ----------------------------
+# Cached surfaces for the pygame renderer
+# ----------------------------
+
+# Map card color names to pygame colors
+PYGAME_COLORS = {
+    "red": (255, 30, 60),
+    "blue": (30, 60, 255),
+    "green": (60, 255, 30)
+}
+
+WHITE = (255, 255, 255)
+CARD_FILL = (200, 200, 200)
+HIGHLIGHT = (255, 255, 0)
+BEATEN_COLOR = (90, 90, 90)
+CARD_WIDTH = 60
+CARD_SPACING = 10
+
+
+class SurfaceCache:
+    """A small LRU cache of pre-rendered surfaces."""
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, pygame.Surface]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, build: Callable[[], pygame.Surface]) -> pygame.Surface:
+        surface = self._entries.get(key)
+        if surface is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = build()
+        self._entries[key] = surface
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return surface
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CardRenderer:
+    """
+    Renders labels, card faces and whole zones through LRU caches, so glyphs
+    are rasterised once per distinct card and an unchanged zone is a single blit.
+    """
+    def __init__(self, font: pygame.font.Font, cache_size: int = 512):
+        self.font = font
+        self.labels = SurfaceCache(cache_size)
+        self.faces = SurfaceCache(cache_size)
+        self.zones = SurfaceCache(max(16, cache_size // 8))
+
+    def label(self, text: str, color: Tuple[int, int, int] = WHITE, scale: float = 1.0) -> pygame.Surface:
+        if scale != 1.0:
+            return self.labels.get((text, color, scale), lambda: self._scaled_label(text, color, scale))
+        return self.labels.get((text, color), lambda: self.font.render(text, True, color))
+
+    def _scaled_label(self, text: str, color: Tuple[int, int, int], scale: float) -> pygame.Surface:
+        base = self.label(text, color)
+        size = (max(1, round(base.get_width() * scale)), max(1, round(base.get_height() * scale)))
+        return pygame.transform.smoothscale(base, size)
+
+    def card_face(self, card, size: Tuple[int, int], highlighted: bool = False) -> pygame.Surface:
+        key = (card.color, card.number, card.edition, card.stamp, highlighted, size)
+        return self.faces.get(key, lambda: self._build_face(card, size, highlighted))
+
+    def _build_face(self, card, size: Tuple[int, int], highlighted: bool) -> pygame.Surface:
+        surface = pygame.Surface(size)
+        surface.fill(CARD_FILL)
+        if highlighted:
+            pygame.draw.rect(surface, HIGHLIGHT, surface.get_rect(), 3)
+        # Render card text (ignoring ANSI escape codes)
+        text_surface = self.label(f"{card.color} {card.number}", PYGAME_COLORS.get(card.color, WHITE))
+        surface.blit(text_surface, text_surface.get_rect(center=surface.get_rect().center))
+        return surface
+
+    def zone_surface(self, size: Tuple[int, int], cards: Iterable, highlight_index: Optional[int] = None) -> pygame.Surface:
+        cards = list(cards)
+        key = (size, tuple(card.code for card in cards), highlight_index)
+        return self.zones.get(key, lambda: self._build_zone(size, cards, highlight_index))
+
+    def _build_zone(self, size: Tuple[int, int], cards: list, highlight_index: Optional[int]) -> pygame.Surface:
+        width, height = size
+        # Cards are allowed to run past the zone's right edge, as before.
+        surface = pygame.Surface((max(width, CARD_SPACING + len(cards) * (CARD_WIDTH + CARD_SPACING)), height),
+                                 pygame.SRCALPHA)
+        pygame.draw.rect(surface, WHITE, pygame.Rect(0, 0, width, height), 2)
+        face_size = (CARD_WIDTH, height - 2 * CARD_SPACING)
+        for idx, card in enumerate(cards):
+            face = self.card_face(card, face_size, highlighted=idx == highlight_index)
+            surface.blit(face, (CARD_SPACING + idx * (CARD_WIDTH + CARD_SPACING), CARD_SPACING))
+        return surface
+
+
+class RedrawScheduler:
+    """
+    Tracks which screen regions need repainting. Each watched region has a
+    version source (usually a zone's `version`); a region becomes dirty when
+    that version moves or when it is marked dirty explicitly, e.g. on a
+    selection change. Regions that overlap a dirty one are repainted with it.
+    """
+    def __init__(self):
+        self._sources = {}
+        self._seen = {}
+        self._drawn = {}
+        self._dirty = set()
+
+    def watch(self, name: str, source: Callable[[], int]) -> None:
+        self._sources[name] = source
+        self._dirty.add(name)
+
+    def mark_dirty(self, name: str) -> None:
+        self._dirty.add(name)
+
+    def mark_all_dirty(self) -> None:
+        self._dirty.update(self._sources)
+
+    def poll(self) -> bool:
+        """Picks up version changes; returns whether anything needs repainting."""
+        for name, source in self._sources.items():
+            version = source()
+            if self._seen.get(name) != version:
+                self._seen[name] = version
+                self._dirty.add(name)
+        return bool(self._dirty)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self._dirty)
+
+    def take_dirty(self) -> list:
+        """Returns the regions to repaint, in watch order, and clears the dirty set."""
+        dirty = set(self._dirty)
+        for name in self._dirty:
+            old = self._drawn.get(name)
+            if old is None:
+                continue
+            for other, rect in self._drawn.items():
+                if other not in dirty and rect.colliderect(old):
+                    dirty.add(other)
+        self._dirty.clear()
+        return [name for name in self._sources if name in dirty]
+
+    def previous_rect(self, name: str) -> Optional[pygame.Rect]:
+        return self._drawn.get(name)
+
+    def drawn(self, name: str, rect: pygame.Rect) -> None:
+        """Records the screen area a region covered when last painted."""
+        self._drawn[name] = rect
@@ -0,0 +1,396 @@
+import hashlib
+import random
+import struct
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+from .card import EDITIONS, STAMPS, EDITION_SHIFT, EDITION_MASK, STAMP_SHIFT, STAMP_MASK
+from .gamezone import ProblemNode, ProblemZone
+from .savegame import GameZones, game_bytes, load_game_bytes
+from .state import GameState, History
+
+# ----------------------------
+# Action log and headless replay
+# ----------------------------
+# A GameSession holds the zones plus the hand selection and performs the
+# player's actions on them; the window and the replayer both go through it,
+# so a replay runs exactly the code the player did. Every action that changes
+# the game also steps a core.state.GameState kept in a History, and undo/redo
+# write the state they move to back into the zones (only the parts that
+# differ), so undo is unlimited and costs what each action changed. An ActionLog records a
+# session: the opening game as an embedded save file (so a replay needs no
+# data files and no RNG), the seed the session was set up with, then one
+# byte per action.
+#
+# Two kinds of hashes let a replay notice when it stops matching the
+# recording. After every action the log keeps a 16-bit digest of the cheap
+# part of the state (hand, stack, selection, beaten nodes); every
+# `checkpoint_every` actions it keeps a 64-bit hash of the whole game.
+# Hashes use edition and stamp names, not this process's table indexes, so
+# they match across processes.
+#
+# first_divergence() bisects over the checkpoints, replaying prefixes, to
+# find the first one that disagrees, then steps through the actions before
+# it comparing digests to name the action that went wrong.
+
+# Actions, one byte each. Only actions that change the game are logged;
+# scrolling and zooming the tree view are not.
+SELECT_NEXT, SELECT_PREVIOUS, PLAY_SELECTED, UNDO, REDO = 1, 2, 3, 4, 5
+ACTION_NAMES = {SELECT_NEXT: "select next", SELECT_PREVIOUS: "select previous", PLAY_SELECTED: "play selected",
+                UNDO: "undo", REDO: "redo"}
+
+_EXTRA_BITS = (EDITION_MASK << EDITION_SHIFT) | (STAMP_MASK << STAMP_SHIFT)
+
+
+def _card_bytes(cards) -> bytes:
+    """Card codes with editions and stamps spelled out by name, so the bytes do not depend on interning order."""
+    codes = []
+    names = []
+    for card in cards:
+        code = card.code
+        codes.append(code & ~_EXTRA_BITS)
+        if code & _EXTRA_BITS:
+            names.append(f"{len(codes)}:{EDITIONS.names[(code >> EDITION_SHIFT) & EDITION_MASK]}:"
+                         f"{STAMPS.names[(code >> STAMP_SHIFT) & STAMP_MASK]}")
+    return struct.pack(f"<{len(codes)}I", *codes) + "|".join(names).encode("utf-8")
+
+
+class Divergence(Exception):
+    """A replay stopped matching its recording after `action` actions (1-based; 0 is the opening state)."""
+    def __init__(self, action: int, what: str):
+        super().__init__(f"replay diverged at action {action}: {what}")
+        self.action = action
+        self.what = what
+
+
+class GameSession:
+    """
+    The game zones plus the hand selection, and the player actions the
+    window performs on them. With a `log` attached every action is recorded.
+    `history` holds a GameState per change, for undo and redo.
+    """
+    def __init__(self, zones: GameZones, seed: int = 0):
+        self.zones = zones
+        (self.deck_zone, self.hand_zone, self.stack_zone, self.discard_zone, self.problem_zone,
+         self.memory_zone) = zones
+        self.seed = seed
+        self.selected_index = 0
+        self.log: Optional['ActionLog'] = None
+        self.tree_signature = 0
+        self._tree_keys: Dict[int, int] = {}
+        self.problem_zone.observers.append(self)
+        self.tree_reset(self.problem_zone)
+        self.history = History(GameState.from_zones(zones, seed))
+
+    # ProblemZone observer hooks: the beaten nodes are tracked as an XOR of a
+    # random key per node (keyed by BFS position, so it is the same in a replay).
+
+    def tree_reset(self, zone: ProblemZone) -> None:
+        order = [zone.root] if zone.root is not None else []
+        for node in order:
+            order.extend(node.children)
+        rng = random.Random(len(order))
+        self._tree_keys = {node.id: rng.getrandbits(64) for node in order}
+        self.tree_signature = 0
+        for node in order:
+            if node.beaten:
+                self.tree_signature ^= self._tree_keys[node.id]
+
+    def child_added(self, parent: ProblemNode, child: ProblemNode) -> None:
+        self.tree_reset(self.problem_zone)
+
+    def node_beaten(self, node: ProblemNode) -> None:
+        self.tree_signature ^= self._tree_keys.get(node.id, 0)
+
+    node_unbeaten = node_beaten  # XOR undoes itself
+
+    # Actions
+
+    def select_next(self) -> bool:
+        """Moves the hand selection right; returns whether there was a hand to select in."""
+        return self._select(1, SELECT_NEXT)
+
+    def select_previous(self) -> bool:
+        return self._select(-1, SELECT_PREVIOUS)
+
+    def _select(self, step: int, action: int) -> bool:
+        moved = bool(self.hand_zone.cards)
+        if moved:
+            self.selected_index = (self.selected_index + step) % len(self.hand_zone.cards)
+        self._record(action)
+        return moved
+
+    def play_selected(self):
+        """Plays the selected hand card onto the stack; returns the card, or None with an empty hand."""
+        card = None
+        if self.hand_zone.cards:
+            card = self.hand_zone.cards[self.selected_index]
+            state = self.history.state
+            self.hand_zone.play_to_stack(card, self.stack_zone)
+            played = state.play(self.selected_index, self.stack_zone.max_size)
+            if played is not state:
+                self.history.push(played)
+            self._clamp_selection()
+        self._record(PLAY_SELECTED)
+        return card
+
+    def undo(self) -> bool:
+        """Steps back to the state before the last change; returns whether there was one."""
+        return self._travel(self.history.undo, UNDO)
+
+    def redo(self) -> bool:
+        return self._travel(self.history.redo, REDO)
+
+    def _travel(self, step, action: int) -> bool:
+        current = self.history.state
+        state = step()
+        if state is not current:
+            state.sync_zones(self.zones, since=current)
+            self._clamp_selection()
+        self._record(action)
+        return state is not current
+
+    def _clamp_selection(self) -> None:
+        if self.selected_index >= len(self.hand_zone.cards):
+            self.selected_index = max(0, len(self.hand_zone.cards) - 1)
+
+    def apply(self, action: int) -> None:
+        if action == SELECT_NEXT:
+            self.select_next()
+        elif action == SELECT_PREVIOUS:
+            self.select_previous()
+        elif action == PLAY_SELECTED:
+            self.play_selected()
+        elif action == UNDO:
+            self.undo()
+        elif action == REDO:
+            self.redo()
+        else:
+            raise ValueError(f"unknown action {action}")
+
+    def _record(self, action: int) -> None:
+        if self.log is not None:
+            self.log.record(action, self)
+
+    # Hashes
+
+    def digest(self) -> int:
+        """16 bits over the hand, stack, selection and beaten nodes; cheap enough for every action."""
+        crc = zlib.crc32(_card_bytes(self.hand_zone.cards))
+        crc = zlib.crc32(_card_bytes(self.stack_zone.cards), crc)
+        crc = zlib.crc32(struct.pack("<IQ", self.selected_index, self.tree_signature), crc)
+        return (crc ^ crc >> 16) & 0xFFFF
+
+    def state_hash(self) -> int:
+        """64 bits over every zone, the whole tree and the selection."""
+        h = hashlib.blake2b(digest_size=8)
+        for zone in (self.deck_zone, self.hand_zone, self.stack_zone, self.discard_zone, self.memory_zone):
+            cards = _card_bytes(zone.cards)
+            h.update(struct.pack("<II", zone.max_size, len(cards)))
+            h.update(cards)
+        order = [self.problem_zone.root] if self.problem_zone.root is not None else []
+        for node in order:
+            order.extend(node.children)
+        h.update(_card_bytes(node.card for node in order))
+        h.update(struct.pack(f"<{len(order)}i", *(node.loot for node in order)))
+        h.update(struct.pack(f"<{len(order)}I", *(len(node.children) << 1 | node.beaten for node in order)))
+        h.update(struct.pack("<I", self.selected_index))
+        return int.from_bytes(h.digest(), "little")
+
+    def close(self) -> None:
+        if self in self.problem_zone.observers:
+            self.problem_zone.observers.remove(self)
+
+
+# ----------------------------
+# The log
+# ----------------------------
+#   header       "CONWAYRL", uint16 schema version, uint64 seed,
+#                uint16 checkpoint interval, uint32 opening game length
+#   opening      a save file (core.savegame)
+#   actions      uint32 count, one byte each, then a uint16 digest each
+#   checkpoints  uint32 count, then (uint32 action, uint64 hash) each
+#
+# Everything is little-endian.
+
+LOG_MAGIC = b"CONWAYRL"
+LOG_SCHEMA_VERSION = 1
+LOG_HEADER = struct.Struct("<8sHQHI")
+_CHECKPOINT = struct.Struct("<IQ")
+_COUNT = struct.Struct("<I")
+
+
+class ActionLog:
+    def __init__(self, opening: bytes, seed: int = 0, checkpoint_every: int = 64):
+        self.opening = opening
+        self.seed = seed
+        self.checkpoint_every = checkpoint_every
+        self.actions = bytearray()
+        self.digests = array("H")
+        self.checkpoints: Dict[int, int] = {}  # actions applied -> state hash
+
+    @classmethod
+    def start(cls, session: GameSession, checkpoint_every: int = 64) -> 'ActionLog':
+        """Starts recording `session` from its current state."""
+        log = cls(game_bytes(session.zones), session.seed, checkpoint_every)
+        log.checkpoints[0] = session.state_hash()
+        session.log = log
+        return log
+
+    def record(self, action: int, session: GameSession) -> None:
+        self.actions.append(action)
+        self.digests.append(session.digest())
+        if len(self.actions) % self.checkpoint_every == 0:
+            self.checkpoints[len(self.actions)] = session.state_hash()
+
+    def finish(self, session: GameSession) -> None:
+        """Adds a checkpoint for the final state and stops recording."""
+        self.checkpoints[len(self.actions)] = session.state_hash()
+        session.log = None
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def to_bytes(self) -> bytes:
+        parts = [LOG_HEADER.pack(LOG_MAGIC, LOG_SCHEMA_VERSION, self.seed, self.checkpoint_every, len(self.opening)),
+                 self.opening, _COUNT.pack(len(self.actions)), bytes(self.actions),
+                 struct.pack(f"<{len(self.digests)}H", *self.digests), _COUNT.pack(len(self.checkpoints))]
+        parts += [_CHECKPOINT.pack(action, value) for action, value in sorted(self.checkpoints.items())]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, path: str = "action log") -> 'ActionLog':
+        magic, version, seed, checkpoint_every, opening_length = LOG_HEADER.unpack_from(data, 0)
+        if magic != LOG_MAGIC:
+            raise ValueError(f"{path} is not an action log")
+        if version != LOG_SCHEMA_VERSION:
+            raise ValueError(f"{path} has action log schema {version}, this build reads {LOG_SCHEMA_VERSION}")
+        offset = LOG_HEADER.size
+        log = cls(bytes(data[offset:offset + opening_length]), seed, checkpoint_every)
+        offset += opening_length
+        count = _COUNT.unpack_from(data, offset)[0]
+        offset += _COUNT.size
+        log.actions = bytearray(data[offset:offset + count])
+        offset += count
+        log.digests = array("H", struct.unpack_from(f"<{count}H", data, offset))
+        offset += 2 * count
+        for index in range(_COUNT.unpack_from(data, offset)[0]):
+            action, value = _CHECKPOINT.unpack_from(data, offset + _COUNT.size + index * _CHECKPOINT.size)
+            log.checkpoints[action] = value
+        return log
+
+    def write(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def read(cls, path: str) -> 'ActionLog':
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read(), path)
+
+
+# ----------------------------
+# Replaying
+# ----------------------------
+
+def new_session(log: ActionLog) -> GameSession:
+    """A session in the log's opening state."""
+    return GameSession(load_game_bytes(log.opening, "action log").zones, log.seed)
+
+
+def replay(log: ActionLog, upto: Optional[int] = None, verify: bool = True) -> GameSession:
+    """
+    Runs the first `upto` actions (default: all) and returns the session.
+    With verify, every digest and checkpoint is compared on the way and the
+    first mismatch raises Divergence.
+    """
+    session = new_session(log)
+    end = len(log.actions) if upto is None else upto
+    checkpoints = log.checkpoints if verify else {}
+    if 0 in checkpoints and session.state_hash() != checkpoints[0]:
+        raise Divergence(0, "opening state")
+    apply = session.apply
+    digests = log.digests
+    for count, action in enumerate(log.actions[:end], 1):
+        apply(action)
+        if verify:
+            if session.digest() != digests[count - 1]:
+                raise Divergence(count, f"digest after {ACTION_NAMES.get(action, action)}")
+            expected = checkpoints.get(count)
+            if expected is not None and session.state_hash() != expected:
+                raise Divergence(count, f"state hash after {ACTION_NAMES.get(action, action)}")
+    return session
+
+
+def first_divergence(log: ActionLog) -> Optional[int]:
+    """
+    The number of actions after which the replay first disagrees with the
+    recording (0: already the opening state), or None when it never does.
+    """
+    marks = sorted(log.checkpoints)
+
+    def matches(mark: int) -> bool:
+        session = replay(log, mark, verify=False)
+        try:
+            return session.state_hash() == log.checkpoints[mark]
+        finally:
+            session.close()
+
+    # Bisect for the first checkpoint that disagrees; states that diverged stay diverged.
+    low, high = -1, len(marks)  # marks[low] matches (or low is -1), marks[high] does not (or is past the end)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if matches(marks[middle]):
+            low = middle
+        else:
+            high = middle
+    good = marks[low] if low >= 0 else None
+    bad = marks[high] if high < len(marks) else len(log.actions) + 1
+
+    # Step through the actions in between; a digest may name the exact action.
+    session = replay(log, good or 0, verify=False)
+    try:
+        if good is None and bad == 0:
+            return 0
+        for count in range((good or 0) + 1, min(bad, len(log.actions)) + 1):
+            session.apply(log.actions[count - 1])
+            if session.digest() != log.digests[count - 1]:
+                return count
+    finally:
+        session.close()
+    return bad if bad <= len(log.actions) else None
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Replay recorded sessions headlessly and check their hashes.")
+    parser.add_argument("logs", nargs="+", help="action log files or directories of *.actlog files")
+    parser.add_argument("--bisect", action="store_true", help="name the first diverging action of failing logs")
+    args = parser.parse_args()
+
+    paths: List[str] = []
+    for path in args.logs:
+        paths += sorted(glob.glob(os.path.join(path, "*.actlog"))) if os.path.isdir(path) else [path]
+
+    start = time.perf_counter()
+    actions = 0
+    failures = []
+    for path in paths:
+        log = ActionLog.read(path)
+        actions += len(log)
+        try:
+            replay(log).close()
+        except Divergence as divergence:
+            failures.append((path, log, divergence))
+    elapsed = time.perf_counter() - start
+    print(f"{len(paths)} sessions, {actions} actions replayed in {elapsed:.2f}s; {len(failures)} diverged")
+    for path, log, divergence in failures:
+        line = f"  {path}: {divergence}"
+        if args.bisect:
+            line += f" (bisected to action {first_divergence(log)})"
+        print(line)
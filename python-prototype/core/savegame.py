@@ -0,0 +1,426 @@
+import os
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from operator import attrgetter
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from .card import DefaultCard, EDITIONS, STAMPS, EDITION_SHIFT, EDITION_MASK, STAMP_SHIFT, STAMP_MASK
+from .gamezone import (AbstractGameZone, DeckZone, DiscardZone, HandZone, MemoryZone, ProblemNode, ProblemZone,
+                       StackZone, ZoneCards)
+
+# ----------------------------
+# Binary save games
+# ----------------------------
+# A save file is a header followed by records. A checkpoint record holds the
+# whole game; each delta record after it holds only what changed since the
+# record before. Loading replays the deltas onto the checkpoint's code
+# arrays and builds the zones once at the end.
+#
+#   header      "CONWAYSG", uint16 schema version
+#   record      uint8 kind, uint32 payload length, payload
+#
+#   checkpoint  names    editions and stamps interned so far (uint16 count,
+#                        then uint16 length + UTF-8 each), for each table
+#               uint32 turn, int64 loot
+#               zones    deck, hand, stack, discard, memory: uint32 max size,
+#                        uint32 count, uint32 codes (memory oldest first)
+#               tree     uint32 count, then in BFS order uint32 codes,
+#                        int32 loot, uint32 child counts, beaten bitset
+#   delta       names    only the ones interned since the last record
+#               uint32 turn, int64 loot
+#               uint8 changed zones, each: uint8 zone, uint32 kept front,
+#                        uint32 kept back, uint32 count, uint32 codes
+#                        (the zone is old[:front] + codes + old[-back:])
+#               uint32 beaten nodes, uint32 BFS indexes
+#
+# Everything is little-endian. A record cut short by a crash mid-write is
+# ignored, so the file always loads as of the last complete save.
+#
+# Autosave appends one delta per save(), which costs time proportional to
+# what changed (plus a scan of each zone whose version moved), and rewrites
+# the file as a single checkpoint once the deltas outgrow it.
+
+MAGIC = b"CONWAYSG"
+SCHEMA_VERSION = 1
+HEADER = struct.Struct("<8sH")
+RECORD = struct.Struct("<BI")
+KIND_CHECKPOINT, KIND_DELTA = 1, 2
+
+_TURN = struct.Struct("<Iq")
+_SPLICE = struct.Struct("<BIII")
+_ZONE = struct.Struct("<II")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+# The card zones in the order setup_game returns them, with the problem tree left out.
+CARD_ZONES = ("deck", "hand", "stack", "discard", "memory")
+_MEMORY = CARD_ZONES.index("memory")
+
+GameZones = Tuple[DeckZone, HandZone, StackZone, DiscardZone, ProblemZone, MemoryZone]
+
+_code = attrgetter("code")
+
+
+def _codes(values) -> array:
+    return array("I", values)  # 4 bytes on every platform we build for, as core.loader assumes too
+
+
+def _to_le(codes: array) -> bytes:
+    if sys.byteorder == "little":
+        return codes.tobytes()
+    swapped = array(codes.typecode, codes)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _zone_codes(zone: AbstractGameZone, slot: int) -> array:
+    if slot == _MEMORY:
+        codes = _codes(map(_code, zone.cards))
+        codes.reverse()  # memory iterates newest first; it is stored (and refilled) oldest first
+        return codes
+    packed = getattr(zone.cards, "codes", None)  # core.cardarray.CardArray keeps its codes in NumPy
+    if packed is not None:
+        return _codes(packed.tolist())
+    return _codes(map(_code, zone.cards))
+
+
+def _splice(old: array, new: array) -> Tuple[int, int, array]:
+    """(front, back, middle) with new == old[:front] + middle + old[len(old) - back:]."""
+    limit = min(len(old), len(new))
+    front = _common(lambda n: old[:n] == new[:n], limit)
+    limit -= front
+    back = _common(lambda n: old[len(old) - n:] == new[len(new) - n:], limit)
+    return front, back, new[front:len(new) - back]
+
+
+def _common(matches, limit: int) -> int:
+    """The largest n <= limit with matches(n), for a matches() true up to some n and false after it."""
+    if limit == 0 or not matches(1):
+        return 0
+    if matches(limit):
+        return limit
+    low, high = 1, limit  # matches(low) and not matches(high)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if matches(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+def _pack_names(names: List[str]) -> bytes:
+    parts = [_U16.pack(len(names))]
+    for name in names:
+        blob = name.encode("utf-8")
+        parts += [_U16.pack(len(blob)), blob]
+    return b"".join(parts)
+
+
+def _tree_order(zone: ProblemZone) -> List[ProblemNode]:
+    order = [zone.root] if zone.root is not None else []
+    for node in order:  # BFS: `order` grows while we walk it
+        order.extend(node.children)
+    return order
+
+
+def _checkpoint(zones: GameZones, loot: int, turn: int) -> Tuple[bytes, List[array], List[ProblemNode]]:
+    """The checkpoint payload, plus the zone codes and tree order it was written from."""
+    problem = zones[4]
+    card_zones = _card_zones(zones)
+    parts = [_pack_names(EDITIONS.names[1:]), _pack_names(STAMPS.names[1:]), _TURN.pack(turn, loot)]
+    codes = []
+    for slot, zone in enumerate(card_zones):
+        codes.append(_zone_codes(zone, slot))
+        parts += [_ZONE.pack(zone.max_size, len(codes[-1])), _to_le(codes[-1])]
+    order = _tree_order(problem)
+    beaten = bytearray((len(order) + 7) // 8)
+    for index, node in enumerate(order):
+        if node.beaten:
+            beaten[index >> 3] |= 1 << (index & 7)
+    parts += [_U32.pack(len(order)), _to_le(_codes(node.card.code for node in order)),
+              struct.pack(f"<{len(order)}i", *(node.loot for node in order)),
+              _to_le(_codes(len(node.children) for node in order)), bytes(beaten)]
+    return b"".join(parts), codes, order
+
+
+def _card_zones(zones: GameZones) -> Tuple[AbstractGameZone, ...]:
+    deck, hand, stack, discard, _, memory = zones
+    return deck, hand, stack, discard, memory
+
+
+def _write_record(f: BinaryIO, kind: int, payload: bytes) -> int:
+    f.write(RECORD.pack(kind, len(payload)))
+    f.write(payload)
+    return RECORD.size + len(payload)
+
+
+def game_bytes(zones: GameZones, loot: int = 0, turn: int = 0) -> bytes:
+    """The game as a complete save file (one checkpoint), for embedding elsewhere; see load_game_bytes."""
+    payload = _checkpoint(zones, loot, turn)[0]
+    return HEADER.pack(MAGIC, SCHEMA_VERSION) + RECORD.pack(KIND_CHECKPOINT, len(payload)) + payload
+
+
+def save_game(path: str, zones: GameZones, loot: int = 0, turn: int = 0) -> None:
+    """Writes the game as one checkpoint. The file is replaced atomically."""
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(game_bytes(zones, loot, turn))
+    os.replace(temporary, path)
+
+
+# ----------------------------
+# Loading
+# ----------------------------
+
+class _Reader:
+    def __init__(self, data: bytes, offset: int = 0):
+        self.data = data
+        self.offset = offset
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def u32(self) -> int:
+        return self.unpack(_U32)[0]
+
+    def codes(self, count: int, typecode: str = "I") -> array:
+        values = array(typecode)
+        end = self.offset + 4 * count
+        values.frombytes(self.data[self.offset:end])
+        if sys.byteorder != "little":
+            values.byteswap()
+        self.offset = end
+        return values
+
+    def names(self) -> List[str]:
+        names = []
+        for _ in range(self.unpack(_U16)[0]):
+            length = self.unpack(_U16)[0]
+            names.append(bytes(self.data[self.offset:self.offset + length]).decode("utf-8"))
+            self.offset += length
+        return names
+
+
+class SavedGame:
+    """A loaded save: the zones in setup_game order, the loot counter and the turn."""
+    def __init__(self, zones: GameZones, loot: int, turn: int):
+        self.zones = zones
+        self.loot = loot
+        self.turn = turn
+
+
+class _Replay:
+    """The game as code arrays while records are applied; zones are only built at the end."""
+    def __init__(self, reader: _Reader):
+        self.editions = reader.names()
+        self.stamps = reader.names()
+        self.turn, self.loot = reader.unpack(_TURN)
+        self.sizes = []
+        self.zone_codes = []
+        for _ in CARD_ZONES:
+            max_size, count = reader.unpack(_ZONE)
+            self.sizes.append(max_size)
+            self.zone_codes.append(reader.codes(count))
+        count = reader.u32()
+        self.tree_codes = reader.codes(count)
+        self.tree_loot = reader.codes(count, "i")
+        self.child_counts = reader.codes(count)
+        self.beaten = bytearray(reader.data[reader.offset:reader.offset + (count + 7) // 8])
+
+    def apply(self, reader: _Reader) -> None:
+        self.editions += reader.names()
+        self.stamps += reader.names()
+        self.turn, self.loot = reader.unpack(_TURN)
+        for _ in range(reader.unpack(_U8)[0]):
+            slot, front, back, count = reader.unpack(_SPLICE)
+            old = self.zone_codes[slot]
+            self.zone_codes[slot] = old[:front] + reader.codes(count) + old[len(old) - back:]
+        for _ in range(reader.u32()):
+            index = reader.u32()
+            self.beaten[index >> 3] |= 1 << (index & 7)
+
+    def card_maker(self):
+        """Turns saved codes into cards, mapping the file's edition and stamp indexes onto this process's."""
+        editions = [EDITIONS.encode(name) for name in [None] + self.editions]
+        stamps = [STAMPS.encode(name) for name in [None] + self.stamps]
+        if editions == list(range(len(editions))) and stamps == list(range(len(stamps))):
+            return DefaultCard.from_code
+        keep = ~((EDITION_MASK << EDITION_SHIFT) | (STAMP_MASK << STAMP_SHIFT))
+
+        def card(code: int) -> DefaultCard:
+            edition = editions[(code >> EDITION_SHIFT) & EDITION_MASK]
+            stamp = stamps[(code >> STAMP_SHIFT) & STAMP_MASK]
+            return DefaultCard.from_code(code & keep | edition << EDITION_SHIFT | stamp << STAMP_SHIFT)
+        return card
+
+    def build(self) -> SavedGame:
+        card = self.card_maker()
+        cards = [[card(code) for code in codes] for codes in self.zone_codes]
+        memory = MemoryZone(self.sizes[_MEMORY])
+        memory.cards.extend(cards[_MEMORY])
+        zones = [cls(max_size=size, cards=ZoneCards(zone_cards))
+                 for cls, size, zone_cards in zip((DeckZone, HandZone, StackZone, DiscardZone), self.sizes, cards)]
+        problem = ProblemZone()
+        count = len(self.tree_codes)
+        if count:
+            # Children follow their parent in BFS order, so build from the back.
+            offsets = list(accumulate(self.child_counts, initial=1))
+            nodes: List[Optional[ProblemNode]] = [None] * count
+            beaten = self.beaten
+            for index in range(count - 1, -1, -1):
+                nodes[index] = ProblemNode(card(self.tree_codes[index]), nodes[offsets[index]:offsets[index + 1]],
+                                           loot=self.tree_loot[index],
+                                           beaten=bool(beaten[index >> 3] >> (index & 7) & 1))
+            problem.root = nodes[0]
+        deck, hand, stack, discard = zones
+        return SavedGame((deck, hand, stack, discard, problem, memory), self.loot, self.turn)
+
+
+def load_game(path: str) -> SavedGame:
+    with open(path, "rb") as f:
+        return load_game_bytes(f.read(), path)
+
+
+def load_game_bytes(data: bytes, path: str = "save game") -> SavedGame:
+    """Loads a save from memory; `path` only names it in errors."""
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a save game")
+    magic, version = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a save game")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"{path} has save schema {version}, this build reads {SCHEMA_VERSION}")
+    replay = None
+    view = memoryview(data)
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        kind, length = RECORD.unpack_from(data, offset)
+        start = offset + RECORD.size
+        if start + length > len(data):
+            break  # the last save was cut short
+        reader = _Reader(view[:start + length], start)  # zero-copy, and reads cannot run past the record
+        if kind == KIND_CHECKPOINT:
+            replay = _Replay(reader)
+        elif kind == KIND_DELTA and replay is not None:
+            replay.apply(reader)
+        else:
+            raise ValueError(f"{path}: unexpected record kind {kind} at byte {offset}")
+        offset = start + length
+    if replay is None:
+        raise ValueError(f"{path} holds no checkpoint")
+    return replay.build()
+
+
+# ----------------------------
+# Autosave journal
+# ----------------------------
+
+class Autosave:
+    """
+    Keeps `path` up to date with the game in `zones`. Creating it writes a
+    checkpoint; every save() after that appends a delta. Once the deltas
+    since the checkpoint are larger than it (or `compact_every` of them have
+    piled up) the file is rewritten as a fresh checkpoint.
+
+    Beaten nodes are collected as ProblemZone observer events, so save()
+    never walks the tree; a structural change to the tree (a new root or an
+    added child) makes the next save a checkpoint.
+    """
+    def __init__(self, path: str, zones: GameZones, loot: int = 0, turn: int = 0, compact_every: int = 256,
+                 durable: bool = False):
+        self.path = path
+        self.zones = zones
+        self.compact_every = compact_every
+        self.durable = durable
+        self.records = 0
+        self.checkpoint_bytes = 0
+        self.journal_bytes = 0
+        self._file: Optional[BinaryIO] = None
+        self._tree_index: Dict[int, int] = {}
+        self._beaten: List[int] = []
+        self._structure_changed = False
+        zones[4].observers.append(self)
+        self.compact(loot, turn)
+
+    # ProblemZone observer hooks
+
+    def tree_reset(self, zone: ProblemZone) -> None:
+        self._structure_changed = True
+
+    def child_added(self, parent: ProblemNode, child: ProblemNode) -> None:
+        self._structure_changed = True
+
+    def node_beaten(self, node: ProblemNode) -> None:
+        index = self._tree_index.get(node.id)
+        if index is not None:
+            self._beaten.append(index)
+
+    def node_unbeaten(self, node: ProblemNode) -> None:
+        self._structure_changed = True  # the journal only records beats
+
+    # Saving
+
+    def compact(self, loot: int, turn: int) -> None:
+        """Rewrites the file as a single checkpoint of the current game."""
+        if self._file is not None:
+            self._file.close()
+        payload, self._codes, order = _checkpoint(self.zones, loot, turn)
+        self._versions = [zone.version for zone in _card_zones(self.zones)]
+        self._tree_index = {node.id: index for index, node in enumerate(order)}
+        self._beaten = []
+        self._structure_changed = False
+        self._names = (len(EDITIONS.names), len(STAMPS.names))
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(HEADER.pack(MAGIC, SCHEMA_VERSION))
+            self.checkpoint_bytes = HEADER.size + _write_record(f, KIND_CHECKPOINT, payload)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.journal_bytes = 0
+        self.records = 0
+        self._file = open(self.path, "ab")
+
+    def save(self, loot: int, turn: int) -> None:
+        """Appends what changed since the last save (or compacts, when due)."""
+        if self._structure_changed or self.records >= self.compact_every \
+                or self.journal_bytes > self.checkpoint_bytes:
+            self.compact(loot, turn)
+            return
+        editions, stamps = self._names
+        parts = [_pack_names(EDITIONS.names[editions:]), _pack_names(STAMPS.names[stamps:]), _TURN.pack(turn, loot)]
+        self._names = (len(EDITIONS.names), len(STAMPS.names))
+        changes = []
+        for slot, zone in enumerate(_card_zones(self.zones)):
+            if zone.version == self._versions[slot]:
+                continue
+            self._versions[slot] = zone.version
+            old, new = self._codes[slot], _zone_codes(zone, slot)
+            front, back, middle = _splice(old, new)
+            if front + back == len(old) == len(new):
+                continue
+            changes += [_SPLICE.pack(slot, front, back, len(middle)), _to_le(middle)]
+            self._codes[slot] = new
+        parts += [_U8.pack(len(changes) // 2)] + changes
+        parts += [_U32.pack(len(self._beaten)), _to_le(_codes(self._beaten))]
+        self._beaten = []
+        self.journal_bytes += _write_record(self._file, KIND_DELTA, b"".join(parts))
+        self.records += 1
+        self._file.flush()
+        if self.durable:
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self in self.zones[4].observers:
+            self.zones[4].observers.remove(self)
+
@@ -0,0 +1,275 @@
+import os
+import random
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .card import DefaultCard
+from .gamezone import HandZone, MemoryZone, ProblemZone, StackZone
+from .jokers import JokerChain
+from .logic import Deck, resolve_stacks
+from .treegen import TreeSpec, generate_tree
+
+# ----------------------------
+# Headless simulation of many games, used for balancing decks and trees.
+# ----------------------------
+
+CARD_COLORS = ["red", "blue", "green", "yellow"]
+
+# Games are split into fixed-size chunks, each seeded from the base seed and
+# its chunk index, so results depend on (games, seed) and not on worker count.
+CHUNK_SIZE = 500
+
+
+def standard_deck(numbers=range(1, 6), copies: int = 4) -> List[Tuple[Optional[str], Optional[int]]]:
+    """The printed playtest deck: blank numbers, coloured numbers and bare colors."""
+    spec = []
+    for number in numbers:
+        spec += [(None, number)] * copies
+        for color in CARD_COLORS:
+            spec += [(color, number)] * copies
+    for color in CARD_COLORS:
+        spec += [(color, None)] * copies
+    return spec
+
+
+class SimulationConfig:
+    def __init__(self,
+                 deck: Optional[List[Tuple[Optional[str], Optional[int]]]] = None,
+                 hand_size: int = 5,
+                 stack_size: int = 5,
+                 max_turns: int = 50,
+                 tree_depth: int = 3,
+                 tree_max_children: int = 2,
+                 tree_numbers: Tuple[int, int] = (1, 5),
+                 node_loot: int = 1,
+                 jokers: Optional[JokerChain] = None):
+        self.deck = deck if deck is not None else standard_deck()
+        self.hand_size = hand_size
+        self.stack_size = stack_size
+        self.max_turns = max_turns
+        self.tree_depth = tree_depth
+        self.tree_max_children = tree_max_children
+        self.tree_numbers = tree_numbers
+        self.node_loot = node_loot
+        self.jokers = jokers
+
+    def tree_spec(self) -> TreeSpec:
+        return TreeSpec(depth=self.tree_depth, max_children=self.tree_max_children, colors=CARD_COLORS,
+                        numbers=self.tree_numbers, loot=self.node_loot)
+
+
+# ----------------------------
+# Play policies
+# ----------------------------
+# A policy gets (hand cards, problem zone, memory) and returns the hand cards
+# to put on the stack, in order. Policies live in POLICIES so they can be
+# named across process boundaries.
+
+def random_policy(hand: List[DefaultCard], tree: ProblemZone, memory: MemoryZone) -> List[DefaultCard]:
+    count = random.randint(1, len(hand))
+    return random.sample(hand, count)
+
+
+def greedy_policy(hand: List[DefaultCard], tree: ProblemZone, memory: MemoryZone) -> List[DefaultCard]:
+    """Builds one attacker per exposed node it can match, pairing numbers with colors."""
+    wanted = {(node.color, node.number) for node in tree.get_exposed_nodes()}
+    numbers = [card for card in hand if card.number is not None]
+    paints = [card for card in hand if card.number is None and card.color]
+    plays = []
+    for card in numbers:
+        if card.color:
+            if (card.color, card.number) in wanted:
+                wanted.discard((card.color, card.number))
+                plays.append(card)
+            continue
+        # Blank numbers attack as red unless fused with a color card.
+        paint = next((p for p in paints if (p.color, card.number) in wanted), None)
+        if paint is not None:
+            paints.remove(paint)
+            wanted.discard((paint.color, card.number))
+            plays += [card, paint]
+        elif ('red', card.number) in wanted:
+            wanted.discard(('red', card.number))
+            plays.append(card)
+    if not plays:
+        # Nothing matches: cycle the hand so the next draw brings new cards.
+        return list(hand)
+    return plays
+
+
+POLICIES: Dict[str, Callable[[List[DefaultCard], ProblemZone, MemoryZone], List[DefaultCard]]] = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+# ----------------------------
+# Single game
+# ----------------------------
+
+def play_games(config: SimulationConfig, policy, count: int, tree_spec: Optional[TreeSpec] = None) -> List[Dict[str, int]]:
+    """
+    Plays `count` games in lockstep with the global random state and returns
+    their outcomes. Each turn every game still running draws and picks its
+    plays, then all their stacks are resolved in one resolve_stacks call.
+    """
+    tree_spec = tree_spec or config.tree_spec()
+    deck_codes = [DefaultCard(color, number).code for color, number in config.deck]
+    decks, trees = [], []
+    for _ in range(count):
+        decks.append(Deck([DefaultCard.from_code(code) for code in deck_codes]))
+        # The tree seed comes from the global state, so a seeded chunk still replays exactly.
+        trees.append(generate_tree(tree_spec, seed=random.getrandbits(64)))
+    hands = [HandZone(max_size=config.hand_size) for _ in range(count)]
+    stacks = [StackZone(max_size=config.stack_size) for _ in range(count)]
+    memories = [MemoryZone() for _ in range(count)]
+    loot_counters = [[0] for _ in range(count)]
+    turns = [0] * count
+
+    running = list(range(count))
+    while running:
+        playing = []
+        for game in running:
+            hand, tree = hands[game], trees[game]
+            if turns[game] >= config.max_turns or tree.solved:
+                continue
+            turns[game] += 1
+            for card in decks[game].draw_cards(config.hand_size - len(hand.cards)):
+                hand.add_card(card)
+            if not hand.cards:
+                continue
+            for card in policy(list(hand.cards), tree, memories[game]):
+                hand.play_to_stack(card, stacks[game])
+            playing.append(game)
+        if playing:
+            played = [list(stacks[game].cards) for game in playing]
+            codes = np.zeros((len(playing), max(len(cards) for cards in played)), dtype=np.uint32)
+            for row, cards in enumerate(played):
+                codes[row, :len(cards)] = [card.code for card in cards]
+            resolve_stacks(codes, [len(cards) for cards in played], [memories[game] for game in playing],
+                           [trees[game] for game in playing], [loot_counters[game] for game in playing],
+                           stacks=played, jokers=config.jokers)
+            for game in playing:
+                stacks[game].cards.clear()
+        running = playing
+
+    return [{
+        "won": tree.solved,
+        "turns": turns[game],
+        "loot": loot_counters[game][0],
+        "beaten": sum(1 for node in tree.iter_nodes() if node.beaten),
+    } for game, tree in enumerate(trees)]
+
+
+def play_game(config: SimulationConfig, policy, tree_spec: Optional[TreeSpec] = None) -> Dict[str, int]:
+    """Plays one game with the global random state and returns its outcome."""
+    return play_games(config, policy, 1, tree_spec)[0]
+
+
+# ----------------------------
+# Aggregation and process pool
+# ----------------------------
+
+class SimulationResult:
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.turns_to_solve = Counter()
+        self.loot = Counter()
+        self.nodes_beaten = 0
+
+    def record(self, outcome: Dict[str, int]) -> None:
+        self.games += 1
+        if outcome["won"]:
+            self.wins += 1
+            self.turns_to_solve[outcome["turns"]] += 1
+        self.loot[outcome["loot"]] += 1
+        self.nodes_beaten += outcome["beaten"]
+
+    def merge(self, other: 'SimulationResult') -> None:
+        self.games += other.games
+        self.wins += other.wins
+        self.turns_to_solve.update(other.turns_to_solve)
+        self.loot.update(other.loot)
+        self.nodes_beaten += other.nodes_beaten
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    def summary(self) -> dict:
+        solved_turns = sum(turns * count for turns, count in self.turns_to_solve.items())
+        total_loot = sum(loot * count for loot, count in self.loot.items())
+        return {
+            "games": self.games,
+            "wins": self.wins,
+            "win_rate": self.win_rate,
+            "mean_turns_to_solve": solved_turns / self.wins if self.wins else None,
+            "turns_to_solve": dict(sorted(self.turns_to_solve.items())),
+            "mean_loot": total_loot / self.games if self.games else 0.0,
+            "loot": dict(sorted(self.loot.items())),
+            "mean_nodes_beaten": self.nodes_beaten / self.games if self.games else 0.0,
+        }
+
+
+def _run_chunk(config: SimulationConfig, policy_name: str, games: int, seed: int) -> SimulationResult:
+    # Each chunk reseeds the worker's random module, giving it its own stream.
+    random.seed(seed)
+    policy = POLICIES[policy_name]
+    result = SimulationResult()
+    for outcome in play_games(config, policy, games):
+        result.record(outcome)
+    return result
+
+
+def simulate(games: int,
+             config: Optional[SimulationConfig] = None,
+             policy: str = "greedy",
+             seed: int = 0,
+             workers: Optional[int] = None) -> SimulationResult:
+    """Plays `games` games across a process pool and aggregates their outcomes."""
+    config = config or SimulationConfig()
+    seeder = random.Random(seed)
+    chunks = []
+    for start in range(0, games, CHUNK_SIZE):
+        chunks.append((min(CHUNK_SIZE, games - start), seeder.getrandbits(64)))
+
+    result = SimulationResult()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(chunks) == 1:
+        for count, chunk_seed in chunks:
+            result.merge(_run_chunk(config, policy, count, chunk_seed))
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_chunk, config, policy, count, chunk_seed) for count, chunk_seed in chunks]
+        for future in futures:
+            result.merge(future.result())
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    parser = argparse.ArgumentParser(description="Play many headless games and print aggregate stats.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--max-children", type=int, default=2)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = simulate(args.games,
+                      SimulationConfig(tree_depth=args.depth, tree_max_children=args.max_children),
+                      policy=args.policy, seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    summary = result.summary()
+    summary["games_per_hour"] = int(args.games / elapsed * 3600) if elapsed else None
+    print(json.dumps(summary, indent=2))
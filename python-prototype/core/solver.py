@@ -0,0 +1,723 @@
+import bisect
+import itertools
+import math
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .card import AbstractCard, DefaultCard, COLOR_NAMES, COLOR_MASK, NUMBER_SHIFT, NUMBER_MASK
+from .gamezone import ProblemNode, ProblemZone
+from .logic import Deck
+
+# ----------------------------
+# Optimal-play solver
+# ----------------------------
+# Finds the fewest turns to beat a problem tree from a known hand, deck order
+# and memory, following resolve_stack / attack_with_card:
+#
+#   * a number card attacks as its own color, or red when it has none;
+#   * a blank number directly followed by a bare color attacks as that color;
+#   * every attacker is remembered when the stack resolves, and remembered
+#     cards can be played again from memory on later turns (each play still
+#     takes a stack slot, and a key is played from memory once per turn).
+#
+# This is a perfect-information solver: it knows which cards every coming
+# draw deals, so what it returns is a bound (Solution.turn_bound), not the
+# turns a player who cannot see the deck should expect. Deck draws are random
+# picks, so for a logic.Deck that order is read off the deck's own RNG
+# (Deck.draw_order); the answer is then exact for that deck's future, not an
+# expectation over shuffles, and a reshuffle of the discard pile is not
+# modelled (the deck just runs out).
+#
+# Fusion also applies across plays: a lone blank played as red must not be
+# followed by a bare color (or a zero), or the two would fuse. Such orders
+# are never generated, and cards cycled at the end of a turn are laid out so
+# they cannot fuse with each other or with the last play; a bare color that
+# cannot be placed safely stays in hand.
+#
+# Cards and node requirements are reduced to their color+number bits, so a
+# hand is a sorted tuple of small ints. The remaining tree is interned by
+# shape (TreeTable): equal subtrees share one id, and the "beat an exposed
+# node" transitions of each shape are computed once and shared by every state
+# and every puzzle solved with the same table. Shapes keep their children in
+# tree order, because when several exposed nodes carry the attacking card the
+# game beats the first in tree order (ProblemZone.find_exposed); that is the
+# only move a card has.
+#
+# The search is IDA* over turns with a transposition table of proven lower
+# bounds, so states reached by a different play order are not searched again.
+# Turns may end by playing leftover cards to cycle the hand; those plays are
+# assumed not to hit anything (a hit is always generated as its own move).
+# Cards that can no longer help are always cycled; cards that still can are
+# only cycled on turns without a hit, which keeps the branching small.
+
+SOLVED = -1
+_KEY_MASK = COLOR_MASK | (NUMBER_MASK << NUMBER_SHIFT)
+_NUMBER_BITS = NUMBER_MASK << NUMBER_SHIFT
+_RED = COLOR_NAMES.index("red")
+_NUMBER_MARK = 1 << 31  # tags "any card of this number" in the per-solve position cache
+_COLOR_MARK = 1 << 30   # tags "any card of this color"
+
+
+def card_key(card: AbstractCard) -> int:
+    """The part of a card the attack rules look at: its color and number bits."""
+    return card.code & _KEY_MASK
+
+
+def attack_key(key: int) -> int:
+    """What a lone card attacks as (colorless cards attack as red)."""
+    return key if key & COLOR_MASK else key | _RED
+
+
+def _key_number(key: int) -> int:
+    return key >> NUMBER_SHIFT
+
+
+class TreeTable:
+    """
+    Interns the unbeaten part of problem trees by shape. A shape is
+    (requirement key, child shape ids in tree order); SOLVED stands for a beaten subtree.
+    """
+    def __init__(self):
+        self._ids: Dict[Tuple[int, tuple], int] = {}
+        self._shapes: List[Tuple[int, tuple]] = []
+        self._sizes: List[int] = []
+        self._needs: List[Counter] = []
+        self._moves: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        self._inner: Dict[int, tuple] = {}
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def intern(self, key: int, children: Iterable[int]) -> int:
+        children = tuple(children)
+        shape = (key, children)
+        tree_id = self._ids.get(shape)
+        if tree_id is None:
+            tree_id = len(self._shapes)
+            self._ids[shape] = tree_id
+            self._shapes.append(shape)
+            self._sizes.append(1 + sum(self._sizes[child] for child in children))
+            needs = Counter({key: 1})
+            for child in children:
+                needs.update(self._needs[child])
+            self._needs.append(needs)
+        return tree_id
+
+    def from_node(self, root: Optional[ProblemNode]) -> int:
+        """Interns the unbeaten part of a ProblemNode tree (iteratively)."""
+        if root is None or root.beaten:
+            return SOLVED
+        ids: Dict[int, int] = {}
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            live = [child for child in node.children if not child.beaten]
+            if children_done:
+                ids[node.id] = self.intern(card_key(node.card), (ids[child.id] for child in live))
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in live)
+        return ids[root.id]
+
+    def from_zone(self, zone: ProblemZone) -> int:
+        return self.from_node(zone.root)
+
+    def inner(self, tree_id: int) -> tuple:
+        """
+        (requirement key, requirement keys and counts below it) for each
+        distinct node shape in the tree that still has children.
+        """
+        inner = self._inner.get(tree_id)
+        if inner is None:
+            found, stack = {}, [tree_id]
+            while stack:
+                current = stack.pop()
+                key, children = self._shapes[current]
+                if children and current not in found:
+                    below = Counter()
+                    for child in children:
+                        below.update(self._needs[child])
+                    found[current] = (key, tuple(below.items()))
+                    stack.extend(children)
+            inner = self._inner[tree_id] = tuple(found.values())
+        return inner
+
+    def size(self, tree_id: int) -> int:
+        return 0 if tree_id == SOLVED else self._sizes[tree_id]
+
+    def needs(self, tree_id: int) -> Counter:
+        """How many unbeaten nodes have each requirement key."""
+        return Counter() if tree_id == SOLVED else self._needs[tree_id]
+
+    def moves(self, tree_id: int) -> Tuple[Tuple[int, int], ...]:
+        """
+        (requirement key, resulting tree) for each key some exposed node
+        needs: the tree left once the first such node in tree order is beaten.
+        """
+        moves = self._moves.get(tree_id)
+        if moves is not None:
+            return moves
+        # Children's moves are needed first; walk the shape post-order without recursing.
+        stack = [(tree_id, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if current in self._moves:
+                continue
+            key, children = self._shapes[current]
+            if not children_done:
+                stack.append((current, True))
+                stack.extend((child, False) for child in set(children) if child not in self._moves)
+                continue
+            if not children:
+                self._moves[current] = ((key, SOLVED),)
+                continue
+            results = {}
+            for index, child in enumerate(children):
+                for leaf, beaten in self._moves[child]:
+                    if leaf not in results:  # an earlier sibling's node takes the attack
+                        middle = () if beaten == SOLVED else (beaten,)
+                        results[leaf] = self.intern(key, children[:index] + middle + children[index + 1:])
+            self._moves[current] = tuple(sorted(results.items()))
+        return self._moves[tree_id]
+
+
+# A play is what goes on the stack for one attack: (from_memory, cards in stack order).
+Play = Tuple[bool, Tuple[DefaultCard, ...]]
+
+
+class Solution:
+    """
+    `turn_bound` is the fewest turns with every coming draw known and no
+    reshuffle (see above): a perfect-information bound, not the expected
+    turns of a player who cannot see the deck.
+    """
+    def __init__(self, solvable: Optional[bool], turn_bound: Optional[int], line: Optional[List[List[Play]]],
+                 expanded: int, elapsed: float, complete: bool):
+        self.solvable = solvable
+        self.turn_bound = turn_bound
+        self.line = line
+        self.expanded = expanded
+        self.elapsed = elapsed
+        self.complete = complete
+
+    @property
+    def hint(self) -> Optional[List[Play]]:
+        """The plays for the current turn on an optimal line."""
+        return self.line[0] if self.line else None
+
+    def __repr__(self):
+        return (f"Solution(solvable={self.solvable}, turn_bound={self.turn_bound}, expanded={self.expanded}, "
+                f"elapsed={self.elapsed * 1000:.1f}ms, complete={self.complete})")
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+class Solver:
+    """
+    Solves trees for a given hand size and stack size. One Solver (and its
+    TreeTable) can be reused across many puzzles; each solve() gets a fresh
+    transposition table.
+    """
+    def __init__(self, hand_size: int = 5, stack_size: int = 5, table: Optional[TreeTable] = None):
+        self.hand_size = hand_size
+        self.stack_size = stack_size
+        self.table = table or TreeTable()
+
+    def solve(self,
+              tree: ProblemZone,
+              hand: Sequence[AbstractCard],
+              deck: Sequence[AbstractCard] = (),
+              memory: Iterable[AbstractCard] = (),
+              use_memory: bool = True,
+              max_turns: int = 50,
+              max_nodes: Optional[int] = 200000,
+              time_limit: Optional[float] = None,
+              should_stop: Optional[Callable[[], bool]] = None) -> Solution:
+        """
+        `deck` is a logic.Deck, whose coming draws are read off its RNG, or
+        the cards in the order they will be drawn, last card first. With
+        use_memory=False memory is never played from, which is the devlog's
+        "solved from first principles" rule. When the node or time budget runs
+        out the Solution has complete=False and solvable=None; when the tree
+        needs more than max_turns it has solvable=False and complete=False.
+        `should_stop` is polled like the time limit and ends the search the
+        same way, e.g. when a background analysis has gone stale.
+        """
+        if isinstance(deck, Deck):
+            deck = deck.draw_order()[::-1]
+        self._deck = [card_key(card) for card in deck]
+        # Deck indexes of the cards that can serve each requirement, bottom first, for the draw-depth bound.
+        self._positions: Dict[int, List[int]] = {}
+        # Transposition table: state -> best known lower bound on turns left.
+        self._lower: Dict[tuple, float] = {}
+        self._successors: Dict[tuple, list] = {}
+        # Pure functions of parts of a state, shared by the many states that repeat them.
+        self._groups: Dict[tuple, tuple] = {}
+        self._supplies: Dict[tuple, float] = {}
+        self._parents: Dict[tuple, float] = {}
+        self._endings: Dict[tuple, list] = {}
+        self._expanded = 0
+        self._max_nodes = max_nodes
+        self._deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self._should_stop = should_stop
+        started = time.perf_counter()
+
+        start = (self.table.from_zone(tree), len(self._deck), tuple(sorted(card_key(card) for card in hand)),
+                 frozenset(attack_key(card_key(card)) for card in memory) if use_memory else None)
+        if start[0] == SOLVED:
+            return Solution(True, 0, [], 0, 0.0, True)
+
+        bound = self._heuristic(start)
+        line: List[List[Tuple[bool, Tuple[int, ...]]]] = []
+        try:
+            while bound <= max_turns:
+                found = self._search(start, 0, bound, line)
+                if found is True:
+                    plays = [[(from_memory, tuple(DefaultCard.from_code(key) for key in keys))
+                              for from_memory, keys in turn] for turn in line]
+                    return Solution(True, len(plays), plays, self._expanded, time.perf_counter() - started, True)
+                bound = found
+        except _BudgetExceeded:
+            return Solution(None, None, None, self._expanded, time.perf_counter() - started, False)
+        # Either proven impossible (bound is infinite) or not within max_turns.
+        return Solution(False, None, None, self._expanded, time.perf_counter() - started, math.isinf(bound))
+
+    # Search
+
+    def _open_needs(self, tree: int, memory: Optional[frozenset]) -> Counter:
+        """Requirement keys that still need cards: every node, or with memory one per key not yet remembered."""
+        needs = self.table.needs(tree)
+        if memory is None:
+            return needs
+        return Counter({key: 1 for key in needs if key not in memory})
+
+    def _deck_positions(self, cards: int) -> List[int]:
+        """
+        Deck indexes of the cards with key `cards`, or of every card of a
+        number tagged with _NUMBER_MARK or of a color tagged with _COLOR_MARK.
+        """
+        positions = self._positions.get(cards)
+        if positions is None:
+            if cards & _NUMBER_MARK:
+                number = cards & _NUMBER_BITS
+                positions = [index for index, key in enumerate(self._deck) if key & _NUMBER_BITS == number]
+            elif cards & _COLOR_MARK:
+                color = cards & COLOR_MASK
+                positions = [index for index, key in enumerate(self._deck) if key & COLOR_MASK == color]
+            else:
+                positions = [index for index, key in enumerate(self._deck) if key == cards]
+            self._positions[cards] = positions
+        return positions
+
+    def _heuristic(self, state: tuple) -> float:
+        """
+        Lower bound on turns left. The stack holds stack_size plays a turn, and
+        a play that misses memory needs cards for its node: the exact card, or
+        a blank of its number, alone for red and followed by a bare card of
+        the color otherwise. Blanks are shared by every color of a number and
+        bare colors by every number of a color. Those cards may still be deep
+        in the deck, and a turn draws at most what the previous one played.
+        """
+        tree, deck_left, hand, memory = state
+        remaining = self.table.size(tree)
+        if not remaining:
+            return 0
+        groups = self._groups.get((tree, memory))
+        if groups is None:
+            needs = self._open_needs(tree, memory)
+            by_number, by_color = Counter(), Counter()
+            for key, count in needs.items():
+                by_number[key & _NUMBER_BITS] += count
+                if key & COLOR_MASK != _RED:
+                    by_color[key & COLOR_MASK] += count
+            groups = self._groups[(tree, memory)] = (
+                tuple(needs.items()),
+                tuple((number | _NUMBER_MARK, _NUMBER_BITS, number, count) for number, count in by_number.items())
+                + tuple((color | _COLOR_MARK, COLOR_MASK, color, count) for color, count in by_color.items()))
+        needs, shared = groups
+        depth = 0
+        for key, count in needs:
+            supply = self._cached_supply(key, count, deck_left, hand)
+            if supply > depth:
+                depth = supply
+        for cards, mask, value, count in shared:
+            usable = sum(1 for card in hand if card & mask == value)
+            depth = max(depth, self._draw_depth(self._deck_positions(cards), deck_left, count - usable))
+        turns = -(-remaining // self.stack_size)
+        free = self.hand_size - len(hand)
+        if depth > free:
+            turns = max(turns, 1 + -(-(depth - free) // self.stack_size))
+        if memory is None:
+            # Without memory every node needs a card of its own, played after every card below it.
+            for key, below in self.table.inner(tree):
+                other = max(self._cached_supply(child, count, deck_left, hand) for child, count in below)
+                if other > free:
+                    turns = max(turns, self._parent_turns(key, deck_left, hand, other))
+        return turns
+
+    def _cached_supply(self, key: int, count: int, deck_left: int, hand: tuple) -> float:
+        paint = key & COLOR_MASK
+        cached = (key, count, deck_left, hand.count(key), hand.count(key & _NUMBER_BITS),
+                  hand.count(paint) if paint != _RED else 0)
+        supply = self._supplies.get(cached)
+        if supply is None:
+            supply = self._supplies[cached] = self._supply_depth(*cached)
+        return supply
+
+    def _parent_turns(self, key: int, deck_left: int, hand: tuple, other: int) -> float:
+        """
+        Lower bound on turns when a node needing `key` can only be attacked
+        once cards `other` deep have been drawn: its card either comes from
+        at least that deep, or is held from when it is drawn, and a held card
+        takes a hand slot away from drawing every turn until then.
+        """
+        blank, paint = key & _NUMBER_BITS, key & COLOR_MASK
+        cached = (key, deck_left, len(hand), other, key in hand, blank in hand, paint in hand)
+        best = self._parents.get(cached)
+        if best is not None:
+            return best
+        free = self.hand_size - len(hand)
+        stack = self.stack_size
+
+        def turns_to(depth: float) -> float:
+            return 1 if depth <= free else 1 + -(-(depth - free) // stack)
+
+        def around(cards: int, held: bool) -> Tuple[Optional[int], float]:
+            # The deepest source above `other` (a held card counts as depth 0) and the first from `other` down.
+            positions = self._deck_positions(cards)
+            top = bisect.bisect_left(positions, deck_left)
+            split = bisect.bisect_right(positions, deck_left - other)
+            above = deck_left - positions[split] if split < top else 0 if held else None
+            below = deck_left - positions[split - 1] if split else math.inf
+            return above, below
+
+        above, below = around(key, key in hand)
+        blank_above, blank_below = around(blank, blank in hand)
+        if paint == _RED:
+            pair_above, pair_below = blank_above, blank_below  # a blank alone attacks as red
+        else:
+            paint_above, paint_below = around(paint, paint in hand)
+            pair_above = None if blank_above is None or paint_above is None else max(blank_above, paint_above)
+            pair_below = max(blank_below, paint_below)
+            if blank_above is not None:
+                pair_below = min(pair_below, paint_below)
+            if paint_above is not None:
+                pair_below = min(pair_below, blank_below)
+        if pair_above is not None and (above is None or pair_above > above):
+            above = pair_above
+        best = turns_to(min(below, pair_below))
+        hold_rate = min(stack, self.hand_size - 1)
+        if above is not None and hold_rate > 0:
+            drawn_by = turns_to(above)
+            drawn = free + stack * (drawn_by - 1)
+            best = min(best, drawn_by + -(-max(0, other - drawn) // hold_rate))
+        self._parents[cached] = best
+        return best
+
+    def _supply_depth(self, key: int, count: int, deck_left: int, exact_held: int, blanks_held: int,
+                      paints_held: int) -> float:
+        """
+        How many cards must be drawn before `count` attacks as `key` can be
+        made from the deck and the cards held: exact cards plus blanks, or for
+        a color other than red exact cards plus blank and bare color pairs.
+        """
+        blank, paint = key & _NUMBER_BITS, key & COLOR_MASK
+        needed = count - exact_held
+        if needed <= 0:
+            return 0
+        # Draw depths of the cards not in hand, nearest first, merged one pick at a time.
+        exact = self._deck_positions(key)
+        blanks = self._deck_positions(blank)
+        paints = self._deck_positions(paint) if paint != _RED else None
+        exact_left = bisect.bisect_left(exact, deck_left)
+        blanks_left = bisect.bisect_left(blanks, deck_left)
+        paints_left = bisect.bisect_left(paints, deck_left) if paints is not None else 0
+        used_exact = pairs = 0
+        depth = 0
+        for _ in range(needed):
+            exact_depth = deck_left - exact[exact_left - 1 - used_exact] if used_exact < exact_left else math.inf
+            pair = pairs - blanks_held
+            pair_depth = 0 if pair < 0 else deck_left - blanks[blanks_left - 1 - pair] if pair < blanks_left else math.inf
+            if paints is not None:
+                pair = pairs - paints_held
+                pair_depth = max(pair_depth, 0 if pair < 0 else deck_left - paints[paints_left - 1 - pair]
+                                 if pair < paints_left else math.inf)
+            if exact_depth <= pair_depth:
+                depth, used_exact = max(depth, exact_depth), used_exact + 1
+            else:
+                depth, pairs = max(depth, pair_depth), pairs + 1
+        return depth
+
+    @staticmethod
+    def _draw_depth(positions: List[int], deck_left: int, missing: int) -> float:
+        """How many cards must be drawn to get `missing` more of `positions` (inf if the deck runs out)."""
+        if missing <= 0:
+            return 0
+        left = bisect.bisect_left(positions, deck_left)
+        if left < missing:
+            return math.inf
+        return deck_left - positions[left - missing]
+
+    def _search(self, state: tuple, turns: int, bound: int, line: list):
+        """IDA* step: True when solved within `bound`, else the smallest f-value that exceeded it."""
+        estimate = self._lower.get(state)
+        if estimate is None:
+            estimate = self._lower[state] = self._heuristic(state)
+        if turns + estimate > bound:
+            return turns + estimate
+        self._expanded += 1
+        if self._max_nodes is not None and self._expanded > self._max_nodes:
+            raise _BudgetExceeded()
+        if not self._expanded & 255 and (self._deadline is not None and time.perf_counter() > self._deadline
+                                         or self._should_stop is not None and self._should_stop()):
+            raise _BudgetExceeded()
+
+        successors = self._successors.get(state)
+        if successors is None:
+            # Deeper iterations come back through the same states; expand each once.
+            successors = self._successors[state] = self._ordered(self._turns(state))
+        best = math.inf
+        lower = self._lower
+        for successor, plays in successors:
+            if successor is None:
+                line.append(plays)
+                return True
+            if successor == state:
+                continue
+            known = lower.get(successor)
+            if known is not None and turns + 1 + known > bound:
+                best = min(best, turns + 1 + known)  # what the call below would return at once
+                continue
+            line.append(plays)
+            found = self._search(successor, turns + 1, bound, line)
+            if found is True:
+                return True
+            line.pop()
+            best = min(best, found)
+        self._lower[state] = max(estimate, best - turns)
+        return best
+
+    def _ordered(self, successors) -> list:
+        """Successors most promising first: by lower bound, then by how much tree is left."""
+        lower = self._lower
+        scored = []
+        for successor, plays in successors:
+            if successor is None:
+                return [(successor, plays)]
+            estimate = lower.get(successor)
+            if estimate is None:
+                estimate = lower[successor] = self._heuristic(successor)
+            scored.append((estimate, self.table.size(successor[0]), len(scored), successor, plays))
+        scored.sort()
+        return [(successor, plays) for _, _, _, successor, plays in scored]
+
+    def _turns(self, state: tuple):
+        """Yields (next state, plays) for every distinct outcome of one turn; next state is None when it solves the tree."""
+        tree, deck_left, hand, memory = state
+        draw = min(max(self.hand_size - len(hand), 0), deck_left)
+        if draw:
+            hand = tuple(sorted(hand + tuple(self._deck[deck_left - draw:deck_left])))
+            deck_left -= draw
+
+        # Memory only fills when the stack resolves, so within a turn only what
+        # was remembered before it can be played from memory, each key once.
+        outcomes: Dict[tuple, list] = {}
+        seen = set()
+        moves = self.table.moves
+        stack = [(tree, hand, memory, frozenset(), self.stack_size, [])]
+        while stack:
+            tree, hand, available, attacked, slots, plays = stack.pop()
+            if (tree, hand, available, attacked, slots) in seen:
+                continue
+            seen.add((tree, hand, available, attacked, slots))
+            after_blank = bool(plays) and _lone_blank(plays[-1])
+            for discarded, rest in self._endings_for(tree, hand, memory, slots, bool(plays), after_blank):
+                remembered = memory
+                if memory is not None:
+                    remembered = memory | attacked | {attack_key(key) for key in discarded}
+                outcome = (tree, deck_left, rest, remembered)
+                if outcome not in outcomes:
+                    outcomes[outcome] = plays + [(False, (key,)) for key in discarded]
+            if not slots:
+                continue
+            for leaf, beaten in moves(tree):
+                for used, from_memory in self._sources(leaf, hand, available, slots):
+                    if after_blank and _is_paint(used[0] if used else leaf):
+                        continue  # it would fuse with the blank before it
+                    played = plays + [(from_memory, used if used else (leaf,))]
+                    if beaten == SOLVED:
+                        yield None, played
+                        return
+                    rest = _remove(hand, used)
+                    left = available - {leaf} if from_memory else available
+                    stack.append((beaten, rest, left, attacked | {leaf}, slots - max(len(used), 1), played))
+        yield from outcomes.items()
+
+    def _endings_for(self, tree: int, hand: tuple, memory: Optional[frozenset], slots: int, hit: bool,
+                     after_blank: bool) -> list:
+        """_cycles laid out in stack order, as (cards played out, hand left)."""
+        cached = (tree, hand, memory, slots, hit, after_blank)
+        endings = self._endings.get(cached)
+        if endings is None:
+            endings = self._endings[cached] = []
+            for discarded, _ in self._cycles(tree, hand, memory, slots, hit):
+                discarded = _stack_order(discarded, after_blank)
+                endings.append((discarded, _remove(hand, discarded)))
+        return endings
+
+    def _sources(self, leaf: int, hand: tuple, memory: Optional[frozenset], slots: int):
+        """Ways to attack as `leaf`: (hand cards used, from memory). Memory is free, so it wins outright."""
+        if memory is not None and leaf in memory:
+            yield (), True
+            return
+        paint = leaf & COLOR_MASK
+        if not paint:
+            return  # colorless requirements cannot be attacked, cards default to red
+        if leaf in hand:
+            yield (leaf,), False
+        blank = leaf & _NUMBER_BITS
+        if blank in hand:
+            if paint == _RED:
+                yield (blank,), False
+            if slots >= 2 and blank and paint in hand:
+                yield (blank, paint), False
+
+    def _dead_cards(self, tree: int, hand: tuple, memory: Optional[frozenset]) -> Tuple[tuple, tuple]:
+        """
+        Splits the hand into (dead, live). A card is dead once the nodes it
+        could still help with are all covered by other copies in hand, so
+        cycling it out is never worse than keeping it.
+        """
+        needs = self._open_needs(tree, memory)
+        by_number, by_color = Counter(), Counter()
+        for key, count in needs.items():
+            by_number[key & _NUMBER_BITS] += count
+            by_color[key & COLOR_MASK] += count
+        dead, live, kept = [], [], Counter()
+        for key in hand:
+            if key & COLOR_MASK and key & _NUMBER_BITS:
+                room = needs[key]                  # a colored number only fits its own node
+            elif key & _NUMBER_BITS:
+                room = by_number[key]              # a blank fits any color of its number
+            elif key & COLOR_MASK:
+                room = by_color[key] + needs[key]  # a bare color paints a blank, or hits a colorless-number node
+            else:
+                room = needs[_RED]
+            kept[key] += 1
+            (live if kept[key] <= room else dead).append(key)
+        return tuple(dead), tuple(live)
+
+    def _cycles(self, tree: int, hand: tuple, memory: Optional[frozenset], slots: int, hit: bool):
+        """
+        Ways to end the turn, as (cards played out as misses, hand left).
+        Dead cards always go, as many as fit. Live cards are only cycled on a
+        turn without hits, when the hand may be stuck waiting on the deck.
+        """
+        dead, live = self._dead_cards(tree, hand, memory)
+        dead = dead[:slots]
+        slots -= len(dead)
+        if hit or not slots or not live:
+            yield dead, _remove(hand, dead)
+            return
+        counts = sorted(Counter(live).items())
+        ranges = [range(min(count, slots) + 1) for _, count in counts]
+        for picks in itertools.product(*ranges):
+            if sum(picks) > slots:
+                continue
+            discarded = dead + tuple(key for (key, _), pick in zip(counts, picks) for _ in range(pick))
+            yield discarded, _remove(hand, discarded)
+
+
+def _is_blank(key: int) -> bool:
+    return not key & COLOR_MASK and bool(key & _NUMBER_BITS)
+
+
+def _is_paint(key: int) -> bool:
+    """A card that fuses with a blank right before it: a color with no number, or number 0."""
+    return bool(key & COLOR_MASK) and _key_number(key) <= 1
+
+
+def _lone_blank(play: Tuple[bool, Tuple[int, ...]]) -> bool:
+    """Whether a play ends in a blank that attacks on its own (as red)."""
+    from_memory, keys = play
+    return not from_memory and len(keys) == 1 and _is_blank(keys[0])
+
+
+def _stack_order(discarded: tuple, after_blank: bool) -> tuple:
+    """
+    Lays out cycled cards so none of them fuses: bare colors before blanks,
+    and after a lone blank a non-color card first. Bare colors that cannot
+    go anywhere safe are left out (kept in hand).
+    """
+    paint, blank, other = [], [], []
+    for key in discarded:
+        (paint if _is_paint(key) else blank if _is_blank(key) else other).append(key)
+    paint, blank, other = tuple(paint), tuple(blank), tuple(other)
+    if not after_blank or not paint:
+        return paint + other + blank
+    if other:
+        return other + paint + blank
+    return blank
+
+
+def _remove(hand: tuple, used: tuple) -> tuple:
+    if not used:
+        return hand
+    rest = list(hand)
+    for key in used:
+        rest.remove(key)
+    return tuple(rest)
+
+
+# ----------------------------
+# Rating
+# ----------------------------
+
+class Rating:
+    """
+    How hard a tree is from a given start. `turn_bound` is the optimal line
+    with memory, `first_principles_bound` the optimal line never playing from
+    memory; the devlog wants the latter to exist for every tree. Both are
+    perfect-information bounds (Solution.turn_bound).
+    """
+    def __init__(self, with_memory: Solution, first_principles: Solution):
+        self.with_memory = with_memory
+        self.first_principles = first_principles
+
+    @property
+    def turn_bound(self) -> Optional[int]:
+        return self.with_memory.turn_bound
+
+    @property
+    def first_principles_bound(self) -> Optional[int]:
+        return self.first_principles.turn_bound
+
+    @property
+    def solvable_from_first_principles(self) -> Optional[bool]:
+        return self.first_principles.solvable
+
+    @property
+    def difficulty(self) -> Optional[int]:
+        """The first-principles turn bound, or None when unsolved or out of budget."""
+        return self.first_principles.turn_bound
+
+    @property
+    def expanded(self) -> int:
+        return self.with_memory.expanded + self.first_principles.expanded
+
+    def __repr__(self):
+        return (f"Rating(turn_bound={self.turn_bound}, first_principles_bound={self.first_principles_bound}, "
+                f"expanded={self.expanded})")
+
+
+def rate(tree: ProblemZone, hand: Sequence[AbstractCard], deck: Sequence[AbstractCard] = (),
+         memory: Iterable[AbstractCard] = (), solver: Optional[Solver] = None, **budget) -> Rating:
+    """Solves the tree with and without memory; `budget` takes solve()'s max_turns/max_nodes/time_limit."""
+    solver = solver or Solver()
+    memory = list(memory)
+    return Rating(solver.solve(tree, hand, deck, memory, use_memory=True, **budget),
+                  solver.solve(tree, hand, deck, memory, use_memory=False, **budget))
+
@@ -0,0 +1,542 @@
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .card import AbstractCard, DefaultCard, COLOR_MASK, NUMBER_SHIFT, NUMBER_MASK
+from .gamezone import ProblemNode, ProblemZone
+from .logic import Deck, fuse_codes, pick_order
+
+# ----------------------------
+# Persistent game state
+# ----------------------------
+# A GameState is immutable: every action returns a new state that shares
+# everything it did not touch with the old one, so keeping every state ever
+# reached (unlimited undo, what-if previews, search branches) costs only
+# what each action changed.
+#
+#   * cards are packed codes (see core/card.py) in tuples; the hand, stack
+#     and memory are small and bounded, so they are simply rebuilt;
+#   * the deck is one shared tuple plus the index of its top card, and the
+#     discard pile a linked list of (code, rest) cells, so drawing and
+#     discarding copy nothing. The tuple is in the order a core.logic.Deck
+#     would deal the same cards, and the state carries that deck's RNG state
+#     (an immutable tuple) so a reshuffle deals the discard pile exactly as
+#     Deck.reshuffle followed by more draws would;
+#   * beaten flags live in a PersistentBits trie: beating a node copies one
+#     root-to-leaf path (three levels for a 100k node tree);
+#   * the frontier maps a card's color+number bits to a PersistentBits of
+#     the exposed nodes with that card; a resolve copies the small key dict
+#     once and one trie path per node it beats or exposes;
+#   * loot and counters are plain ints, and `signature` is a Zobrist hash of
+#     the beaten set, kept up to date as nodes are beaten.
+#
+# When several exposed nodes carry the attacking card, the state beats the
+# first in tree order (StateTree's pre-order), the same node
+# ProblemZone.find_exposed picks.
+#
+# The tree's structure never changes during a game and is held once, in a
+# StateTree shared by every state of that game.
+
+_KEY_MASK = COLOR_MASK | (NUMBER_MASK << NUMBER_SHIFT)
+
+_WIDTH_BITS = 5
+_WIDTH = 1 << _WIDTH_BITS
+_SLOT = _WIDTH - 1
+
+
+class PersistentBits:
+    """
+    An immutable bitset over 0..size-1: a 32-way trie whose leaves are
+    32-bit words, with empty subtrees left out (None). set() and clear()
+    return a new bitset sharing all but one root-to-leaf path.
+    """
+    __slots__ = ("size", "shift", "root", "count")
+
+    def __init__(self, size: int, indexes: Iterable[int] = ()):
+        self.size = size
+        words = max(1, -(-size // _WIDTH))
+        self.shift = 0
+        while (_WIDTH << self.shift) < words:
+            self.shift += _WIDTH_BITS
+        # Built bottom-up: the words, then one level of 32-wide tuples per shift step.
+        level: Dict[int, object] = {}
+        for index in indexes:
+            if not 0 <= index < size:
+                raise IndexError("bit index out of range")
+            level[index >> _WIDTH_BITS] = level.get(index >> _WIDTH_BITS, 0) | 1 << (index & _SLOT)
+        self.count = sum(bin(word).count("1") for word in level.values())
+        for _ in range(0, self.shift + 1, _WIDTH_BITS):
+            parents: Dict[int, list] = {}
+            for position, node in level.items():
+                parents.setdefault(position >> _WIDTH_BITS, [None] * _WIDTH)[position & _SLOT] = node
+            level = {position: tuple(children) for position, children in parents.items()}
+        self.root = level.get(0)
+
+    def _copy(self, root, count: int) -> 'PersistentBits':
+        bits = PersistentBits.__new__(PersistentBits)
+        bits.size, bits.shift, bits.root, bits.count = self.size, self.shift, root, count
+        return bits
+
+    def __contains__(self, index: int) -> bool:
+        node = self.root
+        word = index >> _WIDTH_BITS
+        shift = self.shift
+        while node is not None and shift >= 0:
+            node = node[(word >> shift) & _SLOT]
+            shift -= _WIDTH_BITS
+        return node is not None and bool(node >> (index & _SLOT) & 1)
+
+    def _update(self, index: int, value: bool) -> 'PersistentBits':
+        if not 0 <= index < self.size:
+            raise IndexError("bit index out of range")
+        if (index in self) == value:
+            return self
+        word = index >> _WIDTH_BITS
+        path = []
+        node = self.root
+        shift = self.shift
+        while shift >= 0:
+            children = node if node is not None else (None,) * _WIDTH
+            path.append((children, (word >> shift) & _SLOT))
+            node = children[(word >> shift) & _SLOT]
+            shift -= _WIDTH_BITS
+        node = ((node or 0) | 1 << (index & _SLOT)) if value else (node & ~(1 << (index & _SLOT))) or None
+        for children, slot in reversed(path):
+            node = children[:slot] + (node,) + children[slot + 1:]
+            if not any(node):
+                node = None
+        return self._copy(node, self.count + (1 if value else -1))
+
+    def set(self, index: int) -> 'PersistentBits':
+        return self._update(index, True)
+
+    def clear(self, index: int) -> 'PersistentBits':
+        return self._update(index, False)
+
+    def first(self) -> Optional[int]:
+        """The lowest index in the set, or None."""
+        node, shift, base = self.root, self.shift, 0
+        if node is None:
+            return None
+        while shift >= 0:
+            slot = next(slot for slot, child in enumerate(node) if child is not None)
+            node, base = node[slot], base | slot << shift
+            shift -= _WIDTH_BITS
+        return (base << _WIDTH_BITS) | ((node & -node).bit_length() - 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def changes(self, other: 'PersistentBits') -> Iterator[int]:
+        """
+        The indexes in exactly one of this and `other` (a bitset of the same
+        size, e.g. an earlier version of this one), ascending. Subtrees the
+        two share are skipped, so this walks only the paths that differ.
+        """
+        empty = (None,) * _WIDTH
+        stack = [(self.root, other.root, self.shift, 0)]
+        while stack:
+            mine, theirs, shift, base = stack.pop()
+            if mine is theirs:
+                continue
+            if shift < 0:
+                word = (mine or 0) ^ (theirs or 0)
+                while word:
+                    low = word & -word
+                    yield (base << _WIDTH_BITS) | (low.bit_length() - 1)
+                    word ^= low
+                continue
+            mine, theirs = mine or empty, theirs or empty
+            for slot in range(_WIDTH - 1, -1, -1):
+                if mine[slot] is not theirs[slot]:
+                    stack.append((mine[slot], theirs[slot], shift - _WIDTH_BITS, base | slot << shift))
+
+    def __iter__(self) -> Iterator[int]:
+        stack = [(self.root, self.shift, 0)]
+        while stack:
+            node, shift, base = stack.pop()
+            if node is None:
+                continue
+            if shift < 0:
+                for bit in range(_WIDTH):
+                    if node >> bit & 1:
+                        yield (base << _WIDTH_BITS) | bit
+                continue
+            for slot in range(_WIDTH - 1, -1, -1):
+                stack.append((node[slot], shift - _WIDTH_BITS, base | slot << shift))
+
+
+class StateTree:
+    """
+    The fixed structure of a problem tree in pre-order: node codes, loot,
+    parents and children, a random 64-bit key per node for signatures, and
+    the ProblemNodes it was built from so results can be mapped back.
+    """
+    def __init__(self, root: Optional[ProblemNode]):
+        self.nodes: List[ProblemNode] = []
+        self.codes: List[int] = []
+        self.loot: List[int] = []
+        self.parents: List[int] = []
+        self.children: List[Tuple[int, ...]] = []
+        self.zobrist: List[int] = []
+        if root is None:
+            return
+        index_of = {}
+        stack = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index_of[node.id] = len(self.nodes)
+            self.nodes.append(node)
+            self.codes.append(node.card.code)
+            self.loot.append(node.loot)
+            self.parents.append(parent)
+            stack.extend((child, index_of[node.id]) for child in reversed(node.children))
+        rng = random.Random(len(self.nodes))
+        self.zobrist = [rng.getrandbits(64) for _ in self.nodes]
+        self.children = [tuple(index_of[child.id] for child in node.children) for node in self.nodes]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_zone(cls, zone: ProblemZone) -> 'StateTree':
+        return cls(zone.root)
+
+    def index(self, node: ProblemNode) -> int:
+        if not hasattr(self, "_index_of"):
+            self._index_of = {node.id: index for index, node in enumerate(self.nodes)}
+        return self._index_of[node.id]
+
+
+class GameState:
+    """
+    One immutable game position. Build the first one with GameState.new();
+    every action method returns a new state and leaves this one untouched.
+    """
+    __slots__ = ("tree", "beaten", "signature", "frontier", "deck", "deck_top", "discard", "discard_count", "hand", "stack",
+                 "memory", "memory_seq", "memory_capacity", "loot", "turn", "rng_state", "reshuffles")
+
+    @classmethod
+    def new(cls,
+            tree: ProblemZone,
+            deck: Sequence[AbstractCard] = (),
+            hand: Sequence[AbstractCard] = (),
+            memory_capacity: int = 100,
+            seed: Optional[int] = None,
+            shuffle: bool = True,
+            stack: Sequence[AbstractCard] = (),
+            memory: Sequence[AbstractCard] = (),
+            discard: Sequence[AbstractCard] = ()) -> 'GameState':
+        """
+        The opening state. `deck` is a core.logic.Deck, dealt exactly as it
+        would deal, or a list of cards dealt as Deck(deck, seed=seed) would
+        (in the given order with shuffle=False; reshuffles still use the
+        seed). `memory` is newest first and `discard` oldest first, as the
+        zones hold them.
+        """
+        state = cls.__new__(cls)
+        state.tree = StateTree.from_zone(tree)
+        size = len(state.tree)
+        beaten = [index for index, node in enumerate(state.tree.nodes) if node.beaten]
+        state.beaten = PersistentBits(size, beaten)
+        state.signature = 0
+        for index in beaten:
+            state.signature ^= state.tree.zobrist[index]
+        exposed: Dict[int, List[int]] = {}
+        for index, node in enumerate(state.tree.nodes):
+            if node.is_exposed():
+                exposed.setdefault(state.tree.codes[index] & _KEY_MASK, []).append(index)
+        state.frontier = {key: PersistentBits(size, indexes) for key, indexes in exposed.items()}
+        if isinstance(deck, Deck):
+            rng = random.Random()
+            rng.setstate(deck.rng.getstate())
+            codes = [card.code for card in pick_order(deck.pile, rng)]
+            state.reshuffles = deck.reshuffles
+        else:
+            rng = random.Random(random.getrandbits(64) if seed is None else seed)
+            codes = [card.code for card in deck]
+            if shuffle:
+                codes = pick_order(codes, rng)
+            state.reshuffles = 0
+        state.rng_state = rng.getstate()
+        state.deck, state.deck_top = tuple(codes), 0
+        state.discard, state.discard_count = None, 0
+        for card in discard:
+            state.discard, state.discard_count = (card.code, state.discard), state.discard_count + 1
+        state.hand = tuple(card.code for card in hand)
+        state.stack = tuple(card.code for card in stack)
+        state.memory = tuple((seq, card.code) for seq, card in zip(range(len(memory) - 1, -1, -1), memory))
+        state.memory_seq, state.memory_capacity = len(memory), memory_capacity
+        state.loot = 0
+        state.turn = 0
+        return state
+
+    @classmethod
+    def from_zones(cls, zones: Sequence, seed: Optional[int] = None) -> 'GameState':
+        """
+        The state the mutable zones (deck, hand, stack, discard, problem,
+        memory, as core.savegame.GameZones) are in. A plain deck zone is
+        dealt from its first card; reshuffles use the seed.
+        """
+        deck_zone, hand_zone, stack_zone, discard_zone, problem_zone, memory_zone = zones
+        state = cls.new(problem_zone, deck_zone if isinstance(deck_zone, Deck) else list(deck_zone.cards),
+                        list(hand_zone.cards), memory_zone.max_size, seed, shuffle=False,
+                        stack=list(stack_zone.cards), discard=list(discard_zone.cards))
+        # The zone's own sequence numbers, so sync_zones can match remembered cards up by them.
+        state.memory = tuple((seq, card.code) for seq, card in memory_zone.cards.entries())
+        state.memory_seq = memory_zone.cards.next_seq
+        return state
+
+    def _replace(self, **changes) -> 'GameState':
+        state = GameState.__new__(GameState)
+        for name in GameState.__slots__:
+            setattr(state, name, changes[name] if name in changes else getattr(self, name))
+        return state
+
+    # Queries
+
+    @property
+    def solved(self) -> bool:
+        return len(self.tree) > 0 and 0 in self.beaten
+
+    @property
+    def deck_size(self) -> int:
+        return len(self.deck) - self.deck_top
+
+    def discard_codes(self) -> List[int]:
+        """The discard pile, newest first."""
+        codes, cell = [], self.discard
+        while cell is not None:
+            codes.append(cell[0])
+            cell = cell[1]
+        return codes
+
+    def memory_codes(self) -> List[int]:
+        """Remembered cards, newest first."""
+        return [code for _, code in self.memory]
+
+    def exposed(self) -> List[int]:
+        return sorted(index for bucket in self.frontier.values() for index in bucket)
+
+    def find_exposed(self, code: int) -> Optional[int]:
+        """The first exposed node, in tree order, with the card's color and number."""
+        bucket = self.frontier.get(code & _KEY_MASK)
+        return bucket.first() if bucket is not None else None
+
+    def key(self) -> tuple:
+        """A hashable summary for transposition tables (the deck and tree are the same objects across a search)."""
+        return (self.signature, self.hand, self.stack, tuple(self.memory_codes()), self.deck_top,
+                self.discard_count, self.loot)
+
+    # Actions
+
+    def draw(self, n: int) -> 'GameState':
+        """Draws up to n cards into the hand, shuffling the discard pile back in if the deck runs out."""
+        state = self
+        drawn = self.deck[self.deck_top:self.deck_top + n]
+        state = self._replace(hand=self.hand + drawn, deck_top=self.deck_top + len(drawn))
+        if len(drawn) < n and state.discard_count:
+            # Like Deck.reshuffle: the discard pile, oldest first, becomes the pile and the draws carry on.
+            rng = random.Random()
+            rng.setstate(state.rng_state)
+            codes = pick_order(reversed(state.discard_codes()), rng)
+            state = state._replace(deck=tuple(codes), deck_top=0, discard=None, discard_count=0,
+                                   rng_state=rng.getstate(), reshuffles=state.reshuffles + 1)
+            state = state.draw(n - len(drawn))
+        return state
+
+    def refill(self, hand_size: int) -> 'GameState':
+        return self.draw(max(0, hand_size - len(self.hand)))
+
+    def play(self, position: int, stack_size: int = 5) -> 'GameState':
+        """Plays the hand card at `position` onto the stack (if the stack has room)."""
+        if len(self.stack) >= stack_size:
+            return self
+        return self._replace(hand=self.hand[:position] + self.hand[position + 1:],
+                             stack=self.stack + (self.hand[position],))
+
+    def play_from_memory(self, position: int, stack_size: int = 5) -> 'GameState':
+        """Plays the remembered card at `position` (newest first) onto the stack."""
+        if len(self.stack) >= stack_size:
+            return self
+        return self._replace(memory=self.memory[:position] + self.memory[position + 1:],
+                             stack=self.stack + (self.memory[position][1],))
+
+    def discard_card(self, position: int) -> 'GameState':
+        """Moves the hand card at `position` onto the discard pile."""
+        return self._replace(hand=self.hand[:position] + self.hand[position + 1:],
+                             discard=(self.hand[position], self.discard), discard_count=self.discard_count + 1)
+
+    def resolve(self, jokers=None) -> 'GameState':
+        """
+        Resolves the stack like core.logic.resolve_stack (jokers first, then
+        fusion; every attacker is remembered and beats the first matching
+        exposed node) and clears it.
+        """
+        codes = self.stack
+        if jokers:
+            table = jokers.table
+            codes = [out for code in codes for out in table.apply_code(code)]
+        tree = self.tree
+        beaten, signature, frontier, loot = self.beaten, self.signature, self.frontier, self.loot
+        memory, seq, capacity = self.memory, self.memory_seq, self.memory_capacity
+        copied = False
+        for _, attacker in fuse_codes(codes):
+            memory = ((seq, attacker),) + memory
+            if memory[-1][0] <= seq - capacity:
+                memory = memory[:-1]
+            seq += 1
+            key = attacker & _KEY_MASK
+            bucket = frontier.get(key)
+            if bucket is None:
+                continue
+            if not copied:
+                frontier, copied = dict(frontier), True
+            node = bucket.first()
+            bucket = bucket.clear(node)
+            if bucket.count:
+                frontier[key] = bucket
+            else:
+                del frontier[key]
+            beaten = beaten.set(node)
+            signature ^= tree.zobrist[node]
+            loot += tree.loot[node]
+            parent = tree.parents[node]
+            if parent >= 0 and parent not in beaten and all(child in beaten for child in tree.children[parent]):
+                parent_key = tree.codes[parent] & _KEY_MASK
+                parent_bucket = frontier.get(parent_key)
+                frontier[parent_key] = (parent_bucket or PersistentBits(len(tree))).set(parent)
+        return self._replace(stack=(), beaten=beaten, signature=signature, frontier=frontier, loot=loot,
+                             memory=memory, memory_seq=seq)
+
+    def end_turn(self, hand_size: int = 5, jokers=None) -> 'GameState':
+        """Resolves the stack, refills the hand and counts the turn."""
+        state = self.resolve(jokers).refill(hand_size)
+        return state._replace(turn=state.turn + 1)
+
+    # Back to mutable zones
+
+    def sync_tree(self, since: Optional['GameState'] = None) -> None:
+        """
+        Writes this state's beaten flags back onto the ProblemNodes the tree
+        was built from. With `since`, the state the tree shows now, only the
+        nodes whose flags differ go through ProblemZone.beat_node or
+        unbeat_node, so the zone's counts and observers follow node by node.
+        """
+        nodes = self.tree.nodes
+        zone = nodes[0].zone if nodes else None
+        if zone is not None and since is not None and since.tree is self.tree:
+            changed = list(self.beaten.changes(since.beaten))
+            # Pre-order puts parents first: unbeat from the top down and beat
+            # from the bottom up, so each node sees its final children.
+            for index in changed:
+                if index not in self.beaten:
+                    zone.unbeat_node(nodes[index].id)
+            for index in reversed(changed):
+                if index in self.beaten:
+                    zone.beat_node(nodes[index].id)
+            return
+        for index, node in enumerate(nodes):
+            node.beaten = index in self.beaten
+        if nodes:
+            nodes[0].recount()
+        if zone is not None:
+            zone.root = zone.root  # reindexes the frontier
+
+    def sync_zones(self, zones: Sequence, since: Optional['GameState'] = None) -> None:
+        """
+        Writes this state back into the mutable zones it was built from (see
+        from_zones). With `since`, the state the zones are in now, only what
+        differs from it is written: remembered cards by sequence number, the
+        discard pile above the cells the two share, the cards between the two
+        deck tops and the nodes whose flags changed. A core.logic.Deck is left
+        alone, since its order lives in its RNG.
+        """
+        deck_zone, hand_zone, stack_zone, discard_zone, _, memory_zone = zones
+        for zone, codes, old in ((hand_zone, self.hand, since and since.hand),
+                                 (stack_zone, self.stack, since and since.stack)):
+            if codes is not old:
+                zone.cards.clear()
+                zone.cards.extend(cards(codes))
+
+        if since is None:
+            discard_zone.cards.clear()
+            discard_zone.cards.extend(cards(reversed(self.discard_codes())))
+        elif self.discard is not since.discard:
+            # Both piles are cons lists: drop since's cells above the shared tail, then add ours.
+            old, old_count, new, new_count = since.discard, since.discard_count, self.discard, self.discard_count
+            dropped, added = 0, []
+            while old_count > new_count:
+                old, old_count, dropped = old[1], old_count - 1, dropped + 1
+            while new_count > old_count:
+                added.append(new[0])
+                new, new_count = new[1], new_count - 1
+            while old is not new:
+                added.append(new[0])
+                old, new, dropped = old[1], new[1], dropped + 1
+            for _ in range(dropped):
+                discard_zone.cards.pop()
+            discard_zone.cards.extend(cards(reversed(added)))
+
+        if not isinstance(deck_zone, Deck):
+            if since is not None and self.deck is since.deck:
+                moved = self.deck_top - since.deck_top
+                for _ in range(moved):
+                    deck_zone.cards.pop(0)
+                if moved < 0:
+                    deck_zone.cards.extendleft(cards(self.deck[self.deck_top:since.deck_top]))
+            else:
+                # A reshuffle dealt a new pile: every card moved anyway.
+                deck_zone.cards.clear()
+                deck_zone.cards.extend(cards(self.deck[self.deck_top:]))
+
+        if since is None or self.memory is not since.memory:
+            memory = memory_zone.cards
+            if since is None:
+                memory.clear()
+            old = since.memory if since is not None else ()
+            kept = {seq for seq, _ in self.memory}
+            for seq, _ in old:
+                if seq not in kept:
+                    memory.take(seq)
+            memory.seek(self.memory_seq)
+            known = {seq for seq, _ in old}
+            for seq, code in self.memory:
+                if seq not in known:
+                    memory.put(seq, DefaultCard.from_code(code))
+
+        if since is None or self.beaten is not since.beaten:
+            self.sync_tree(since)
+
+
+class History:
+    """Unlimited undo/redo over GameStates; each entry only holds what its action changed."""
+    def __init__(self, state: GameState):
+        self._states = [state]
+        self._position = 0
+
+    @property
+    def state(self) -> GameState:
+        return self._states[self._position]
+
+    def push(self, state: GameState) -> GameState:
+        del self._states[self._position + 1:]
+        self._states.append(state)
+        self._position += 1
+        return state
+
+    def undo(self) -> GameState:
+        if self._position:
+            self._position -= 1
+        return self.state
+
+    def redo(self) -> GameState:
+        if self._position + 1 < len(self._states):
+            self._position += 1
+        return self.state
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+
+def cards(codes: Iterable[int]) -> List[DefaultCard]:
+    return [DefaultCard.from_code(code) for code in codes]
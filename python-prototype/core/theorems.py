@@ -0,0 +1,403 @@
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ----------------------------
+# Theorem graph
+# ----------------------------
+# The history graph: theorems are nodes and problems are the edges between
+# them. A problem needs all of its prerequisite theorems (usually one, so it
+# really is an edge; several make it a hyperedge, which is how prerequisites
+# are shared) and proves one target theorem. A theorem is unlocked as soon as
+# any problem proving it is solved, so each of its proofs is another route to
+# it. The dual graph maps theorems to the problems they trivialize: once
+# trivialized, a problem costs nothing and is solved by itself the moment its
+# prerequisites are unlocked.
+#
+# Everything is stored in CSR arrays, as for flat trees (see core/treegen.py):
+# row r of a relation is values[offsets[r]:offsets[r+1]]. The graph keeps
+#   requires      problem -> prerequisite theorems
+#   required_by   theorem -> problems that need it (the transpose)
+#   proven_by     theorem -> problems that prove it
+#   trivializes   theorem -> problems it trivializes
+# as int32 arrays, so a graph with millions of theorems and problems takes a
+# few bytes per edge and no Python objects per node.
+#
+# The graph itself never changes; a TheoremProgress holds what is unlocked
+# and solved. It keeps, per problem, the number of prerequisites still
+# locked, so solving a problem only visits the theorems it unlocks, the
+# problems that need those, and so on down the cascade, one vectorised wave
+# at a time.
+
+INDEX_DTYPE = np.int32
+COST_DTYPE = np.int64
+
+
+def _csr(rows: np.ndarray, values: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Groups `values` by `rows` (a stable sort, so each row keeps its order) into CSR offsets and values."""
+    order = np.argsort(rows, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=offsets[1:])
+    return offsets, values[order].astype(INDEX_DTYPE, copy=False)
+
+
+def _gather(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """The concatenated CSR rows `rows`, without a Python loop over them."""
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return values[:0]
+    ends = np.cumsum(counts)
+    return values[np.arange(total) + np.repeat(starts - (ends - counts), counts)]
+
+
+def _tally(index: np.ndarray, size: int, weights: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The distinct values of `index` (all below `size`), sorted, with how often
+    each occurs, or with the sum of their `weights`. Waves touching a good
+    part of the graph are counted with one bincount over the whole range,
+    which beats sorting them; small ones are sorted.
+    """
+    if len(index) * 8 > size:
+        counts = np.bincount(index, minlength=size)
+        touched = np.flatnonzero(counts)
+        if weights is not None:
+            return touched, np.bincount(index, weights, minlength=size)[touched].astype(COST_DTYPE)
+        return touched.astype(INDEX_DTYPE), counts[touched].astype(INDEX_DTYPE)
+    order = np.argsort(index, kind="stable")
+    ordered = index[order]
+    starts = np.flatnonzero(np.concatenate(([True], ordered[1:] != ordered[:-1]))) if len(index) else order
+    if weights is not None:
+        return ordered[starts], np.add.reduceat(weights[order], starts) if len(index) else weights[:0]
+    return ordered[starts], np.diff(np.append(starts, len(index))).astype(INDEX_DTYPE)
+
+
+class TheoremGraph:
+    """
+    An immutable theorem/problem graph. Problem p proves theorem targets[p],
+    needs the theorems in requires(p) and costs costs[p] to solve (e.g. the
+    cards or turns it takes). Build one with from_problems().
+    """
+    def __init__(self, theorem_count: int, targets: np.ndarray, costs: np.ndarray,
+                 require_offsets: np.ndarray, require_theorems: np.ndarray,
+                 trivialize_offsets: np.ndarray, trivialize_problems: np.ndarray):
+        self.theorem_count = theorem_count
+        self.targets = targets
+        self.costs = costs
+        self.require_offsets = require_offsets
+        self.require_theorems = require_theorems
+        self.trivialize_offsets = trivialize_offsets
+        self.trivialize_problems = trivialize_problems
+
+        # Transposes, derived rather than stored.
+        problems = np.arange(self.problem_count, dtype=INDEX_DTYPE)
+        edge_problems = np.repeat(problems, np.diff(require_offsets))
+        self.required_by_offsets, self.required_by_problems = _csr(require_theorems, edge_problems, theorem_count)
+        self.proven_by_offsets, self.proven_by_problems = _csr(targets, problems, theorem_count)
+
+    @classmethod
+    def from_problems(cls, theorem_count: int, targets: Sequence[int], requires: Sequence[Sequence[int]],
+                      costs: Optional[Sequence[int]] = None,
+                      trivializes: Iterable[Tuple[int, int]] = ()) -> 'TheoremGraph':
+        """
+        Builds a graph from per-problem lists: problem p proves targets[p] and
+        needs requires[p]. `trivializes` holds (theorem, problem) pairs of the
+        dual graph. For very large graphs build the CSR arrays directly.
+        """
+        targets = np.asarray(targets, dtype=INDEX_DTYPE)
+        if len(requires) != len(targets):
+            raise ValueError(f"{len(targets)} targets but {len(requires)} prerequisite lists")
+        require_offsets = np.zeros(len(targets) + 1, dtype=np.int64)
+        np.cumsum([len(theorems) for theorems in requires], out=require_offsets[1:])
+        require_theorems = np.fromiter((t for theorems in requires for t in theorems), dtype=INDEX_DTYPE,
+                                       count=int(require_offsets[-1]))
+        costs = np.ones(len(targets), dtype=COST_DTYPE) if costs is None else np.asarray(costs, dtype=COST_DTYPE)
+        pairs = np.array(list(trivializes), dtype=INDEX_DTYPE).reshape(-1, 2)
+        trivialize_offsets, trivialize_problems = _csr(pairs[:, 0], pairs[:, 1], theorem_count)
+        return cls.from_arrays(theorem_count, targets, costs, require_offsets, require_theorems,
+                               trivialize_offsets, trivialize_problems)
+
+    @classmethod
+    def from_arrays(cls, theorem_count: int, targets: np.ndarray, costs: np.ndarray,
+                    require_offsets: np.ndarray, require_theorems: np.ndarray,
+                    trivialize_offsets: Optional[np.ndarray] = None,
+                    trivialize_problems: Optional[np.ndarray] = None) -> 'TheoremGraph':
+        """Builds a graph from CSR arrays, checking that every index is in range."""
+        targets = np.asarray(targets, dtype=INDEX_DTYPE)
+        costs = np.asarray(costs, dtype=COST_DTYPE)
+        require_offsets = np.asarray(require_offsets, dtype=np.int64)
+        require_theorems = np.asarray(require_theorems, dtype=INDEX_DTYPE)
+        if trivialize_offsets is None:
+            trivialize_offsets = np.zeros(theorem_count + 1, dtype=np.int64)
+            trivialize_problems = np.zeros(0, dtype=INDEX_DTYPE)
+        trivialize_offsets = np.asarray(trivialize_offsets, dtype=np.int64)
+        trivialize_problems = np.asarray(trivialize_problems, dtype=INDEX_DTYPE)
+
+        problem_count = len(targets)
+        if len(costs) != problem_count or len(require_offsets) != problem_count + 1:
+            raise ValueError("targets, costs and require_offsets disagree on the number of problems")
+        if len(trivialize_offsets) != theorem_count + 1:
+            raise ValueError("trivialize_offsets must have one entry per theorem plus one")
+        for name, values, bound in (("target", targets, theorem_count),
+                                    ("prerequisite", require_theorems, theorem_count),
+                                    ("trivialized problem", trivialize_problems, problem_count)):
+            if len(values) and (values.min() < 0 or values.max() >= bound):
+                raise ValueError(f"{name} index out of range 0..{bound - 1}")
+        if len(costs) and costs.min() < 0:
+            raise ValueError("problem costs must not be negative")
+        return cls(theorem_count, targets, costs, require_offsets, require_theorems,
+                   trivialize_offsets, trivialize_problems)
+
+    @property
+    def problem_count(self) -> int:
+        return len(self.targets)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (
+            self.targets, self.costs, self.require_offsets, self.require_theorems,
+            self.trivialize_offsets, self.trivialize_problems, self.required_by_offsets,
+            self.required_by_problems, self.proven_by_offsets, self.proven_by_problems))
+
+    def requires(self, problem: int) -> np.ndarray:
+        return self.require_theorems[self.require_offsets[problem]:self.require_offsets[problem + 1]]
+
+    def required_by(self, theorem: int) -> np.ndarray:
+        return self.required_by_problems[self.required_by_offsets[theorem]:self.required_by_offsets[theorem + 1]]
+
+    def proven_by(self, theorem: int) -> np.ndarray:
+        return self.proven_by_problems[self.proven_by_offsets[theorem]:self.proven_by_offsets[theorem + 1]]
+
+    def trivializes(self, theorem: int) -> np.ndarray:
+        return self.trivialize_problems[self.trivialize_offsets[theorem]:self.trivialize_offsets[theorem + 1]]
+
+    def save(self, path: str) -> None:
+        np.savez(path, theorem_count=self.theorem_count, targets=self.targets, costs=self.costs,
+                 require_offsets=self.require_offsets, require_theorems=self.require_theorems,
+                 trivialize_offsets=self.trivialize_offsets, trivialize_problems=self.trivialize_problems)
+
+    @classmethod
+    def load(cls, path: str) -> 'TheoremGraph':
+        with np.load(path) as data:
+            return cls.from_arrays(int(data["theorem_count"]), data["targets"], data["costs"],
+                                   data["require_offsets"], data["require_theorems"],
+                                   data["trivialize_offsets"], data["trivialize_problems"])
+
+
+class Unlocks:
+    """What one solve() set off, in the order the cascade reached it."""
+    def __init__(self, theorems: np.ndarray, available: np.ndarray, solved: np.ndarray):
+        self.theorems = theorems    # newly unlocked theorems
+        self.available = available  # problems whose last locked prerequisite was unlocked
+        self.solved = solved        # trivialized problems that solved themselves on the way
+
+    def __bool__(self) -> bool:
+        return bool(len(self.theorems))
+
+    def __repr__(self):
+        return (f"Unlocks({len(self.theorems)} theorems, {len(self.available)} problems available, "
+                f"{len(self.solved)} solved for free)")
+
+
+class Route:
+    """
+    The problems to solve, in a valid order, to unlock `theorem`, and what
+    they cost together (each problem counted once). `cost` is None and
+    `problems` empty when the theorem cannot be reached.
+    """
+    def __init__(self, theorem: int, cost: Optional[int], problems: List[int]):
+        self.theorem = theorem
+        self.cost = cost
+        self.problems = problems
+
+    def __repr__(self):
+        return f"Route(theorem={self.theorem}, cost={self.cost}, problems={self.problems})"
+
+
+class TheoremProgress:
+    """
+    What has been unlocked and solved in a TheoremGraph. `unlocked` starts
+    as the given axioms; trivialized problems whose prerequisites are
+    already met are solved straight away.
+    """
+    def __init__(self, graph: TheoremGraph, axioms: Iterable[int] = ()):
+        self.graph = graph
+        self.unlocked = np.zeros(graph.theorem_count, dtype=bool)
+        self.solved = np.zeros(graph.problem_count, dtype=bool)
+        self.trivial = np.zeros(graph.problem_count, dtype=bool)
+        axioms = np.unique(np.fromiter(axioms, dtype=INDEX_DTYPE))
+        self.unlocked[axioms] = True
+        self.trivial[_gather(graph.trivialize_offsets, graph.trivialize_problems, axioms)] = True
+
+        # Locked prerequisites per problem; a problem is available at zero.
+        edge_problems = np.repeat(np.arange(graph.problem_count, dtype=INDEX_DTYPE), np.diff(graph.require_offsets))
+        self.missing = np.bincount(edge_problems[~self.unlocked[graph.require_theorems]],
+                                   minlength=graph.problem_count).astype(INDEX_DTYPE)
+        free = np.flatnonzero(self.trivial & (self.missing == 0))
+        self._cascade(self._solve_all(free), [], [], [free])
+
+    def is_available(self, problem: int) -> bool:
+        return not self.solved[problem] and self.missing[problem] == 0
+
+    def available(self) -> np.ndarray:
+        """Every problem that can be attempted now."""
+        return np.flatnonzero((self.missing == 0) & ~self.solved)
+
+    def cost(self, problem: int) -> int:
+        return 0 if self.trivial[problem] else int(self.graph.costs[problem])
+
+    def solve(self, problem: int) -> Unlocks:
+        """Marks an available problem solved and propagates everything it unlocks."""
+        if self.solved[problem]:
+            raise ValueError(f"problem {problem} is already solved")
+        if self.missing[problem]:
+            raise ValueError(f"problem {problem} still needs {self.missing[problem]} locked theorem(s)")
+        self.solved[problem] = True
+        target = self.graph.targets[problem]
+        theorems = np.zeros(0, dtype=INDEX_DTYPE) if self.unlocked[target] else np.array([target], dtype=INDEX_DTYPE)
+        return self._cascade(theorems, [], [], [])
+
+    def unlock(self, theorems: Iterable[int]) -> Unlocks:
+        """Unlocks theorems directly (e.g. ones kept through a prestige) and propagates."""
+        theorems = np.unique(np.fromiter(theorems, dtype=INDEX_DTYPE))
+        return self._cascade(theorems[~self.unlocked[theorems]], [], [], [])
+
+    def _solve_all(self, problems: np.ndarray) -> np.ndarray:
+        """Marks `problems` solved; returns the theorems they newly prove."""
+        self.solved[problems] = True
+        targets, _ = _tally(self.graph.targets[problems], self.graph.theorem_count)
+        return targets[~self.unlocked[targets]]
+
+    def _cascade(self, theorems: np.ndarray, unlocked: list, available: list, solved: list) -> Unlocks:
+        graph = self.graph
+        while len(theorems):
+            self.unlocked[theorems] = True
+            unlocked.append(theorems)
+
+            trivialized = _gather(graph.trivialize_offsets, graph.trivialize_problems, theorems)
+            self.trivial[trivialized] = True
+
+            users, counts = _tally(_gather(graph.required_by_offsets, graph.required_by_problems, theorems),
+                                   graph.problem_count)
+            self.missing[users] -= counts
+            opened = users[self.missing[users] == 0]
+            available.append(opened)
+
+            # Trivial problems solve themselves when they open, or when they
+            # become trivial while already open.
+            candidates = np.concatenate((opened, trivialized))
+            free, _ = _tally(candidates[self.trivial[candidates] & (self.missing[candidates] == 0)
+                                         & ~self.solved[candidates]], graph.problem_count)
+            solved.append(free)
+            theorems = self._solve_all(free)
+
+        empty = np.zeros(0, dtype=INDEX_DTYPE)
+        join = lambda parts: np.concatenate(parts) if parts else empty
+        return Unlocks(join(unlocked), join(available), join(solved))
+
+    # Queries
+
+    def reachable(self) -> np.ndarray:
+        """A mask of the theorems that solving every problem from here would unlock, including those unlocked now."""
+        graph = self.graph
+        reached = self.unlocked.copy()
+        missing = self.missing.copy()
+        open_problems = np.flatnonzero((missing == 0) & ~self.solved)
+        while len(open_problems):
+            theorems, _ = _tally(graph.targets[open_problems], graph.theorem_count)
+            theorems = theorems[~reached[theorems]]
+            reached[theorems] = True
+            users, counts = _tally(_gather(graph.required_by_offsets, graph.required_by_problems, theorems),
+                                   graph.problem_count)
+            missing[users] -= counts
+            open_problems = users[missing[users] == 0]
+        return reached
+
+    def can_reach(self, theorem: int) -> bool:
+        return bool(self.reachable()[theorem])
+
+    def cheapest_route(self, theorem: int) -> Route:
+        """
+        The cheapest way found to unlock `theorem` from here.
+
+        Theorem costs follow Knuth's generalisation of Dijkstra to AND/OR
+        graphs: an unlocked theorem costs 0, a problem costs its own cost
+        plus its prerequisites', and a theorem costs its cheapest proof.
+        Costs are integers, so theorems are settled a whole cost level at a
+        time, each level one vectorised wave, and the search stops at
+        `theorem`: only the part of the graph cheaper than the answer is
+        visited. A prerequisite shared by several parts of the route is
+        paid for in each of them while searching, but only once in the
+        returned cost, so routes through shared theorems may cost less than
+        the search estimated; finding the true optimum there is NP-hard.
+        """
+        graph = self.graph
+        if self.unlocked[theorem]:
+            return Route(theorem, 0, [])
+        via = self._route_costs(theorem)
+        if via[theorem] < 0:
+            return Route(theorem, None, [])
+
+        # Walk the chosen proofs back from the target, prerequisites first.
+        problems: List[int] = []
+        done = set()
+        stack = [(int(via[theorem]), False)]
+        while stack:
+            problem, expanded = stack.pop()
+            if expanded:
+                problems.append(problem)
+                continue
+            if problem in done:
+                continue
+            done.add(problem)
+            stack.append((problem, True))
+            for prerequisite in graph.requires(problem).tolist():
+                if not self.unlocked[prerequisite] and via[prerequisite] not in done:
+                    stack.append((int(via[prerequisite]), False))
+        return Route(theorem, sum(self.cost(problem) for problem in problems), problems)
+
+    def _route_costs(self, goal: int) -> np.ndarray:
+        """The proof chosen for each theorem settled up to `goal` (-1 elsewhere)."""
+        graph = self.graph
+        costs = np.where(self.trivial, 0, graph.costs)
+        best = np.full(graph.theorem_count, np.iinfo(COST_DTYPE).max, dtype=COST_DTYPE)
+        via = np.full(graph.theorem_count, -1, dtype=INDEX_DTYPE)
+        settled = self.unlocked.copy()
+        # Per problem: prerequisites still unsettled and the cost of the settled ones.
+        left = self.missing.copy()
+        paid = np.zeros(graph.problem_count, dtype=COST_DTYPE)
+
+        def relax(problems: np.ndarray) -> np.ndarray:
+            """Offers complete problems as proofs of their targets; returns the targets that improved."""
+            targets = graph.targets[problems]
+            keep = ~settled[targets]
+            problems, targets = problems[keep], targets[keep]
+            totals = paid[problems] + costs[problems]
+            order = np.lexsort((totals, targets))
+            targets, first = np.unique(targets[order], return_index=True)
+            problems, totals = problems[order][first], totals[order][first]
+            better = totals < best[targets]
+            best[targets[better]] = totals[better]
+            via[targets[better]] = problems[better]
+            return targets[better]
+
+        # Open problems wait for nothing, so their targets are the first candidates.
+        pending = relax(np.flatnonzero((self.missing == 0) & ~self.solved))
+        while len(pending):
+            level = best[pending].min()
+            frontier, _ = _tally(pending[best[pending] == level], graph.theorem_count)
+            settled[frontier] = True
+            if settled[goal]:
+                break
+            counts = graph.required_by_offsets[frontier + 1] - graph.required_by_offsets[frontier]
+            users = _gather(graph.required_by_offsets, graph.required_by_problems, frontier)
+            live = ~self.solved[users]
+            users = users[live]
+            touched, amounts = _tally(users, graph.problem_count, np.repeat(best[frontier], counts)[live])
+            paid[touched] += amounts
+            users, counts = _tally(users, graph.problem_count)
+            left[users] -= counts
+            improved = relax(users[left[users] == 0])
+            pending = np.concatenate((pending[~settled[pending]], improved))
+        return via
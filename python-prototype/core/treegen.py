@@ -0,0 +1,213 @@
+from typing import Dict, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .card import DefaultCard, COLOR_NAMES, NUMBER_SHIFT, NUMBER_MASK
+from .gamezone import ProblemNode, ProblemZone
+
+# ----------------------------
+# Seeded, vectorised problem tree generation
+# ----------------------------
+# Trees are grown level by level for a whole batch at once: one vector of
+# child counts per level, then one draw each for every node's color and number.
+# Nothing recurses and the only per-node Python work is turning a flat tree
+# into ProblemNodes, which is left to callers that need them.
+#
+# Flat trees use the compiled pack layout (see core/loader.py): nodes in BFS
+# order, packed card codes, loot, and CSR offsets where node i's children are
+# nodes offsets[i]..offsets[i+1]-1.
+
+DEFAULT_COLORS = ("red", "blue", "green", "yellow")
+
+ColorMix = Union[Sequence[str], Dict[str, float]]
+
+
+class TreeSpec:
+    """
+    Shape and content constraints for generated trees. `depth` counts levels
+    (the root is level 1), every node below the last level gets between
+    `min_children` and `max_children` children, and `min_depth` guarantees at
+    least one path of that many levels. `colors` is a list of color names drawn
+    uniformly, or a {name: weight} dict.
+    """
+    def __init__(self,
+                 depth: int = 3,
+                 max_children: int = 2,
+                 min_children: int = 0,
+                 min_depth: int = 1,
+                 colors: ColorMix = DEFAULT_COLORS,
+                 numbers: Tuple[int, int] = (1, 5),
+                 loot: int = 0):
+        if depth < 1 or not 1 <= min_depth <= depth:
+            raise ValueError(f"need 1 <= min_depth <= depth, got min_depth={min_depth}, depth={depth}")
+        if not 0 <= min_children <= max_children:
+            raise ValueError(f"need 0 <= min_children <= max_children, got {min_children}..{max_children}")
+        if min_depth > 1 and max_children < 1:
+            raise ValueError("min_depth > 1 needs max_children >= 1")
+        low, high = numbers
+        if not 0 <= low <= high < NUMBER_MASK:
+            raise ValueError(f"card numbers must be within 0..{NUMBER_MASK - 1}, got {numbers}")
+        names, weights = (list(colors), list(colors.values())) if isinstance(colors, dict) else (list(colors), None)
+        for name in names:
+            if name not in COLOR_NAMES[1:]:
+                raise ValueError(f"unknown color {name!r}")
+        self.depth = depth
+        self.max_children = max_children
+        self.min_children = min_children
+        self.min_depth = min_depth
+        self.colors = names
+        self.color_weights = None if weights is None else np.asarray(weights, dtype=float) / sum(weights)
+        self.numbers = (low, high)
+        self.loot = loot
+
+
+class FlatTree:
+    """One generated tree as flat arrays (codes, loot, offsets)."""
+    def __init__(self, codes: np.ndarray, loot: np.ndarray, offsets: np.ndarray):
+        self.codes = codes
+        self.loot = loot
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def to_tree(self) -> Optional[ProblemNode]:
+        """Builds ProblemNodes bottom-up (children always follow parents in BFS order)."""
+        if not len(self.codes):
+            return None
+        codes, loot, offsets = self.codes.tolist(), self.loot.tolist(), self.offsets.tolist()
+        nodes = [None] * len(codes)
+        for index in range(len(codes) - 1, -1, -1):
+            children = nodes[offsets[index]:offsets[index + 1]]
+            nodes[index] = ProblemNode(DefaultCard.from_code(codes[index]), children, loot=loot[index])
+        return nodes[0]
+
+    def to_zone(self) -> ProblemZone:
+        zone = ProblemZone()
+        zone.root = self.to_tree()
+        return zone
+
+    def save(self, path: str) -> None:
+        """Writes the tree as a compiled pack that load_problem_tree can read."""
+        from .loader import KIND_TREE, _write_pack
+        _write_pack(path, KIND_TREE, self.codes.tolist(), self.loot.tolist(), self.offsets.tolist())
+
+
+class TreeBatch:
+    """
+    Many flat trees stored back to back. Tree t owns nodes
+    node_starts[t]..node_starts[t+1]-1; `child_starts` holds each node's first
+    child as an index local to its own tree.
+    """
+    def __init__(self, codes: np.ndarray, loot: np.ndarray, child_starts: np.ndarray, node_starts: np.ndarray):
+        self.codes = codes
+        self.loot = loot
+        self.child_starts = child_starts
+        self.node_starts = node_starts
+
+    def __len__(self) -> int:
+        return len(self.node_starts) - 1
+
+    def __iter__(self) -> Iterator[FlatTree]:
+        for index in range(len(self)):
+            yield self.tree(index)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.codes)
+
+    def tree(self, index: int) -> FlatTree:
+        start, end = int(self.node_starts[index]), int(self.node_starts[index + 1])
+        offsets = np.empty(end - start + 1, dtype=np.uint32)
+        offsets[:-1] = self.child_starts[start:end]
+        offsets[-1] = end - start
+        return FlatTree(self.codes[start:end], self.loot[start:end], offsets)
+
+    def save(self, path: str) -> None:
+        np.savez(path, codes=self.codes, loot=self.loot, child_starts=self.child_starts, node_starts=self.node_starts)
+
+    @classmethod
+    def load(cls, path: str) -> 'TreeBatch':
+        with np.load(path) as data:
+            return cls(data["codes"], data["loot"], data["child_starts"], data["node_starts"])
+
+
+def generate_batch(spec: TreeSpec, count: int, seed: int) -> TreeBatch:
+    """Generates `count` trees; the batch is fully determined by (spec, count, seed)."""
+    rng = np.random.default_rng(seed)
+
+    # Grow the shapes level by level. Within a level nodes are grouped by tree
+    # and each node's children come out in order, so a stable sort by tree id
+    # later leaves every tree's nodes in BFS order.
+    level_trees = np.arange(count, dtype=np.int64)
+    trees, counts = [], []
+    for level in range(1, spec.depth + 1):
+        if level == spec.depth:
+            level_counts = np.zeros(len(level_trees), dtype=np.int64)
+        else:
+            level_counts = rng.integers(spec.min_children, spec.max_children + 1, size=len(level_trees))
+            if level < spec.min_depth:
+                # Each tree's first node on this level keeps the guaranteed path going.
+                first = np.ones(len(level_trees), dtype=bool)
+                first[1:] = level_trees[1:] != level_trees[:-1]
+                level_counts[first] = np.maximum(level_counts[first], 1)
+        trees.append(level_trees)
+        counts.append(level_counts)
+        level_trees = np.repeat(level_trees, level_counts)
+        if not len(level_trees):
+            break
+
+    tree_ids = np.concatenate(trees)
+    order = np.argsort(tree_ids, kind="stable")
+    tree_ids = tree_ids[order]
+    child_counts = np.concatenate(counts)[order]
+    total = len(tree_ids)
+
+    node_starts = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tree_ids, minlength=count), out=node_starts[1:])
+    # BFS CSR: a node's children start one past the root plus every earlier sibling's children.
+    before = np.zeros(total + 1, dtype=np.int64)
+    np.cumsum(child_counts, out=before[1:])
+    child_starts = (1 + before[:-1] - before[node_starts[tree_ids]]).astype(np.uint32)
+
+    color_codes = np.array([COLOR_NAMES.index(name) for name in spec.colors], dtype=np.uint32)
+    colors = color_codes[rng.choice(len(color_codes), size=total, p=spec.color_weights)]
+    low, high = spec.numbers
+    numbers = rng.integers(low, high + 1, size=total).astype(np.uint32)
+    codes = colors | ((numbers + 1) << NUMBER_SHIFT)
+    loot = np.full(total, spec.loot, dtype=np.int32)
+    return TreeBatch(codes, loot, child_starts, node_starts)
+
+
+def generate_flat_tree(spec: TreeSpec, seed: int) -> FlatTree:
+    return generate_batch(spec, 1, seed).tree(0)
+
+
+def generate_tree(spec: TreeSpec, seed: int) -> ProblemZone:
+    """A single reproducible puzzle, e.g. seeded by the day number."""
+    return generate_flat_tree(spec, seed).to_zone()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Pre-generate a batch of problem trees.")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--min-depth", type=int, default=1)
+    parser.add_argument("--max-children", type=int, default=3)
+    parser.add_argument("--min-children", type=int, default=0)
+    parser.add_argument("--out", default=None, help="write the batch to this .npz file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    batch = generate_batch(TreeSpec(depth=args.depth, min_depth=args.min_depth, max_children=args.max_children,
+                                    min_children=args.min_children),
+                           args.count, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{len(batch)} trees, {batch.node_count} nodes in {elapsed:.2f}s")
+    if args.out:
+        batch.save(args.out)
+        print(f"wrote {args.out}")
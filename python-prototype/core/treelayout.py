@@ -0,0 +1,166 @@
+import math
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .gamezone import ProblemNode, ProblemZone
+from .profiler import instrumented
+
+# ----------------------------
+# Problem tree layout
+# ----------------------------
+# The tree is drawn as an indented outline: one node per row in pre-order,
+# indented by depth. Rather than storing every node's row (which shifts for
+# everything below an insertion), the layout keeps each node's subtree size
+# and depth. Finding the node at a given row then costs O(depth * branching),
+# and add_child only updates sizes along the path to the root.
+
+ROW_HEIGHT = 25
+INDENT = 20
+
+
+class Viewport:
+    """A scrollable, zoomable window onto the laid-out tree, in layout pixels."""
+    ZOOM_STEPS = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.scroll_x = 0.0
+        self.scroll_y = 0.0
+        self._zoom_index = self.ZOOM_STEPS.index(1.0)
+
+    @property
+    def zoom(self) -> float:
+        return self.ZOOM_STEPS[self._zoom_index]
+
+    def scroll(self, dx: float, dy: float, content_height: Optional[float] = None) -> None:
+        self.scroll_x = max(0.0, self.scroll_x + dx)
+        self.scroll_y = max(0.0, self.scroll_y + dy)
+        if content_height is not None:
+            self.scroll_y = min(self.scroll_y, max(0.0, content_height * self.zoom - self.height))
+
+    def zoom_by(self, steps: int) -> None:
+        """Changes zoom by whole steps, keeping the top-left layout point in place."""
+        old = self.zoom
+        self._zoom_index = min(max(self._zoom_index + steps, 0), len(self.ZOOM_STEPS) - 1)
+        self.scroll_x *= self.zoom / old
+        self.scroll_y *= self.zoom / old
+
+    def reset(self) -> None:
+        self.scroll_x = self.scroll_y = 0.0
+        self._zoom_index = self.ZOOM_STEPS.index(1.0)
+
+
+class TreeLayout:
+    def __init__(self, zone: ProblemZone):
+        self.zone = zone
+        self._size: Dict[int, int] = {}
+        self._depth: Dict[int, int] = {}
+        zone.observers.append(self)
+        self.tree_reset(zone)
+
+    # ProblemZone observer hooks
+
+    def tree_reset(self, zone: ProblemZone) -> None:
+        self._size = {}
+        self._depth = {}
+        if zone.root is not None:
+            self._measure(zone.root, 0)
+
+    def child_added(self, parent: ProblemNode, child: ProblemNode) -> None:
+        self._measure(child, self._depth[parent.id] + 1)
+        added = self._size[child.id]
+        node = parent
+        while node is not None:
+            self._size[node.id] += added
+            node = node.parent
+
+    def node_beaten(self, node: ProblemNode) -> None:
+        pass  # the layout does not depend on what is beaten
+
+    def node_unbeaten(self, node: ProblemNode) -> None:
+        pass
+
+    @instrumented()
+    def _measure(self, top: ProblemNode, depth: int) -> None:
+        # Iterative post-order so deep trees do not hit the recursion limit.
+        stack = [(top, depth, False)]
+        while stack:
+            node, node_depth, children_done = stack.pop()
+            if children_done:
+                self._size[node.id] = 1 + sum(self._size[child.id] for child in node.children)
+                continue
+            self._depth[node.id] = node_depth
+            stack.append((node, node_depth, True))
+            stack.extend((child, node_depth + 1, False) for child in node.children)
+
+    # Queries
+
+    @property
+    def row_count(self) -> int:
+        root = self.zone.root
+        return self._size[root.id] if root is not None else 0
+
+    @property
+    def content_height(self) -> int:
+        return self.row_count * ROW_HEIGHT
+
+    def depth(self, node: ProblemNode) -> int:
+        return self._depth[node.id]
+
+    def row_of(self, node: ProblemNode) -> int:
+        row = 0
+        while node.parent is not None:
+            parent = node.parent
+            row += 1
+            for sibling in parent.children:
+                if sibling is node:
+                    break
+                row += self._size[sibling.id]
+            node = parent
+        return row
+
+    @instrumented()
+    def rows(self, first: int, count: int) -> Iterator[Tuple[int, int, ProblemNode]]:
+        """Yields (row, depth, node) for up to `count` rows starting at `first`, in pre-order."""
+        root = self.zone.root
+        if root is None or count <= 0 or first >= self.row_count:
+            return
+        first = max(first, 0)
+        # Descend to the node at row `first`, remembering the siblings still to visit.
+        pending: List[list] = []
+        node, depth, remaining = root, 0, first
+        while remaining:
+            remaining -= 1
+            index = 0
+            while self._size[node.children[index].id] <= remaining:
+                remaining -= self._size[node.children[index].id]
+                index += 1
+            pending.append([node.children, index + 1, depth + 1])
+            node, depth = node.children[index], depth + 1
+
+        yield first, depth, node
+        row = first + 1
+        pending.append([node.children, 0, depth + 1])
+        while pending and row < first + count:
+            frame = pending[-1]
+            siblings, index, child_depth = frame
+            if index >= len(siblings):
+                pending.pop()
+                continue
+            frame[1] = index + 1
+            child = siblings[index]
+            yield row, child_depth, child
+            row += 1
+            pending.append([child.children, 0, child_depth + 1])
+
+    def visible(self, viewport: Viewport) -> Iterator[Tuple[float, float, ProblemNode]]:
+        """Yields (x, y, node) in viewport pixels for the nodes inside the viewport only."""
+        row_height = ROW_HEIGHT * viewport.zoom
+        indent = INDENT * viewport.zoom
+        first = int(viewport.scroll_y // row_height)
+        count = math.ceil(viewport.height / row_height) + 1
+        for row, depth, node in self.rows(first, count):
+            x = depth * indent - viewport.scroll_x
+            if x >= viewport.width:
+                continue
+            yield x, row * row_height - viewport.scroll_y, node
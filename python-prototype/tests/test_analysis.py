@@ -0,0 +1,54 @@
+import queue
+import random
+
+import pytest
+
+from core.analysis import Analysis, AnalysisService, Snapshot
+from core.card import DefaultCard
+from core.simulation import standard_deck
+from core.treegen import TreeSpec, generate_tree
+
+
+def shape(node):
+    return node.card.code, node.loot, node.beaten, [shape(child) for child in node.children]
+
+
+def test_snapshot_rebuilds_the_tree():
+    zone = generate_tree(TreeSpec(depth=4, max_children=3, loot=2), 1)
+    exposed = zone.get_exposed_nodes()
+    zone.beat_node(exposed[0].id)
+    assert shape(Snapshot(zone, []).tree().root) == shape(zone.root)
+
+
+def test_describe():
+    red_two, memory_blue = (False, (DefaultCard(None, 2),)), (True, (DefaultCard("blue", 4),))
+    assert Analysis(1, 3, True, [red_two, memory_blue], 1, 0.0, True).describe() == \
+        "Compass: 3 turns to solve (closer) | Hint: 2, memory blue 4"
+    assert Analysis(1, 1, True, None, 0, 0.0, True).describe() == "Compass: 1 turn to solve (no closer)"
+    assert Analysis(1, None, None, None, None, 0.0, False).describe() == "Compass: out of budget"
+    assert Analysis(1, None, False, None, None, 0.0, True).describe() == "Compass: no solution from here"
+
+
+@pytest.mark.parametrize("processes", [False, True], ids=["thread", "process"])
+def test_only_the_newest_position_is_reported(processes):
+    # Submits positions faster than they can be solved.
+    results = queue.Queue()
+    service = AnalysisService(results.put, processes=processes)
+    try:
+        rng = random.Random(0)
+        deck = [DefaultCard(color, number) for color, number in standard_deck()]
+        last = 0
+        for seed in range(10):
+            rng.shuffle(deck)
+            last = service.submit(Snapshot(generate_tree(TreeSpec(depth=4, max_children=2, min_depth=3), seed),
+                                           deck[:5], deck[5:]))
+        reported = [results.get(timeout=30)]
+        while reported[-1].generation != last:
+            reported.append(results.get(timeout=30))
+        generations = [analysis.generation for analysis in reported]
+        assert generations == sorted(set(generations)) and len(reported) < last
+        analysis = reported[-1]
+        assert analysis.complete and analysis.solvable and analysis.turns >= 1
+        assert analysis.describe().startswith(f"Compass: {analysis.turns} turn")
+    finally:
+        service.close()
@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+import core.gamezone
+from core.card import DefaultCard
+from core.gamezone import ProblemNode, ProblemZone
+
+COLORS = ["red", "blue"]
+
+
+def first_exposed(zone, color, number):
+    """The first matching exposed node in pre-order, by walking the tree."""
+    stack = [zone.root]
+    while stack:
+        node = stack.pop()
+        if node.is_exposed() and (node.color, node.number) == (color, number):
+            return node
+        stack.extend(reversed(node.children))
+    return None
+
+
+def random_card(rng):
+    return DefaultCard(rng.choice(COLORS), rng.randint(1, 2))
+
+
+def grow_and_check(seed):
+    rng = random.Random(seed)
+    zone = ProblemZone()
+    zone.root = ProblemNode(random_card(rng), [ProblemNode(random_card(rng)) for _ in range(3)])
+    for _ in range(300):
+        nodes = list(zone.iter_nodes())
+        if rng.random() < 0.7:
+            parent = rng.choice(nodes)
+            child = ProblemNode(random_card(rng), [ProblemNode(random_card(rng))
+                                                   for _ in range(rng.randint(0, 2))])
+            parent.add_child(child)
+        else:
+            exposed = zone.get_exposed_nodes()
+            if exposed:
+                zone.beat_node(rng.choice(exposed).id)
+        for color in COLORS:
+            for number in (1, 2):
+                assert zone.find_exposed(color, number) is first_exposed(zone, color, number)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_find_exposed_keeps_tree_order_as_children_are_added(seed):
+    grow_and_check(seed)
+
+
+def test_find_exposed_keeps_tree_order_when_gaps_run_out(monkeypatch):
+    # Tiny gaps, so additions between two nodes soon have to renumber.
+    monkeypatch.setattr(core.gamezone, "_GAP", 4)
+    monkeypatch.setattr(core.gamezone, "_STEP", 2)
+    for seed in range(3):
+        grow_and_check(seed)
+
+
+class CountingNode(ProblemNode):
+    """Records every node whose attributes are read or written."""
+    touched = set()
+
+    def __getattribute__(self, name):
+        CountingNode.touched.add(id(self))
+        return object.__getattribute__(self, name)
+
+
+def test_add_child_and_beat_node_touch_only_a_path_through_the_tree():
+    # A comb: a spine `depth` nodes deep, every spine node with `width` leaves
+    # after its spine child, so each spine node has a node after its subtree.
+    depth, width = 60, 30
+    spine = []
+    for _ in range(depth):
+        below = spine[-1:]
+        spine.append(CountingNode(DefaultCard("red", 1),
+                                  below + [CountingNode(DefaultCard("blue", 2)) for _ in range(width)]))
+    spine.reverse()
+    zone = ProblemZone()
+    zone.root = spine[0]
+    size = sum(1 for _ in zone.iter_nodes())
+    assert size == depth * (width + 1)
+
+    for parent in (spine[depth // 2], spine[-1], spine[depth // 2].children[3]):
+        CountingNode.touched.clear()
+        parent.add_child(CountingNode(DefaultCard("red", 2)))
+        assert len(CountingNode.touched) <= 3 * depth, len(CountingNode.touched)
+
+        leaf = parent.children[-1]
+        CountingNode.touched.clear()
+        zone.beat_node(leaf.id)
+        assert len(CountingNode.touched) <= 2 * depth, len(CountingNode.touched)
+        assert zone.find_exposed("blue", 2) is first_exposed(zone, "blue", 2)
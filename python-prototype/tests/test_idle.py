@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from core.idle import IdleEngine, IdleRules
+from core.treegen import TreeSpec, generate_tree
+
+
+def tick_by_tick(zone, rules, state, ticks):
+    """The rules in core/idle.py, written out literally: one loop iteration per tick."""
+    assigned = state["assigned"]  # node id -> work left
+    nodes = {node.id: node for node in zone.iter_nodes()}
+
+    def assign():
+        free = sorted(node.id for node in zone.get_exposed_nodes() if node.id not in assigned)
+        for node_id in free[:state["neurons"] - len(assigned)]:
+            assigned[node_id] = rules.work(nodes[node_id])
+
+    # Neurons freed by the player's own moves pick up new work straight away.
+    for node_id in [node_id for node_id in assigned if not nodes[node_id].is_exposed()]:
+        del assigned[node_id]
+    assign()
+    for _ in range(ticks):
+        solved = [node for node in nodes.values() if node.beaten]
+        state["knowledge"] += rules.income * len(solved)
+        for node in solved:
+            state["points"][node.color] = state["points"].get(node.color, 0) + rules.income
+        state["tick"] += 1
+        for node_id in sorted(assigned):
+            assigned[node_id] -= rules.work_per_tick
+            if assigned[node_id] <= 0:
+                del assigned[node_id]
+                zone.beat_node(node_id)
+                state["knowledge"] += nodes[node_id].loot
+        while rules.auto_hire and state["knowledge"] >= rules.hire_price(state["hired"]):
+            state["knowledge"] -= rules.hire_price(state["hired"])
+            state["hired"] += 1
+            state["neurons"] += 1
+        assign()
+
+
+def beaten_positions(zone):
+    return [node.beaten for node in zone.iter_nodes()]
+
+
+def test_advance_matches_the_tick_by_tick_loop():
+    for seed in range(100):
+        rng = random.Random(seed)
+        spec = TreeSpec(depth=rng.randint(2, 4), max_children=rng.randint(1, 4), numbers=(0, 6),
+                        loot=rng.randint(0, 5))
+        rules = IdleRules(work_per_tick=rng.randint(1, 7), work_per_number=rng.randint(1, 12),
+                          income=rng.randint(0, 3), auto_hire=rng.random() < 0.8,
+                          hire_cost=rng.randint(1, 60), hire_growth=rng.randint(0, 80))
+        fast_zone, slow_zone = generate_tree(spec, seed), generate_tree(spec, seed)
+        engine = IdleEngine(fast_zone, rules)
+        state = {"knowledge": 0, "points": {}, "tick": 0, "hired": 0, "neurons": 1, "assigned": {}}
+        tick_by_tick(slow_zone, rules, state, 0)
+        for _ in range(rng.randint(1, 6)):
+            ticks = rng.choice((1, 2, rng.randint(0, 50), rng.randint(0, 500)))
+            engine.advance(ticks)
+            tick_by_tick(slow_zone, rules, state, ticks)
+            roll = rng.random()
+            if roll < 0.3:
+                # The player beats a node by hand in both games.
+                exposed = sorted(node.id for node in slow_zone.get_exposed_nodes())
+                if exposed:
+                    index = rng.randrange(len(exposed))
+                    slow_zone.beat_node(exposed[index])
+                    fast_zone.beat_node(sorted(node.id for node in fast_zone.get_exposed_nodes())[index])
+            elif roll < 0.45:
+                # Or undoes a beaten node whose parent still stands.
+                positions = [index for index, node in enumerate(slow_zone.iter_nodes())
+                             if node.beaten and (node.parent is None or not node.parent.beaten)]
+                if positions:
+                    index = rng.choice(positions)
+                    for zone in (slow_zone, fast_zone):
+                        zone.unbeat_node(list(zone.iter_nodes())[index].id)
+            assert engine.tick == state["tick"], seed
+            assert (engine.knowledge, engine.neurons, engine.hired) == \
+                (state["knowledge"], state["neurons"], state["hired"]), (seed, engine, state)
+            assert {c: p for c, p in engine.points.items() if p} == \
+                {c: p for c, p in state["points"].items() if p}, seed
+            assert beaten_positions(fast_zone) == beaten_positions(slow_zone), seed
+
+
+@pytest.mark.parametrize("days", [1, 30])
+def test_a_long_absence_solves_the_tree_and_then_only_earns(days):
+    zone = generate_tree(TreeSpec(depth=4, max_children=3, numbers=(1, 10), loot=5), 1)
+    engine = IdleEngine(zone, IdleRules(auto_hire=False))
+    assert engine.catch_up(days * 24 * 3600) == sum(1 for _ in zone.iter_nodes()) and zone.solved
+    knowledge, tick = engine.knowledge, engine.tick
+    assert engine.advance(10 ** 9) == 0
+    assert (engine.tick, engine.knowledge) == (tick + 10 ** 9, knowledge + engine.knowledge_rate * 10 ** 9)
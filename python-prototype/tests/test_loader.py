@@ -0,0 +1,113 @@
+import io
+import json
+
+import pytest
+
+from core.card import DefaultCard
+from core.gamezone import ProblemNode
+from core.loader import (CompiledPack, _assemble, compile_deck, compile_problem_tree, iter_deck,
+                         iter_json_events, load_deck, load_problem_tree)
+
+# Small documents whose last string ends within the lookahead of EOF; these
+# used to hang waiting for more input.
+DOCUMENTS = ['{"card": {"color": "red", "number": 1}, "loot": 0, "children": []}',
+             '{"children": [], "card": {"color": "blue", "number": 2}}',
+             '[{"color": "red", "number": 1}, {"color": "green"}]',
+             '{"a": "x"}', '["tail"]', '"only"', '{"esc": "a\\"b"}', '["\\u00e9"]', '[{"k": "v"}]',
+             '[1, -2.5e3, true, false, null, {}, []]', '{"a": [1, {"b": [2, 3]}], "c": {"d": null}}']
+
+MALFORMED = ['[{"color": "red"} {"color": "blue"}]', '[{"color": "red"},,,{"color": "blue"},]',
+             '[,1]', '[1,]', '[1 2]', '{"a" 1}', '{"a": 1,}', '{"a": 1 "b": 2}', '{,"a": 1}', '{"a":}',
+             '{1: 2}', '["a": 1]', '[1}', '{"a": 1]', '[1]]', '[', '{"a": 1', '1 2', '"x",', '[1] x',
+             '', '[01]', '[tru]', '["a\nb"]']
+
+LEAVES = [None, lambda containers, key: key == "card" or len(containers) == 1]
+
+
+def parse(text, chunk_size, leaf=None):
+    return next(_assemble(iter_json_events(io.StringIO(text), chunk_size, leaf), {}), None)
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("padding", ["", " ", "\n" * 3])
+def test_stream_parses_like_json_loads_at_every_chunk_boundary(document, padding):
+    text = document + padding
+    expected = json.loads(text)
+    for chunk_size in range(1, len(text) + 2):
+        for leaf in LEAVES:
+            assert parse(text, chunk_size, leaf) == expected, chunk_size
+
+
+@pytest.mark.parametrize("text", MALFORMED)
+def test_stream_rejects_malformed_json(text):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(text)
+    for chunk_size in (1, 2, 3, 7, 1 << 16):
+        for leaf in LEAVES:
+            with pytest.raises(ValueError):
+                parse(text, chunk_size, leaf)
+
+
+def test_comma_split_from_its_value_by_a_chunk_boundary():
+    # More whitespace than the lookahead between a comma and what follows it.
+    gap = " " * 200
+    assert parse("[1," + gap + "2]", 16) == [1, 2]
+    with pytest.raises(ValueError):
+        parse("[1," + gap + ",2]", 16)
+    with pytest.raises(ValueError):
+        parse("[1," + gap + "]", 16)
+
+
+@pytest.mark.parametrize("text", MALFORMED[:2])
+def test_deck_loaders_reject_malformed_json(tmp_path, text):
+    path = tmp_path / "deck.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        load_deck(str(path))
+    with pytest.raises(ValueError):
+        list(iter_deck(str(path)))
+
+
+def test_load_problem_tree_reads_a_document_ending_at_eof(tmp_path):
+    path = tmp_path / "tree.json"
+    path.write_text(DOCUMENTS[0])
+    root = load_problem_tree(str(path))
+    assert (root.color, root.number, root.loot, root.children) == ("red", 1, 0, [])
+
+
+def test_load_problem_tree_streams_trees_too_deep_for_json_module(tmp_path):
+    depth = 5000
+    path = tmp_path / "deep.json"
+    path.write_text('{"card": {"color": "red", "number": 1}, "children": [' * depth
+                    + '{"loot": 2}' + ']}' * depth)
+    node = load_problem_tree(str(path))
+    for _ in range(depth):
+        (node,) = node.children
+    assert (node.color, node.loot, node.children) == (None, 2, [])
+
+
+def test_json_and_stream_build_the_same_deck(tmp_path):
+    cards = [{"color": "red", "number": 3}, {"color": "blue"}, {"number": 2, "edition": "foil"}]
+    path = tmp_path / "deck.json"
+    path.write_text(json.dumps(cards))
+    loaded = [card.code for card in load_deck(str(path))]
+    assert loaded == [card.code for card in iter_deck(str(path))]
+    assert loaded == [DefaultCard(**info).code for info in cards]
+
+
+def test_compiled_packs_round_trip(tmp_path):
+    root = ProblemNode(DefaultCard("red", 4), [ProblemNode(DefaultCard("blue", 1), loot=2),
+                                              ProblemNode(DefaultCard("green", 2),
+                                                          [ProblemNode(DefaultCard(None, 3))])], loot=1)
+    tree_path, deck_path = str(tmp_path / "tree.cpack"), str(tmp_path / "deck.cpack")
+    compile_problem_tree(root, tree_path)
+    cards = [DefaultCard("red", 1, edition="foil"), DefaultCard(None, 5), DefaultCard("blue")]
+    compile_deck(cards, deck_path)
+
+    def shape(node):
+        return node.card.code, node.loot, [shape(child) for child in node.children]
+
+    assert shape(load_problem_tree(tree_path)) == shape(root)
+    assert [card.code for card in load_deck(deck_path)] == [card.code for card in cards]
+    with CompiledPack(tree_path) as pack:
+        assert isinstance(pack.codes, memoryview) and list(pack.offsets) == [1, 3, 3, 4, 4]
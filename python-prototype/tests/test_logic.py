@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+from core.card import DefaultCard
+from core.gamezone import MemoryZone
+from core.jokers import CardFunction, JokerChain
+from core.logic import attack_with_card, fuse_codes, resolve_stack, resolve_stacks
+from core.treegen import TreeSpec, generate_tree
+
+COLORS = [None, "red", "blue", "green", "yellow"]
+NUMBERS = [None, 0, 1, 2, 3, 4]
+SPEC = TreeSpec(depth=3, max_children=3, numbers=(0, 4), loot=1)
+
+
+def baseline_attacks(stack):
+    """
+    The attacks the baseline's resolve_stack made, as (color, number): its
+    loop copied unchanged, on the card dicts it indexed, with
+    attack_with_card and memory swapped for recording the attacker.
+    """
+    attacks = []
+    memory = []
+
+    def attack_with_card(card, tree, memory, loot_counter):
+        color, number = (card['color'], card['number']) if isinstance(card, dict) else (card.color, card.number)
+        attacks.append((color or 'red', number))
+
+    tree = loot_counter = None
+    new_stack = list(reversed(stack))
+    fused = []
+
+    while new_stack:
+        base = new_stack.pop()
+
+        if not isinstance(base['number'], int):
+            memory.insert(0, base)
+            attack_with_card(base, tree, memory, loot_counter)
+            continue
+
+        fused_card = {
+            'number': base['number'],
+            'color': None,
+            'hasColor': False,
+            'hasNumber': True
+        }
+
+        if new_stack:
+            next_card = new_stack[-1]
+            if not fused_card['hasColor'] and next_card.get('color') and not next_card.get('number'):
+                fused_card['color'] = next_card['color']
+                fused_card['hasColor'] = True
+                new_stack.pop()
+            elif not fused_card['hasNumber'] and next_card.get('number'):
+                fused_card['number'] += next_card['number']
+                fused_card['hasNumber'] = True
+                new_stack.pop()
+
+        fused_obj = DefaultCard(fused_card['color'], fused_card['number'])
+        memory.insert(0, {'color': fused_card['color'], 'number': fused_card['number']})
+        attack_with_card(fused_obj, tree, memory, loot_counter)
+
+    stack.clear()
+    return attacks
+
+
+def attacks_of(cards):
+    return [(DefaultCard.from_code(code).color, DefaultCard.from_code(code).number)
+            for _, code in fuse_codes([card.code for card in cards])]
+
+
+def random_stack(rng, colored_numbers=True):
+    cards = []
+    for _ in range(rng.randint(0, 8)):
+        color = rng.choice(COLORS)
+        cards.append(DefaultCard(color, rng.choice(NUMBERS) if colored_numbers or color is None else None))
+    roll = rng.random()
+    if roll < 0.2:
+        if not colored_numbers:
+            cards.append(DefaultCard(None, rng.choice(NUMBERS[1:])))  # so the zero only ever paints
+        cards.append(DefaultCard(rng.choice(COLORS[1:]), 0))      # a zero-number color card
+    elif roll < 0.4:
+        cards.append(DefaultCard(None, rng.choice(NUMBERS[1:])))  # a trailing blank, nothing to fuse with
+    return cards
+
+
+def setup(games, seed):
+    trees = [generate_tree(SPEC, seed + game) for game in range(games)]
+    return trees, [MemoryZone() for _ in range(games)], [[0] for _ in range(games)]
+
+
+def outcome(games, game):
+    trees, memories, loot = games
+    return (loot[game][0], [card.code for card in memories[game].cards],
+            [node.beaten for node in trees[game].iter_nodes()])
+
+
+def test_blank_and_paint_stacks_resolve_like_the_baseline_loop():
+    # Stacks where only colorless cards carry numbers, so the baseline's
+    # reset of the base card's color changes nothing.
+    rng = random.Random(0)
+    games = 300
+    stacks = [random_stack(rng, colored_numbers=False) for _ in range(games)]
+    ours, theirs = setup(games, 1), setup(games, 1)
+    for _ in range(3):  # a few rounds, so later stacks hit nodes the earlier ones exposed
+        for game, cards in enumerate(stacks):
+            assert attacks_of(cards) == baseline_attacks([{'color': card.color, 'number': card.number}
+                                                          for card in cards])
+            resolve_stack(list(cards), ours[1][game], ours[0][game], ours[2][game])
+            for color, number in baseline_attacks([{'color': card.color, 'number': card.number}
+                                                   for card in cards]):
+                attack_with_card(DefaultCard(color, number), theirs[0][game], theirs[1][game], theirs[2][game])
+    for game in range(games):
+        assert outcome(ours, game) == outcome(theirs, game), game
+
+
+def test_colored_number_cards_keep_their_color():
+    # The one rule that differs from the baseline loop, which reset every
+    # number card's color: a colored number card attacks as itself and never
+    # takes a following paint.
+    blue_three, green, blank = DefaultCard("blue", 3), DefaultCard("green"), DefaultCard(None, 2)
+    assert baseline_attacks([{'color': "blue", 'number': 3}, {'color': "green", 'number': None}]) == [("green", 3)]
+    assert attacks_of([blue_three, green]) == [("blue", 3), ("green", None)]
+    assert baseline_attacks([{'color': "blue", 'number': 3}]) == [("red", 3)]
+    assert attacks_of([blue_three]) == [("blue", 3)]
+    assert attacks_of([blank, DefaultCard("green", 1)]) == [("red", 2), ("green", 1)]
+    # Blanks fuse the same way under both.
+    for cards, expected in (([blank, green, blank], [("green", 2), ("red", 2)]),
+                            ([blank, DefaultCard("green", 0)], [("green", 2)]),
+                            ([blank, blank, DefaultCard("yellow")], [("red", 2), ("yellow", 2)])):
+        assert attacks_of(cards) == expected
+        assert baseline_attacks([{'color': card.color, 'number': card.number} for card in cards]) == expected
+
+
+JOKERS = JokerChain([CardFunction({"color": None, "number": 2}, {"color": "green"}).doubled(),
+                     CardFunction({"color": "green"}, {"color": "blue"})])
+
+
+@pytest.mark.parametrize("jokers", [None, JOKERS], ids=["no jokers", "jokers"])
+def test_resolve_stack_and_resolve_stacks_agree(jokers):
+    np = pytest.importorskip("numpy")
+    rng = random.Random(0)
+    games = 300
+    stacks = [random_stack(rng) for _ in range(games)]
+    single, batch = setup(games, 1), setup(games, 1)
+    for _ in range(3):
+        for game, cards in enumerate(stacks):
+            resolve_stack(list(cards), single[1][game], single[0][game], single[2][game], jokers)
+        codes = np.zeros((games, max(map(len, stacks))), dtype=np.uint32)
+        for row, cards in enumerate(stacks):
+            codes[row, :len(cards)] = [card.code for card in cards]
+        resolve_stacks(codes, [len(cards) for cards in stacks], batch[1], batch[0], batch[2],
+                       stacks=stacks, jokers=jokers)
+    for game in range(games):
+        assert outcome(single, game) == outcome(batch, game), game
+    assert any(node.beaten for tree in batch[0] for node in tree.iter_nodes())
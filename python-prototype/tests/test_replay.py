@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from core.card import DefaultCard
+from core.gamezone import DeckZone, DiscardZone, HandZone, MemoryZone, StackZone, ZoneCards
+from core.replay import (PLAY_SELECTED, REDO, SELECT_NEXT, SELECT_PREVIOUS, UNDO, ActionLog, Divergence,
+                         GameSession, _card_bytes, first_divergence, replay)
+from core.treegen import TreeSpec, generate_tree
+
+ACTIONS = (SELECT_NEXT, SELECT_NEXT, SELECT_PREVIOUS, PLAY_SELECTED, UNDO, REDO)
+
+
+def position_key(session):
+    return tuple(_card_bytes(zone.cards) for zone in session.zones if zone is not session.problem_zone) + \
+        (session.tree_signature,)
+
+
+def record(seed):
+    rng = random.Random(seed)
+    deck_cards = [DefaultCard(rng.choice(("red", "blue")), rng.randint(1, 5)) for _ in range(20)]
+    hand = HandZone()
+    hand.cards.extend(deck_cards[:5])
+    zones = (DeckZone(max_size=20, cards=ZoneCards(deck_cards[5:])), hand, StackZone(), DiscardZone(),
+             generate_tree(TreeSpec(depth=3, max_children=3), seed), MemoryZone())
+    session = GameSession(zones, seed)
+    log = ActionLog.start(session, checkpoint_every=16)
+    # Undo and redo must put the zones back as they were in each state they return to.
+    seen = {session.history.state: position_key(session)}
+    for _ in range(rng.randint(50, 150)):
+        session.apply(rng.choice(ACTIONS))
+        key = seen.setdefault(session.history.state, position_key(session))
+        assert key == position_key(session), seed
+    log.finish(session)
+    return log
+
+
+def test_recorded_sessions_replay_from_the_file(tmp_path):
+    for seed in range(40):
+        path = str(tmp_path / f"{seed:04}.actlog")
+        record(seed).write(path)
+        log = ActionLog.read(path)
+        replay(log).close()
+        assert first_divergence(log) is None
+
+
+def test_a_tampered_log_diverges_and_bisects_to_the_changed_action():
+    log = record(7)
+    # Its third action (while the hand still has cards) now does something else.
+    log.actions[2] = PLAY_SELECTED if log.actions[2] != PLAY_SELECTED else SELECT_NEXT
+    with pytest.raises(Divergence):
+        replay(log).close()
+    assert first_divergence(log) == 3
@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from core.card import DefaultCard, EDITIONS
+from core.gamezone import DeckZone, DiscardZone, HandZone, MemoryZone, ProblemNode, StackZone, ZoneCards
+from core.savegame import (KIND_DELTA, RECORD, Autosave, _card_zones, _tree_order, game_bytes, load_game,
+                           load_game_bytes)
+from core.treegen import TreeSpec, generate_tree
+
+
+def snapshot(zones, loot, turn):
+    cards = tuple(tuple(card.code for card in zone.cards) for zone in _card_zones(zones))
+    tree = tuple((node.card.code, node.loot, node.beaten) for node in _tree_order(zones[4]))
+    return cards, tree, loot, turn
+
+
+def new_zones(rng):
+    deck_cards = [DefaultCard(rng.choice(("red", "blue", "green")), rng.randint(1, 10),
+                              edition=rng.choice((None, "foil"))) for _ in range(200)]
+    tree = generate_tree(TreeSpec(depth=4, min_children=2, max_children=5, loot=2), 0)
+    return (DeckZone(max_size=len(deck_cards), cards=ZoneCards(deck_cards)), HandZone(), StackZone(),
+            DiscardZone(max_size=len(deck_cards)), tree, MemoryZone(capacity=20))
+
+
+def play_turn(rng, zones, turn):
+    """One turn of the game loop; returns the loot it earned."""
+    deck, hand, stack, discard, problem, memory = zones
+    loot = 0
+    if not deck.cards:
+        discard.move_all(deck)
+    deck.move_cards(list(deck.cards[:5 - len(hand.cards)]), hand)
+    for card in list(hand.cards)[:rng.randint(1, 3)]:
+        hand.play_to_stack(card, stack)
+    for card in list(stack.cards):
+        node = problem.find_exposed(card.color, card.number)
+        if node is not None:
+            problem.beat_node(node.id)
+            loot += node.loot
+        memory.remember(card)
+    stack.move_all(discard)
+    exposed = problem.get_exposed_nodes()
+    for node in rng.sample(exposed, min(2, len(exposed))):
+        problem.beat_node(node.id)
+    if turn % 50 == 0:
+        EDITIONS.encode(f"edition {turn}")
+        hand.add_card(DefaultCard("red", 1, edition=f"edition {turn}"))
+    if turn % 70 == 0 and problem.root is not None:
+        problem.root.add_child(ProblemNode(DefaultCard("blue", turn % 10 + 1), loot=1))
+    return loot
+
+
+@pytest.mark.parametrize("compact_every", [256, 16])
+def test_autosave_loads_back_every_save(tmp_path, compact_every):
+    rng = random.Random(0)
+    zones = new_zones(rng)
+    path = str(tmp_path / "session.save")
+    autosave = Autosave(path, zones, compact_every=compact_every)
+    loot = 0
+    for turn in range(1, 201):
+        loot += play_turn(rng, zones, turn)
+        autosave.save(loot, turn)
+        if turn % 25 == 0:
+            game = load_game(path)
+            assert snapshot(game.zones, game.loot, game.turn) == snapshot(zones, loot, turn), turn
+    autosave.close()
+    assert autosave.records < compact_every
+
+
+def test_a_save_cut_short_loads_as_of_the_save_before(tmp_path):
+    rng = random.Random(1)
+    zones = new_zones(rng)
+    path = str(tmp_path / "session.save")
+    autosave = Autosave(path, zones)
+    for turn in range(1, 30):
+        play_turn(rng, zones, turn)
+        autosave.save(0, turn)
+    autosave.close()
+    with open(path, "ab") as f:
+        f.write(RECORD.pack(KIND_DELTA, 100) + b"partial")
+    game = load_game(path)
+    assert snapshot(game.zones, game.loot, game.turn) == snapshot(zones, 0, 29)
+
+
+def test_game_bytes_round_trip():
+    rng = random.Random(2)
+    zones = new_zones(rng)
+    for turn in range(1, 10):
+        play_turn(rng, zones, turn)
+    game = load_game_bytes(game_bytes(zones, 7, 9))
+    assert snapshot(game.zones, game.loot, game.turn) == snapshot(zones, 7, 9)
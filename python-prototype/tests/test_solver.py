@@ -0,0 +1,70 @@
+import pytest
+
+from core.card import DefaultCard
+from core.gamezone import MemoryZone
+from core.logic import Deck, resolve_stack
+from core.simulation import standard_deck
+from core.solver import Solver, card_key, rate
+from core.treegen import TreeSpec, generate_batch
+
+
+def new_deck(seed):
+    return Deck([DefaultCard(color, number) for color, number in standard_deck()], seed=seed)
+
+
+def plays_out(flat, seed, solution, hand_size):
+    """Plays a solution's line with the real deck and resolve_stack; True when it beats the tree in time."""
+    tree, deck, memory, loot = flat.to_zone(), new_deck(seed), MemoryZone(), [0]
+    hand = deck.draw(hand_size)
+    for turn in solution.line:
+        hand += deck.draw(max(hand_size - len(hand), 0))
+        stack = []
+        for from_memory, cards in turn:
+            for card in cards:
+                source = memory.cards if from_memory else hand
+                card = next(held for held in source if card_key(held) == card_key(card))
+                source.remove(card)
+                stack.append(card)
+        resolve_stack(stack, memory, tree, loot)
+    return tree.solved
+
+
+def rate_batch(spec, count, **budget):
+    solver = Solver()
+    for seed, flat in enumerate(generate_batch(spec, count, 0)):
+        deck = new_deck(seed)
+        hand = deck.draw(solver.hand_size)
+        yield seed, flat, rate(flat.to_zone(), hand, deck, solver=solver, **budget)
+
+
+def test_lines_beat_the_tree_when_played_with_resolve_stack():
+    for seed, flat, rating in rate_batch(TreeSpec(depth=3, max_children=2), 20, max_nodes=20000):
+        assert rating.solvable_from_first_principles, seed
+        assert rating.turn_bound <= rating.first_principles_bound
+        for solution in (rating.with_memory, rating.first_principles):
+            assert len(solution.line) == solution.turn_bound
+            assert plays_out(flat, seed, solution, 5), seed
+
+
+def test_turn_bound_matches_a_search_without_the_heuristic(monkeypatch):
+    # With no heuristic the search is plain iterative deepening, so the answers
+    # only agree if the heuristic never overestimates.
+    spec = TreeSpec(depth=2, max_children=2)
+    expected = [(rating.turn_bound, rating.first_principles_bound) for _, _, rating in rate_batch(spec, 12)]
+    monkeypatch.setattr(Solver, "_heuristic", lambda self, state: 0)
+    assert [(rating.turn_bound, rating.first_principles_bound) for _, _, rating in rate_batch(spec, 12)] == expected
+
+
+@pytest.mark.parametrize("use_memory", [True, False], ids=["memory", "first principles"])
+def test_solves_within_a_small_node_budget(use_memory):
+    # The bounds keep the search small: most puzzles expand a few dozen states.
+    solver = Solver()
+    expanded = []
+    for seed, flat in enumerate(generate_batch(TreeSpec(depth=3, max_children=2), 40, 0)):
+        deck = new_deck(seed)
+        hand = deck.draw(solver.hand_size)
+        solution = solver.solve(flat.to_zone(), hand, deck, use_memory=use_memory, max_nodes=5000)
+        assert solution.complete, seed
+        expanded.append(solution.expanded)
+    expanded.sort()
+    assert expanded[len(expanded) // 2] <= 100, expanded
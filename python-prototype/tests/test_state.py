@@ -0,0 +1,177 @@
+import random
+
+import pytest
+
+from core.card import DefaultCard
+from core.gamezone import DeckZone, DiscardZone, HandZone, MemoryZone, ProblemZone, StackZone
+from core.logic import Deck, resolve_stack
+from core.state import GameState, History, PersistentBits
+from core.treegen import TreeSpec, generate_tree
+
+COLORS = ["red", "blue", "green", "yellow"]
+SPEC = TreeSpec(depth=4, max_children=3, numbers=(0, 3), loot=1)
+
+
+def test_state_resolves_like_the_zones():
+    # Including which of several exposed nodes with the same card gets beaten.
+    rng = random.Random(0)
+    for seed in range(1, 41):
+        zone = generate_tree(SPEC, seed)
+        memory_zone, loot = MemoryZone(capacity=8), [0]
+        state = GameState.new(zone, memory_capacity=8, seed=seed)
+        while not zone.solved:
+            stack = [DefaultCard(rng.choice([None] + COLORS), rng.choice([None, 0, 1, 2]))
+                     for _ in range(rng.randint(0, 2))]
+            for node in zone.get_exposed_nodes():
+                if rng.random() < 0.5:
+                    # Sometimes as a blank number painted by a bare color card.
+                    stack += ([DefaultCard(None, node.number), DefaultCard(node.color, None)] if rng.random() < 0.3
+                              else [DefaultCard(node.color, node.number)])
+            state = state._replace(stack=tuple(card.code for card in stack))
+            if memory_zone.cards and rng.random() < 0.3:
+                position = rng.randrange(len(memory_zone.cards))
+                card = memory_zone.cards[position]
+                memory_zone.cards.remove(card)
+                stack.append(card)
+                state = state.play_from_memory(position, stack_size=99)
+            resolve_stack(stack, memory_zone, zone, loot)
+            state = state.resolve()
+            assert loot[0] == state.loot
+            assert [card.code for card in memory_zone.cards] == state.memory_codes()
+            assert {node.id for node in zone.iter_nodes() if node.beaten} == \
+                {state.tree.nodes[index].id for index in state.beaten}
+            assert sorted(node.id for node in zone.get_exposed_nodes()) == \
+                sorted(state.tree.nodes[index].id for index in state.exposed())
+        assert state.solved
+
+
+def test_state_deals_like_a_deck():
+    # Drawing and discarding deal the same cards as a Deck reshuffling its discard zone.
+    rng = random.Random(0)
+    for seed in range(50):
+        deck_cards = [DefaultCard(rng.choice(COLORS), number) for number in range(rng.randint(1, 30))]
+        discard_zone = DiscardZone(max_size=len(deck_cards))
+        deck = Deck(deck_cards, seed=seed, discard_zone=discard_zone)
+        deck.draw(rng.randint(0, 3))  # start part way through, from the deck itself
+        state = GameState.new(ProblemZone(), deck, seed=seed)
+        hand = []
+        for _ in range(40):
+            if hand and rng.random() < 0.5:
+                position = rng.randrange(len(hand))
+                discard_zone.add_card(hand.pop(position))
+                state = state.discard_card(position)
+            else:
+                count = rng.randint(1, 4)
+                hand += deck.draw(count)
+                state = state.draw(count)
+            assert [card.code for card in hand] == list(state.hand)
+            assert state.reshuffles == deck.reshuffles
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_changes_lists_the_indexes_in_one_set_only(seed):
+    rng = random.Random(seed)
+    size = rng.choice([5, 40, 2000, 40000])
+    bits = before = PersistentBits(size, rng.sample(range(size), size // 3))
+    for _ in range(rng.randint(0, 50)):
+        index = rng.randrange(size)
+        bits = bits.clear(index) if index in bits else bits.set(index)
+    assert list(bits.changes(before)) == sorted(set(bits) ^ set(before))
+    assert list(before.changes(bits)) == list(bits.changes(before))
+
+
+class Observer:
+    def __init__(self, zone):
+        self.calls = []
+        zone.observers.append(self)
+
+    def tree_reset(self, zone):
+        self.calls.append("tree_reset")
+
+    def child_added(self, parent, child):
+        self.calls.append("child_added")
+
+    def node_beaten(self, node):
+        self.calls.append("node_beaten")
+
+    def node_unbeaten(self, node):
+        self.calls.append("node_unbeaten")
+
+
+def make_zones(rng, seed):
+    deck = DeckZone(max_size=60)
+    deck.cards.extend(DefaultCard(rng.choice(COLORS), rng.randint(0, 3)) for _ in range(30))
+    hand, stack, discard = HandZone(), StackZone(), DiscardZone(max_size=60)
+    hand.cards.extend(DefaultCard(rng.choice(COLORS), rng.randint(0, 3)) for _ in range(3))
+    discard.cards.extend(DefaultCard(rng.choice(COLORS), 1) for _ in range(2))
+    memory = MemoryZone(capacity=6)
+    memory.cards.extend(DefaultCard(rng.choice(COLORS), rng.randint(0, 3)) for _ in range(9))
+    return deck, hand, stack, discard, generate_tree(SPEC, seed), memory
+
+
+def zones_view(zones):
+    deck, hand, stack, discard, problem, memory = zones
+    return ([card.code for card in deck.cards], [card.code for card in hand.cards],
+            [card.code for card in stack.cards], [card.code for card in discard.cards],
+            [(seq, card.code) for seq, card in memory.cards.entries()], memory.cards.next_seq,
+            sorted(node.id for node in problem.iter_nodes() if node.beaten),
+            sorted(node.id for node in problem.get_exposed_nodes()))
+
+
+def state_view(state):
+    return (list(state.deck[state.deck_top:]), list(state.hand), list(state.stack),
+            state.discard_codes()[::-1], list(state.memory), state.memory_seq,
+            sorted(state.tree.nodes[index].id for index in state.beaten),
+            sorted(state.tree.nodes[index].id for index in state.exposed()))
+
+
+def aggregates(zone):
+    return [(node.id, dict(node.remaining), node.unbeaten_leaves, node.depth_to_frontier,
+             node.unbeaten_children) for node in zone.iter_nodes()]
+
+
+@pytest.mark.parametrize("seed", range(1, 9))
+def test_undo_and_redo_write_back_only_what_changed(seed):
+    rng = random.Random(seed)
+    zones = make_zones(rng, seed)
+    problem, memory = zones[4], zones[5]
+    history = History(GameState.from_zones(zones, seed))
+    assert zones_view(zones) == state_view(history.state)
+    for _ in range(60):
+        state = history.state
+        roll = rng.random()
+        if roll < 0.25:
+            state = state.draw(rng.randint(1, 4))
+        elif roll < 0.45 and state.hand:
+            state = state.discard_card(rng.randrange(len(state.hand)))
+        elif roll < 0.55 and state.memory:
+            state = state.play_from_memory(rng.randrange(len(state.memory)))
+        else:
+            for index in rng.sample(state.exposed(), min(3, len(state.exposed()))):
+                state = state._replace(stack=state.stack + (state.tree.codes[index],))
+            state = state.resolve()
+        history.push(state)
+
+    observer = Observer(problem)
+    current = history.state
+    current.sync_zones(zones)
+    for _ in range(200):
+        state = history.undo() if rng.random() < 0.6 else history.redo()
+        del observer.calls[:]
+        state.sync_zones(zones, since=current)
+        assert zones_view(zones) == state_view(state)
+        assert len(observer.calls) == len(set(state.beaten) ^ set(current.beaten))
+        assert "tree_reset" not in observer.calls
+        current = state
+        if problem.root is not None:
+            counts = aggregates(problem)
+            problem.root.recount()
+            assert counts == aggregates(problem)
+            for color in COLORS:
+                assert [card.code for card in memory.cards.with_color(color)] == \
+                    [code for _, code in state.memory if DefaultCard.from_code(code).color == color]
+                for number in range(4):
+                    assert problem.find_exposed(color, number) is next(
+                        (state.tree.nodes[index] for index in sorted(state.exposed())
+                         if (state.tree.nodes[index].color, state.tree.nodes[index].number) == (color, number)),
+                        None)
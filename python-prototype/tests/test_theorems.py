@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core.theorems import INDEX_DTYPE, TheoremGraph, TheoremProgress, _csr  # noqa: E402
+
+
+def random_graph(theorems, problems, seed, max_requires=3, trivial=0.05, max_cost=9):
+    """A layered history: theorem t can only be proven from lower numbered ones (plus a few back edges)."""
+    rng = np.random.default_rng(seed)
+    targets = rng.integers(1, theorems, size=problems)
+    counts = rng.integers(1, max_requires + 1, size=problems)
+    offsets = np.zeros(problems + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    limits = np.repeat(targets, counts)
+    prerequisites = (rng.random(len(limits)) * limits).astype(INDEX_DTYPE)
+    back = rng.random(len(limits)) < 0.01
+    prerequisites[back] = rng.integers(0, theorems, size=int(back.sum()))
+    costs = rng.integers(1, max_cost + 1, size=problems)
+    pairs = int(problems * trivial)
+    trivializes = np.column_stack((rng.integers(0, theorems, size=pairs), rng.integers(0, problems, size=pairs)))
+    trivialize_offsets, trivialize_problems = _csr(trivializes[:, 0], trivializes[:, 1], theorems)
+    return TheoremGraph.from_arrays(theorems, targets, costs, offsets, prerequisites,
+                                    trivialize_offsets, trivialize_problems)
+
+
+def naive_close(graph, unlocked, solved, trivial):
+    """Applies free solves until nothing changes."""
+    changed = True
+    while changed:
+        changed = False
+        for problem in range(graph.problem_count):
+            if problem in solved:
+                continue
+            if problem not in trivial and any(problem in graph.trivializes(t).tolist() for t in unlocked):
+                trivial.add(problem)
+            if problem in trivial and all(t in unlocked for t in graph.requires(problem).tolist()):
+                solved.add(problem)
+                unlocked.add(int(graph.targets[problem]))
+                changed = True
+
+
+def naive_costs(progress):
+    """The same AND/OR costs by fixed-point iteration."""
+    graph = progress.graph
+    cost = [0.0 if progress.unlocked[t] else float("inf") for t in range(graph.theorem_count)]
+    changed = True
+    while changed:
+        changed = False
+        for problem in range(graph.problem_count):
+            if progress.solved[problem]:
+                continue
+            total = progress.cost(problem) + sum(cost[t] for t in graph.requires(problem).tolist())
+            target = graph.targets[problem]
+            if total < cost[target]:
+                cost[target] = total
+                changed = True
+    return cost
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_progress_matches_naive_propagation_reachability_and_routes(seed):
+    graph = random_graph(40, 80, seed, trivial=0.2)
+    progress = TheoremProgress(graph, axioms=[0])
+    unlocked, solved, trivial = {0}, set(), set()
+    naive_close(graph, unlocked, solved, trivial)
+    rng = random.Random(seed)
+    for step in range(25):
+        assert set(np.flatnonzero(progress.unlocked).tolist()) == unlocked, step
+        assert set(np.flatnonzero(progress.solved).tolist()) == solved, step
+        expected = naive_costs(progress)
+        reach = progress.reachable()
+        for theorem in range(graph.theorem_count):
+            assert reach[theorem] == (expected[theorem] != float("inf")), (step, theorem)
+        for theorem in rng.sample(range(graph.theorem_count), 5):
+            route = progress.cheapest_route(theorem)
+            if expected[theorem] == float("inf"):
+                assert route.cost is None
+                continue
+            assert route.cost <= expected[theorem], (step, theorem, route, expected[theorem])
+            # The route must be solvable in order on a copy.
+            trial = TheoremProgress(graph, np.flatnonzero(progress.unlocked).tolist())
+            trial.solved |= progress.solved
+            for problem in route.problems:
+                if not trial.solved[problem]:
+                    trial.solve(problem)
+            assert trial.unlocked[theorem], (step, theorem, route)
+        options = progress.available().tolist()
+        if not options:
+            break
+        problem = rng.choice(options)
+        progress.solve(problem)
+        solved.add(problem)
+        unlocked.add(int(graph.targets[problem]))
+        naive_close(graph, unlocked, solved, trivial)
+
+
+def test_cascades_keep_the_locked_counts(tmp_path):
+    # Play like a player would: pick from what is open, extended by what each solve opens.
+    graph = random_graph(20000, 60000, seed=1)
+    path = str(tmp_path / "graph.npz")
+    graph.save(path)
+    graph = TheoremGraph.load(path)
+    progress = TheoremProgress(graph, axioms=range(100))
+    rng = random.Random(1)
+    options = progress.available().tolist()
+    for _ in range(500):
+        problem = options.pop(rng.randrange(len(options)))
+        if progress.is_available(problem):
+            unlocks = progress.solve(problem)
+            assert all(progress.unlocked[unlocks.theorems]) and all(progress.solved[unlocks.solved])
+            options += unlocks.available.tolist()
+    locked = ~progress.unlocked[graph.require_theorems]
+    edge_problems = np.repeat(np.arange(graph.problem_count), np.diff(graph.require_offsets))
+    assert np.array_equal(np.bincount(edge_problems[locked], minlength=graph.problem_count), progress.missing)
+    assert set(options) >= set(progress.available().tolist())
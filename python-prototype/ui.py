@@ -1,8 +1,27 @@
 import pygame
 
+from core.profiler import INSTRUMENTED
+
 BUTTON_WIDTH = 120
 BUTTON_HEIGHT = 40
-FONT = pygame.font.Font(None, 28)
+_font = None
+
+
+def get_font() -> pygame.font.Font:
+    """The UI font, loaded on first use so importing ui needs no pygame.font.init()."""
+    global _font
+    if _font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        _font = pygame.font.Font(None, 28)
+    return _font
+
+
+def __getattr__(name):
+    # Keeps `ui.FONT` working without loading the font at import time.
+    if name == "FONT":
+        return get_font()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class UIButton:
     def __init__(self, x, y, text, callback):
@@ -12,7 +31,7 @@ class UIButton:
 
     def draw(self, surface):
         pygame.draw.rect(surface, (200, 200, 200), self.rect, border_radius=6)
-        label = FONT.render(self.text, True, (0, 0, 0))
+        label = get_font().render(self.text, True, (0, 0, 0))
         surface.blit(label, label.get_rect(center=self.rect.center))
 
     def handle_event(self, event):
@@ -21,11 +40,31 @@ class UIButton:
 
 
 def draw_loot_counter(surface, loot_value, x, y):
-    label = FONT.render(f"Loot: {loot_value}", True, (255, 255, 0))
+    label = get_font().render(f"Loot: {loot_value}", True, (255, 255, 0))
     surface.blit(label, (x, y))
 
 
 def draw_zone_labels(surface, zones):
     for zone in zones:
-        label = FONT.render(zone.__class__.__name__, True, (180, 180, 180))
+        label = get_font().render(zone.__class__.__name__, True, (180, 180, 180))
         surface.blit(label, (zone.x, zone.y - 22))
+
+
+def draw_profiler_overlay(surface, profiler, rect, rows=8):
+    """Draws the profiler's slowest timers (total ms, calls, mean ms) in a translucent box."""
+    panel = pygame.Surface(rect.size, pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 200))
+    pygame.draw.rect(panel, (0, 255, 120), panel.get_rect(), 1)
+    font = get_font()
+    line_height = font.get_linesize()
+    lines = ["Profiler (F3 off, F4 export)"]
+    if not INSTRUMENTED:
+        # @instrumented decides at import time, so this cannot be switched on from here.
+        lines += ["Frame spans only; restart with", "CONWAY_PROFILE=1 for game-logic timers"]
+        rows -= 2
+    for row in profiler.summary()[:rows]:
+        lines.append(f"{row['name'][-26:]:<26} {row['total_ms']:8.1f} {row['calls']:6d} {row['mean_ms']:7.3f}")
+    for index, text in enumerate(lines):
+        label = font.render(text, True, (0, 255, 120))
+        panel.blit(label, (6, 4 + index * line_height))
+    return surface.blit(panel, rect.topleft)
@@ -0,0 +1,248 @@
+import logging
+import time
+from typing import List, Optional
+
+import pygame
+
+import ui
+from core.analysis import AnalysisService, Snapshot
+from core.card import AbstractCard
+from core.gamezone import DeckZone, DiscardZone, HandZone, MemoryZone, ProblemZone, StackZone
+from core.profiler import PROFILER
+from core.replay import ActionLog, GameSession
+from core.render import CardRenderer, RedrawScheduler, PYGAME_COLORS, BEATEN_COLOR
+from core.treelayout import TreeLayout, Viewport
+
+# ----------------------------
+# Renderer: Pygame Canvas for the GameZones
+# ----------------------------
+
+log = logging.getLogger(__name__)
+
+# Posted from the analysis service's thread with the finished Analysis in `analysis`.
+ANALYSIS_EVENT = pygame.event.custom_type()
+
+def render_game(deck_zone: DeckZone,
+                hand_zone: HandZone,
+                stack_zone: StackZone,
+                discard_zone: DiscardZone,
+                problem_zone: ProblemZone,
+                memory_zone: MemoryZone,
+                seed: int = 0,
+                action_log_path: Optional[str] = None):
+    """
+    Runs the game window. Player actions go through a core.replay.GameSession;
+    with `action_log_path` they are recorded and the log is written there on
+    quit, for replaying with `python -m core.replay`.
+    """
+    pygame.init()
+    screen_width, screen_height = 800, 600
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Oldschool Card Game Canvas")
+    font = pygame.font.SysFont(None, 24)
+    renderer = CardRenderer(font)
+    
+    # For simplicity, define positions for zones:
+    zones_positions = {
+        "deck": pygame.Rect(20, 50, 100, 150),
+        "hand": pygame.Rect(150, 450, 500, 100),
+        "stack": pygame.Rect(680, 50, 100, 150),
+        "discard": pygame.Rect(680, 220, 100, 150),
+        "memory": pygame.Rect(20, 220, 100, 150),
+        "problem": pygame.Rect(150, 50, 500, 150)
+    }
+    
+    # Function to draw a zone with its cards; unchanged zones come straight from the cache.
+    # Returns the screen area covered so the scheduler can update just that.
+    def draw_zone(rect: pygame.Rect, zone_name: str, cards: List[AbstractCard], highlight_index: Optional[int] = None) -> pygame.Rect:
+        label_rect = screen.blit(renderer.label(zone_name.upper()), (rect.x + 5, rect.y - 20))
+        return label_rect.union(screen.blit(renderer.zone_surface(rect.size, cards, highlight_index), rect.topleft))
+    
+    # For ProblemZone, display the tree as an indented outline. Positions come
+    # from the precomputed layout; only rows inside the viewport are drawn.
+    problem_rect = zones_positions["problem"]
+    tree_area = problem_rect.inflate(-10, -10)
+    layout = TreeLayout(problem_zone)
+    viewport = Viewport(tree_area.width, tree_area.height)
+    
+    def draw_problem() -> pygame.Rect:
+        # Draw the zone border for ProblemZone
+        pygame.draw.rect(screen, (255, 255, 255), problem_rect, 2)
+        label_rect = screen.blit(renderer.label("PROBLEM"), (problem_rect.x + 5, problem_rect.y - 20))
+        screen.set_clip(tree_area)
+        for x, y, node in layout.visible(viewport):
+            card_text = f"{node.card.color} {node.card.number}"
+            color = BEATEN_COLOR if node.beaten else PYGAME_COLORS.get(node.card.color, (255, 255, 255))
+            screen.blit(renderer.label(card_text, color, scale=viewport.zoom), (tree_area.x + x, tree_area.y + y))
+        screen.set_clip(None)
+        return problem_rect.union(label_rect)
+    
+    # The hand selection and every game action live in the session, so a recorded log replays without a window.
+    session = GameSession((deck_zone, hand_zone, stack_zone, discard_zone, problem_zone, memory_zone), seed)
+    action_log = ActionLog.start(session) if action_log_path else None
+    
+    # Profiler overlay (F3), drawn over the free middle of the board. Timers only
+    # cover the @instrumented hot paths when started with CONWAY_PROFILE=1; the
+    # frame phases below are always timed while the profiler is on.
+    profile_rect = pygame.Rect(150, 215, 500, 200)
+    show_profile = False
+    
+    def draw_profile() -> pygame.Rect:
+        if show_profile:
+            ui.draw_profiler_overlay(screen, PROFILER, profile_rect)
+        return profile_rect
+    
+    # Compass and hint line under the hand. The position is solved in a worker
+    # process (core.analysis) and the result arrives as an ANALYSIS_EVENT, so
+    # the loop never waits for it.
+    compass_rect = pygame.Rect(150, 565, 500, 25)
+    compass_text = "Compass: thinking..."
+    analysis = AnalysisService(lambda result: pygame.event.post(pygame.event.Event(ANALYSIS_EVENT, analysis=result)))
+    analysed_versions = None
+    
+    def draw_compass() -> pygame.Rect:
+        screen.set_clip(compass_rect)
+        screen.blit(renderer.label(compass_text, (180, 220, 255)), compass_rect.topleft)
+        screen.set_clip(None)
+        return compass_rect
+    
+    # One-line status above the hand for things the player asked for (e.g. F4's export),
+    # instead of printing to a console the player may not have open.
+    status_rect = pygame.Rect(150, 420, 500, 25)
+    status_text = ""
+    
+    def draw_status() -> pygame.Rect:
+        screen.set_clip(status_rect)
+        screen.blit(renderer.label(status_text, (200, 200, 200)), status_rect.topleft)
+        screen.set_clip(None)
+        return status_rect
+    
+    # Each region is repainted only when its zone changes (or the hand selection moves).
+    painters = {
+        "deck": lambda: draw_zone(zones_positions["deck"], "Deck", deck_zone.cards),
+        "hand": lambda: draw_zone(zones_positions["hand"], "Hand", hand_zone.cards, highlight_index=session.selected_index if hand_zone.cards else None),
+        "stack": lambda: draw_zone(zones_positions["stack"], "Stack", stack_zone.cards),
+        "discard": lambda: draw_zone(zones_positions["discard"], "Discard", discard_zone.cards),
+        "memory": lambda: draw_zone(zones_positions["memory"], "Memory", memory_zone.cards),
+        "problem": draw_problem,
+        "profiler": draw_profile,
+        "compass": draw_compass,
+        "status": draw_status,
+    }
+    scheduler = RedrawScheduler()
+    for name, zone in (("deck", deck_zone), ("hand", hand_zone), ("stack", stack_zone),
+                       ("discard", discard_zone), ("memory", memory_zone), ("problem", problem_zone)):
+        scheduler.watch(name, lambda zone=zone: zone.version)
+    scheduler.watch("profiler", lambda: 0)
+    scheduler.watch("compass", lambda: 0)
+    scheduler.watch("status", lambda: 0)
+    screen.fill((0, 0, 0))
+    pygame.display.flip()
+
+    running = True
+    while running:
+        if scheduler.poll():
+            events = pygame.event.get()
+        else:
+            # Nothing to repaint: sleep until the next event instead of spinning.
+            events = [pygame.event.wait()] + pygame.event.get()
+
+        events_start = time.perf_counter_ns()
+        for event in events:
+            if event.type == pygame.QUIT:
+                running = False
+            
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                scheduler.mark_all_dirty()
+            
+            elif event.type == ANALYSIS_EVENT:
+                # Results for a position the player has since left are ignored.
+                if event.analysis.generation == analysis.generation:
+                    compass_text = event.analysis.describe()
+                    scheduler.mark_dirty("compass")
+            
+            elif event.type == pygame.USEREVENT:
+                # Periodic refresh while the profiler overlay is up.
+                scheduler.mark_dirty("profiler")
+            
+            elif event.type == pygame.MOUSEWHEEL and problem_rect.collidepoint(pygame.mouse.get_pos()):
+                if pygame.key.get_mods() & pygame.KMOD_CTRL:
+                    viewport.zoom_by(event.y)
+                else:
+                    viewport.scroll(-event.x * 20, -event.y * 20, layout.content_height)
+                scheduler.mark_dirty("problem")
+            
+            elif event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    direction = 1 if event.key == pygame.K_PAGEDOWN else -1
+                    viewport.scroll(0, direction * viewport.height, layout.content_height)
+                    scheduler.mark_dirty("problem")
+                elif event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_MINUS):
+                    viewport.zoom_by(-1 if event.key == pygame.K_MINUS else 1)
+                    scheduler.mark_dirty("problem")
+                elif event.key == pygame.K_F3:
+                    show_profile = not show_profile
+                    if show_profile:
+                        PROFILER.enable(trace=True)
+                    else:
+                        PROFILER.disable()
+                    pygame.time.set_timer(pygame.USEREVENT, 500 if show_profile else 0)
+                    scheduler.mark_dirty("profiler")
+                elif event.key == pygame.K_F4:
+                    PROFILER.export_chrome_trace("profile-trace.json")
+                    PROFILER.export_json("profile-summary.json")
+                    status_text = "Wrote profile-trace.json and profile-summary.json"
+                    log.info(status_text)
+                    scheduler.mark_dirty("status")
+                elif event.key == pygame.K_HOME:
+                    viewport.reset()
+                    scheduler.mark_dirty("problem")
+                elif event.key == pygame.K_RIGHT:
+                    if session.select_next():
+                        scheduler.mark_dirty("hand")
+                elif event.key == pygame.K_LEFT:
+                    if session.select_previous():
+                        scheduler.mark_dirty("hand")
+                elif event.key == pygame.K_c:
+                    # Commit action: move selected card from hand to stack
+                    session.play_selected()
+                elif event.key in (pygame.K_z, pygame.K_y) and pygame.key.get_mods() & pygame.KMOD_CTRL:
+                    # Undo / redo; the zones that change repaint themselves, the selection may move.
+                    if (session.undo() if event.key == pygame.K_z else session.redo()):
+                        scheduler.mark_dirty("hand")
+        if PROFILER.enabled:
+            PROFILER.record("frame:events", events_start, time.perf_counter_ns())
+        
+        if scheduler.poll():
+            names = scheduler.take_dirty()
+            updated = []
+            # Clear everything first so repainting one region cannot erase another.
+            for name in names:
+                old_rect = scheduler.previous_rect(name)
+                if old_rect is not None:
+                    screen.fill((0, 0, 0), old_rect)
+                    updated.append(old_rect)
+            for name in names:
+                with PROFILER.span(f"frame:draw:{name}"):
+                    rect = painters[name]()
+                scheduler.drawn(name, rect)
+                updated.append(rect)
+            with PROFILER.span("frame:flip"):
+                pygame.display.update(updated)
+        
+        # Any change to the position starts a fresh analysis and cancels the running one.
+        # Submitted after the frame is on screen, so the move itself shows without delay.
+        versions = (problem_zone.version, hand_zone.version, deck_zone.version, memory_zone.version)
+        if versions != analysed_versions:
+            analysed_versions = versions
+            analysis.submit(Snapshot(problem_zone, hand_zone.cards, deck_zone.cards, memory_zone.cards))
+        # No frame-rate tick: nothing animates, and the next pass either repaints
+        # what is dirty or blocks in event.wait(), so input is handled at once.
+    
+    analysis.close()
+    if action_log is not None:
+        action_log.finish(session)
+        action_log.write(action_log_path)
+        log.info("Wrote %d actions to %s", len(action_log), action_log_path)
+    session.close()
+    pygame.quit()